@@ -0,0 +1,42 @@
+import time
+
+import redis
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.account.users_auth.device_slots import flush_device_slots
+
+
+class Command(BaseCommand):
+    """
+    Django command persisting the device login counts kept in the Redis device slots to the UserAuth rows.
+    Every batch of dirty slots is written with one bulk update. Rotated UUIDs are persisted by the logins themselves.
+    """
+
+    help = 'Flush device login counts from the Redis device slots into the UserAuth rows in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of slots written per batch')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Seconds to wait before polling again once every slot is flushed')
+        parser.add_argument('--once', action='store_true', help='Flush the dirty slots once and exit')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be a positive integer')
+
+        flushed = 0
+        try:
+            while True:
+                count = flush_device_slots(batch_size=batch_size)
+                flushed += count
+                if not count:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        except redis.RedisError as e:
+            raise CommandError(f'Redis unavailable: {e}')
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} device slots'))
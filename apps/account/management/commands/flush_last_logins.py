@@ -0,0 +1,42 @@
+import time
+
+import redis
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.account.users_auth.activity import flush_last_logins
+
+
+class Command(BaseCommand):
+    """
+    Django command writing the login times buffered in Redis to the `last_login` column of the users.
+    Every batch of users is written with one `UPDATE ... FROM (VALUES ...)` statement.
+    """
+
+    help = 'Flush buffered login times from Redis into the last_login column of the users in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of users written per batch')
+        parser.add_argument('--interval', type=float, default=60,
+                            help='Seconds to wait before polling again once every login time is flushed')
+        parser.add_argument('--once', action='store_true', help='Flush the buffered login times once and exit')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be a positive integer')
+
+        flushed = 0
+        try:
+            while True:
+                count = flush_last_logins(batch_size=batch_size)
+                flushed += count
+                if not count:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        except redis.RedisError as e:
+            raise CommandError(f'Redis unavailable: {e}')
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} login times'))
@@ -0,0 +1,66 @@
+# Generated by Django 5.0.7 on 2026-10-19 05:20
+
+import apps.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAuth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('create_time', models.DateTimeField(auto_now_add=True)),
+                ('update_time', models.DateTimeField(auto_now=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('is_active', models.BooleanField(default=True)),
+                ('user_id', models.IntegerField(verbose_name='user id')),
+                ('token_type', models.PositiveSmallIntegerField(choices=[(1, 'access token'), (2, 'refresh token')], verbose_name='token type')),
+                ('device_login_count', models.PositiveSmallIntegerField(default=0, verbose_name='device login count')),
+                ('uuid', models.UUIDField(unique=True, verbose_name='uuid')),
+            ],
+            options={
+                'verbose_name': 'UserAuth',
+                'verbose_name_plural': 'UserAuths',
+                'ordering': ('-id',),
+                'indexes': [models.Index(fields=['user_id'], name='user_id_index')],
+            },
+        ),
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('create_time', models.DateTimeField(auto_now_add=True)),
+                ('update_time', models.DateTimeField(auto_now=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('is_active', models.BooleanField(default=True)),
+                ('username', models.CharField(max_length=100, unique=True, validators=[apps.core.validators.UsernameValidator()], verbose_name='Username')),
+                ('email', models.EmailField(max_length=100, unique=True, validators=[apps.core.validators.EmailValidator()], verbose_name='Email')),
+                ('phone_number', models.CharField(max_length=11, unique=True, validators=[apps.core.validators.PhoneNumberMobileValidator()], verbose_name='Phone Number')),
+                ('is_admin', models.BooleanField(default=False)),
+                ('is_staff', models.BooleanField(default=False)),
+                ('is_superuser', models.BooleanField(default=False)),
+                ('groups', models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='user_set', related_query_name='user', to='auth.group', verbose_name='groups')),
+                ('user_permissions', models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='user_set', related_query_name='user', to='auth.permission', verbose_name='user permissions')),
+            ],
+            options={
+                'verbose_name': 'User',
+                'verbose_name_plural': 'Users',
+                'ordering': ('-update_time', '-create_time', 'is_deleted'),
+                'indexes': [models.Index(fields=['username', 'phone_number'], name='index_username_phone_number')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(fields=('username', 'email'), name='unique_username_email'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+import hmac
+
+from rest_framework.permissions import BasePermission
+
+from apps.account.users_auth.app_settings import app_setting
+
+
+class HasIntrospectionSecret(BasePermission):
+    """
+    Permission granting access to internal services sending the shared `introspection_secret` in the
+    `X-Introspection-Secret` header. Nobody is granted access while no secret is configured.
+    """
+
+    def has_permission(self, request, view):
+        """
+        Compare the secret sent with the configured one in constant time.
+        Returns:
+            bool: True if the secrets match, False otherwise.
+        """
+        secret = app_setting.snapshot.introspection_secret
+        sent = request.META.get('HTTP_X_INTROSPECTION_SECRET')
+        if not secret or not sent:
+            return False
+        return hmac.compare_digest(sent.encode(), secret.encode())
@@ -27,3 +27,23 @@ class RefreshTokenSerializer(serializers.Serializer):
     - `refresh_token`: The refresh token used to obtain a new access token.
     """
     refresh_token = serializers.CharField()
+
+
+class TokenIntrospectionItemSerializer(serializers.Serializer):
+    """
+    Serializer for one token to introspect. It contains:
+    - `token`: The raw token sent by a client.
+    - `device_name`: The user agent of that client.
+    - `ip_address`: The IP address of that client.
+    """
+    token = serializers.CharField()
+    device_name = serializers.CharField(allow_blank=True)
+    ip_address = serializers.CharField(allow_blank=True)
+
+
+class TokenIntrospectionSerializer(serializers.Serializer):
+    """
+    Serializer for handling token introspection requests. It contains:
+    - `tokens`: The tokens to introspect with the information of their clients, at most 100 per request.
+    """
+    tokens = serializers.ListField(child=TokenIntrospectionItemSerializer(), allow_empty=False, max_length=100)
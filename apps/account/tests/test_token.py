@@ -1,4 +1,10 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
+
+import redis
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 
 from rest_framework.test import APIRequestFactory
@@ -10,9 +16,15 @@ from apps.account.users_auth.token import AccessToken, RefreshToken, set_token_c
     validate_token, get_user_by_access_token, generate_token, refresh_access_token
 from apps.account.users_auth.constants import ACCESS_TOKEN, REFRESH_TOKEN, USER_ID, IP_ADDRESS, DEVICE_NAME, UUID_FIELD
 from apps.account.users_auth.app_settings import app_setting
-from apps.account.users_auth.services import get_user_auth_uuid, update_user_auth_uuid
+from apps.account.users_auth.services import get_user_auth_uuid, get_user_auth_uuids, update_user_auth_uuid, \
+    claim_user_auth_uuids, claim_user_auth_uuids_in_db, rotate_user_auth_uuid
 from apps.account.models import UserAuth
 from apps.account.users_auth.exceptions import TokenError
+from apps.core.redis_client import get_redis_client
+from apps.account.users_auth.device_slots import SLOT_KEY
+from apps.account.users_auth.activity import LAST_LOGIN_KEY
+from apps.account.users_auth.epochs import EPOCHS_KEY, EpochSnapshot, epoch_snapshot
+from apps.account.users_auth.encryption import TokenCodec, encrypt
 
 User = get_user_model()
 
@@ -238,3 +250,193 @@ class TestToken(TestCase):
 
         with self.assertRaises(TokenError):
             refresh_access_token(request=request, raw_refresh_token=refresh_token)
+
+    def test_validate_token_cached(self):
+        encrypted_token = generate_access_token_with_claims(**{**self.user.__dict__, **self.client_info})
+        request = APIRequestFactory().get(path="/")
+        request.META["REMOTE_ADDR"] = self.ip_address
+        request.META["HTTP_USER_AGENT"] = self.device_name
+        validate_token(request=request, raw_token=encrypted_token)
+
+        with mock.patch("apps.account.users_auth.token.decrypt_token") as decrypt:
+            token = validate_token(request=request, raw_token=encrypted_token)
+            decrypt.assert_not_called()
+        self.assertEqual(token[USER_ID], self.user_id)
+
+        request.META["REMOTE_ADDR"] = "127.0.0.2"
+        with self.assertRaises(TokenError):
+            validate_token(request=request, raw_token=encrypted_token)
+
+        request.META["REMOTE_ADDR"] = self.ip_address
+        update_user_auth_uuid(user_id=self.user_id, token_type=UserAuth.ACCESS_TOKEN)
+        with self.assertRaises(TokenError):
+            validate_token(request=request, raw_token=encrypted_token)
+
+    @mock.patch("apps.account.users_auth.services.invalidation_listener")
+    def test_get_user_auth_uuid_local_cache(self, listener):
+        uuid_field = get_user_auth_uuid(user_id=self.user_id, token_type=UserAuth.ACCESS_TOKEN)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_auth_uuid(user_id=self.user_id, token_type=UserAuth.ACCESS_TOKEN), uuid_field)
+        listener.ensure_started.assert_called()
+
+        new_uuid_field = update_user_auth_uuid(user_id=self.user_id, token_type=UserAuth.ACCESS_TOKEN)
+        self.assertNotEqual(new_uuid_field, uuid_field)
+        self.assertEqual(get_user_auth_uuid(user_id=self.user_id, token_type=UserAuth.ACCESS_TOKEN), new_uuid_field)
+
+    @mock.patch("apps.account.users_auth.services.invalidation_listener")
+    def test_get_user_auth_uuids(self, listener):
+        token_types = (UserAuth.ACCESS_TOKEN, UserAuth.REFRESH_TOKEN)
+        uuids = get_user_auth_uuids(user_id=self.user_id, token_types=token_types)
+        self.assertEqual(set(uuids), set(token_types))
+        self.assertNotEqual(uuids[UserAuth.ACCESS_TOKEN], uuids[UserAuth.REFRESH_TOKEN])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_auth_uuids(user_id=self.user_id, token_types=token_types), uuids)
+        self.assertEqual(get_user_auth_uuid(user_id=self.user_id, token_type=UserAuth.REFRESH_TOKEN),
+                         uuids[UserAuth.REFRESH_TOKEN])
+
+    @override_settings(JWT_AUTH_EPOCH_REVOCATION=True)
+    @mock.patch("apps.account.users_auth.epochs.invalidation_listener")
+    def test_validate_token_epoch(self, listener):
+        epoch_snapshot.reload()
+        self.addCleanup(epoch_snapshot.invalidate)
+        encrypted_token = generate_access_token_with_claims(**{**self.user.__dict__, **self.client_info})
+        request = APIRequestFactory().get(path="/")
+        request.META["REMOTE_ADDR"] = self.ip_address
+        request.META["HTTP_USER_AGENT"] = self.device_name
+        validate_token(request=request, raw_token=encrypted_token)
+        with self.assertNumQueries(0):
+            token = validate_token(request=request, raw_token=encrypted_token)
+        self.assertIn("epoch", token)
+
+        update_user_auth_uuid(user_id=self.user_id, token_type=UserAuth.ACCESS_TOKEN)
+        with self.assertRaises(TokenError):
+            validate_token(request=request, raw_token=encrypted_token)
+        new_token = generate_access_token_with_claims(**{**self.user.__dict__, **self.client_info})
+        self.assertEqual(validate_token(request=request, raw_token=new_token)[USER_ID], self.user_id)
+
+    @override_settings(JWT_AUTH_EPOCH_REVOCATION=True)
+    @mock.patch("apps.account.users_auth.epochs.invalidation_listener")
+    def test_validate_token_epoch_lost(self, listener):
+        epoch_snapshot.reload()
+        self.addCleanup(epoch_snapshot.invalidate)
+        encrypted_token = generate_access_token_with_claims(**{**self.user.__dict__, **self.client_info})
+        request = APIRequestFactory().get(path="/")
+        request.META["REMOTE_ADDR"] = self.ip_address
+        request.META["HTTP_USER_AGENT"] = self.device_name
+        update_user_auth_uuid(user_id=self.user_id, token_type=UserAuth.ACCESS_TOKEN)
+
+        get_redis_client().delete(EPOCHS_KEY)
+        restarted_snapshot = EpochSnapshot()
+        restarted_snapshot.reload()
+        with mock.patch("apps.account.users_auth.epochs.epoch_snapshot", restarted_snapshot):
+            with self.assertRaises(TokenError):
+                validate_token(request=request, raw_token=encrypted_token)
+            new_token = generate_access_token_with_claims(**{**self.user.__dict__, **self.client_info})
+            self.assertEqual(validate_token(request=request, raw_token=new_token)[USER_ID], self.user_id)
+
+    def test_token_codec(self):
+        old_codec = TokenCodec(keys={"1": b"1" * 32}, key_id="1")
+        codec = TokenCodec(keys={"1": b"1" * 32, "2": b"2" * 32}, key_id="2", legacy_key=b"0" * 32)
+
+        encrypted = codec.encode("payload")
+        self.assertTrue(encrypted.startswith("2."))
+        self.assertEqual(codec.decode(encrypted), "payload")
+        self.assertEqual(codec.decode(old_codec.encode("previous key")), "previous key")
+        self.assertEqual(codec.decode(encrypt(data="legacy", key=b"0" * 32)), "legacy")
+        with self.assertRaises(ValueError):
+            old_codec.decode(encrypted)
+        with self.assertRaises(ValueError):
+            old_codec.decode(encrypt(data="legacy", key=b"0" * 32))
+        with self.assertRaises(ValueError):
+            TokenCodec(keys={"1": b"0" * 32}, key_id="1", legacy_key=b"0" * 32)
+
+        tampered = encrypted[:-4] + ("AAAA" if not encrypted.endswith("AAAA") else "BBBB")
+        self.assertEqual(codec.decode_many([encrypted, tampered, "1." + encrypted[2:]]), ["payload", None, None])
+
+    def test_benchmark_tokens(self):
+        out = StringIO()
+        call_command("benchmark_tokens", "--count", "5", stdout=out)
+        self.assertIn("aes-gcm: mint", out.getvalue())
+        self.assertIn("aes-ecb (legacy): mint", out.getvalue())
+
+    @override_settings(JWT_AUTH_ENCRYPT_KEYS={"a": b"a" * 32, "b": b"b" * 32}, JWT_AUTH_ENCRYPT_KEY_ID="b")
+    def test_encrypt_token_key_rotation(self):
+        token = AccessToken()
+        encrypted_token = encrypt_token(token=token)
+        self.assertTrue(encrypted_token.startswith("b."))
+        with override_settings(JWT_AUTH_ENCRYPT_KEY_ID="a"):
+            self.assertEqual(decrypt_token(token=encrypted_token), str(token))
+
+    def test_settings_snapshot(self):
+        snapshot = app_setting.snapshot
+        self.assertIs(app_setting.snapshot, snapshot)
+        self.assertEqual(snapshot.access_token_claim_keys, tuple(app_setting.access_token_claims))
+        with self.assertRaises(AttributeError):
+            snapshot.cache_using = True
+
+        with override_settings(JWT_AUTH_CACHE_USING=not snapshot.cache_using):
+            self.assertEqual(app_setting.snapshot.cache_using, not snapshot.cache_using)
+        self.assertEqual(app_setting.snapshot.cache_using, snapshot.cache_using)
+
+    @override_settings(JWT_AUTH_DEVICE_LIMIT=2)
+    def test_generate_token_device_limit(self):
+        request = APIRequestFactory().get(path="/")
+        request.META["REMOTE_ADDR"] = self.ip_address
+        request.META["HTTP_USER_AGENT"] = self.device_name
+        slot_keys = [SLOT_KEY.format(user_id=self.user_id, token_type=token_type)
+                     for token_type in (UserAuth.ACCESS_TOKEN, UserAuth.REFRESH_TOKEN)]
+        self.addCleanup(get_redis_client().delete, *slot_keys)
+        with self.assertNumQueries(3):
+            first = generate_token(request=request, user=self.user)
+        with self.assertNumQueries(0):
+            generate_token(request=request, user=self.user)
+        call_command("flush_device_slots", "--once", stdout=StringIO())
+        self.assertEqual(
+            set(UserAuth.objects.filter(user_id=self.user_id).values_list("device_login_count", flat=True)), {2})
+
+        generate_token(request=request, user=self.user)
+        self.assertEqual(
+            set(UserAuth.objects.filter(user_id=self.user_id).values_list("device_login_count", flat=True)), {1})
+        with self.assertRaises(TokenError):
+            validate_token(request=request, raw_token=first[ACCESS_TOKEN])
+        with self.assertRaises(TokenError):
+            validate_token(request=request, raw_token=first[REFRESH_TOKEN])
+
+    @override_settings(JWT_AUTH_DEVICE_LIMIT=5)
+    def test_flush_device_slots_while_redis_unreachable(self):
+        slot_key = SLOT_KEY.format(user_id=self.user_id, token_type=UserAuth.ACCESS_TOKEN)
+        self.addCleanup(get_redis_client().delete, slot_key)
+        claim_user_auth_uuids(user_id=self.user_id, token_types=[UserAuth.ACCESS_TOKEN])
+        claim_user_auth_uuids(user_id=self.user_id, token_types=[UserAuth.ACCESS_TOKEN])
+        claim_user_auth_uuids_in_db(user_id=self.user_id, token_types=[UserAuth.ACCESS_TOKEN], device_limit=5)
+        call_command("flush_device_slots", "--once", stdout=StringIO())
+        user_auth = UserAuth.objects.get(user_id=self.user_id, token_type=UserAuth.ACCESS_TOKEN)
+        self.assertEqual(user_auth.device_login_count, 3)
+        self.assertEqual(int(get_redis_client().hget(slot_key, "count")), 3)
+
+        with mock.patch("apps.account.users_auth.device_slots.set_slot_uuid", side_effect=redis.RedisError):
+            new_uuid = rotate_user_auth_uuid(user_auth=user_auth)
+        self.assertNotEqual(claim_user_auth_uuids(user_id=self.user_id, token_types=[UserAuth.ACCESS_TOKEN])[
+            UserAuth.ACCESS_TOKEN], new_uuid)
+        call_command("flush_device_slots", "--once", stdout=StringIO())
+        self.assertEqual(claim_user_auth_uuids(user_id=self.user_id, token_types=[UserAuth.ACCESS_TOKEN])[
+            UserAuth.ACCESS_TOKEN], new_uuid)
+
+    @override_settings(JWT_AUTH_LAST_LOGIN_BUFFER=True, JWT_AUTH_LAST_LOGIN_UPDATE_INTERVAL=60)
+    def test_generate_token_last_login_buffer(self):
+        request = APIRequestFactory().get(path="/")
+        request.META["REMOTE_ADDR"] = self.ip_address
+        request.META["HTTP_USER_AGENT"] = self.device_name
+        self.addCleanup(get_redis_client().delete, LAST_LOGIN_KEY)
+        User.objects.filter(id=self.user_id).update(last_login=None)
+        self.user.last_login = None
+
+        generate_token(request=request, user=self.user)
+        self.assertIsNotNone(self.user.last_login)
+        self.assertIsNone(User.objects.get(id=self.user_id).last_login)
+
+        call_command("flush_last_logins", "--once", stdout=StringIO())
+        last_login = User.objects.get(id=self.user_id).last_login
+        self.assertIsNotNone(last_login)
+        self.assertEqual(last_login.timestamp() % 60, 0)
+        self.assertLessEqual(last_login, self.user.last_login)
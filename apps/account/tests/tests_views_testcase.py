@@ -1,8 +1,18 @@
+from unittest import mock
+
 from django.urls import reverse
+from django.test import override_settings
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APIRequestFactory
 from django.contrib.auth import get_user_model
 from rest_framework.authtoken.models import Token
+from model_bakery import baker
+
+from apps.account.models import UserAuth
+from apps.account.users_auth.cache import get_many_cache
+from apps.account.users_auth.constants import ACCESS_TOKEN, REFRESH_TOKEN, TOKEN_TYPE, USER_ID
+from apps.account.users_auth.services import update_user_auth_uuid
+from apps.account.users_auth.token import generate_token
 
 User = get_user_model()
 
@@ -445,3 +455,59 @@ class LogoutTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('error', response.data)
         self.assertEqual(response.data['error'], 'You are not logged in')
+
+
+@override_settings(JWT_AUTH_INTROSPECTION_SECRET='introspection-secret', JWT_AUTH_CACHE_USING=True,
+                   JWT_AUTH_UUID_LOCAL_CACHE_TIMEOUT=0)
+class TokenIntrospectionTests(APITestCase):
+
+    def setUp(self):
+        """
+        Log two users in from the same client.
+        """
+        self.device_name = 'gateway-test-agent'
+        self.ip_address = '127.0.0.1'
+        request = APIRequestFactory().get(path='/', HTTP_USER_AGENT=self.device_name, REMOTE_ADDR=self.ip_address)
+        self.users = [baker.make(User) for _ in range(2)]
+        self.tokens = [generate_token(request=request, user=user) for user in self.users]
+        self.url = reverse('token-introspect')
+
+    def item(self, token, device_name=None):
+        return {'token': token, 'device_name': device_name or self.device_name, 'ip_address': self.ip_address}
+
+    def test_introspect_without_secret(self):
+        """
+        Test that the endpoint is refused without the shared secret.
+        """
+        response = self.client.post(self.url, {'tokens': [self.item(self.tokens[0][ACCESS_TOKEN])]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.post(self.url, {'tokens': [self.item(self.tokens[0][ACCESS_TOKEN])]}, format='json',
+                                    HTTP_X_INTROSPECTION_SECRET='wrong')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_introspect_batch(self):
+        """
+        Test that every token of a batch is validated, in order, with a single lookup of the UUIDs.
+        """
+        items = [
+            self.item(self.tokens[0][ACCESS_TOKEN]),
+            self.item(self.tokens[1][REFRESH_TOKEN]),
+            self.item(self.tokens[1][ACCESS_TOKEN], device_name='other-agent'),
+            self.item('not-a-token'),
+            self.item(self.tokens[1][ACCESS_TOKEN]),
+        ]
+        with mock.patch('apps.account.users_auth.services.get_many_cache', wraps=get_many_cache) as get_many:
+            response = self.client.post(self.url, {'tokens': items}, format='json',
+                                        HTTP_X_INTROSPECTION_SECRET='introspection-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(get_many.call_count, 1)
+        results = response.data['results']
+        self.assertEqual([result['valid'] for result in results], [True, True, False, False, True])
+        self.assertEqual(results[0]['claims'][USER_ID], self.users[0].id)
+        self.assertEqual(results[1]['claims'][TOKEN_TYPE], REFRESH_TOKEN)
+        self.assertIn('error', results[2])
+
+        update_user_auth_uuid(user_id=self.users[0].id, token_type=UserAuth.ACCESS_TOKEN)
+        response = self.client.post(self.url, {'tokens': items[:1]}, format='json',
+                                    HTTP_X_INTROSPECTION_SECRET='introspection-secret')
+        self.assertFalse(response.data['results'][0]['valid'])
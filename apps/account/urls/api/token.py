@@ -0,0 +1,9 @@
+from django.urls import path
+from apps.account.views.views_api import token
+
+urlpatterns = [
+    path('token-introspect/', token.TokenIntrospection.as_view(), name='token-introspect'),
+]
+"""
+Maps the URL 'token-introspect/' to the TokenIntrospection view.
+"""
@@ -0,0 +1,65 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from apps.account.users_auth.app_settings import app_setting
+from apps.core.redis_client import get_redis_client
+
+LAST_LOGIN_KEY = "users_auth:last_login"
+
+
+def record_login(user_id: int, moment: datetime.datetime) -> None:
+    """
+    Buffer the login time of a user in Redis, to be written to `last_login` by `flush_last_logins`.
+
+    Times are truncated to `last_login_update_interval` seconds and kept in a sorted set scored by timestamp, updated
+    with `ZADD GT`, so that any number of logins of a user between two flushes ends in a single row update.
+    Args:
+    - user_id (int): The ID of the user.
+    - moment (datetime.datetime): Time of the login.
+    Raises:
+    - redis.RedisError: If the login could not be buffered.
+    """
+    timestamp = moment.timestamp()
+    precision = app_setting.snapshot.last_login_update_interval
+    if precision:
+        timestamp -= timestamp % precision
+    get_redis_client().zadd(LAST_LOGIN_KEY, {user_id: timestamp}, gt=True)
+
+
+def flush_last_logins(batch_size: int) -> int:
+    """
+    Write a batch of buffered login times to `last_login` with one `UPDATE ... FROM (VALUES ...)` statement.
+
+    Rows already holding a later `last_login` are left untouched. The batch is put back in the buffer if the update
+    fails.
+    Args:
+    - batch_size (int): Maximum number of users updated.
+    Returns:
+    - int: Number of users flushed, 0 once the buffer is empty.
+    Raises:
+    - redis.RedisError: If the buffer could not be read.
+    """
+    client = get_redis_client()
+    entries = client.zpopmin(LAST_LOGIN_KEY, batch_size)
+    if not entries:
+        return 0
+
+    params = []
+    for user_id, timestamp in entries:
+        params += [int(user_id), datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {get_user_model()._meta.db_table} AS u SET last_login = v.last_login
+                FROM (VALUES {", ".join(["(%s, %s)"] * len(entries))}) AS v (id, last_login)
+                WHERE u.id = v.id AND (u.last_login IS NULL OR u.last_login < v.last_login)
+                """,
+                params
+            )
+    except Exception:
+        client.zadd(LAST_LOGIN_KEY, dict(entries), gt=True)
+        raise
+    return len(entries)
@@ -1,6 +1,9 @@
 import functools
 from datetime import timedelta
+from types import MappingProxyType
 from Crypto.Random import get_random_bytes
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from apps.account.users_auth.client import IP_ADDRESS, DEVICE_NAME
 from apps.account.users_auth.constants import USER_ID, UUID_FIELD
 
@@ -16,6 +19,27 @@ class AppSettings:
         """
         self.prefix = prefix
         self.encryption_key = encryption_key
+        self._snapshot = None
+
+    @property
+    def snapshot(self) -> "SettingsSnapshot":
+        """
+        Property to retrieve the settings compiled into an immutable snapshot, built on first access and after every
+        `reload`. Hot paths read the snapshot instead of the properties below, which look the Django settings up and
+        build their dicts again on every access.
+        Returns:
+        - SettingsSnapshot: Snapshot of the current settings.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self._snapshot = SettingsSnapshot(self)
+        return snapshot
+
+    def reload(self) -> None:
+        """
+        Drop the snapshot, so that the next access compiles the current settings again.
+        """
+        self._snapshot = None
 
     def _setting(self, name: str, default: object):
         """
@@ -126,6 +150,141 @@ class AppSettings:
         """
         return self._setting("DEVICE_LIMIT", None)
 
+    @property
+    def validated_token_cache_size(self):
+        """
+        Property to retrieve how many validated tokens are kept in the in-process LRU, defaulting to 1024.
+        Returns:
+        - int: Maximum number of cached tokens, 0 to disable the cache.
+        """
+        return self._setting("VALIDATED_TOKEN_CACHE_SIZE", 1024)
+
+    @property
+    def uuid_local_cache_timeout(self):
+        """
+        Property to retrieve how many seconds UUIDs are kept in the per-process cache, defaulting to 5.
+        Returns:
+        - float: Time-to-live of the per-process cache, 0 to disable it.
+        """
+        return self._setting("UUID_LOCAL_CACHE_TIMEOUT", 5)
+
+    @property
+    def uuid_local_cache_size(self):
+        """
+        Property to retrieve how many UUIDs the per-process cache holds before it is emptied, defaulting to 10000.
+        Returns:
+        - int: Maximum number of cached UUIDs.
+        """
+        return self._setting("UUID_LOCAL_CACHE_SIZE", 10000)
+
+    @property
+    def epoch_revocation(self):
+        """
+        Property to retrieve whether tokens carry a revocation epoch checked against a local snapshot replicated from
+        Redis, instead of looking up the UUID of the user on every validation, defaulting to False.
+        Returns:
+        - bool: Whether epoch-based revocation is enabled.
+        """
+        return self._setting("EPOCH_REVOCATION", False)
+
+    @property
+    def encrypt_keys(self):
+        """
+        Property to retrieve the AES-GCM keys tokens are encrypted with, keyed by key ID, defaulting to the
+        encryption key under the ID "1". Keys can be rotated by adding a new ID and moving `encrypt_key_id` to it,
+        while tokens encrypted with the previous keys remain readable until those are removed. While `legacy_tokens`
+        is enabled the keys must differ from `encrypt_key`, which keeps decrypting the AES-ECB tokens; a key must
+        never be shared between both modes.
+        Returns:
+        - dict: 16, 24 or 32 bytes keys keyed by alphanumeric key ID.
+        """
+        return self._setting("ENCRYPT_KEYS", {"1": self.encrypt_key})
+
+    @property
+    def encrypt_key_id(self):
+        """
+        Property to retrieve the ID of the key new tokens are encrypted with, defaulting to "1".
+        Returns:
+        - str: One of the keys of `encrypt_keys`.
+        """
+        return self._setting("ENCRYPT_KEY_ID", "1")
+
+    @property
+    def legacy_tokens(self):
+        """
+        Property to retrieve whether tokens encrypted with AES-ECB under `encrypt_key`, as issued before AES-GCM, are
+        still accepted, defaulting to False. Enable it only while upgrading, with `encrypt_keys` set to new keys, and
+        disable it again once `refresh_token_lifetime` has passed, by when every legacy token expired.
+        Returns:
+        - bool: Whether legacy tokens are decrypted.
+        """
+        return self._setting("LEGACY_TOKENS", False)
+
+    @property
+    def last_login_update_interval(self):
+        """
+        Property to retrieve how many seconds must pass before a new login of a user is written to `last_login`
+        again, which is also the precision of the buffered login times, defaulting to 60.
+        Returns:
+        - int: Minimum interval between two `last_login` writes, 0 to write every login.
+        """
+        return self._setting("LAST_LOGIN_UPDATE_INTERVAL", 60)
+
+    @property
+    def last_login_buffer(self):
+        """
+        Property to retrieve whether login times are buffered in Redis and written to `last_login` in batches by the
+        `flush_last_logins` command, instead of on every login, defaulting to False.
+        Returns:
+        - bool: Whether login times are buffered.
+        """
+        return self._setting("LAST_LOGIN_BUFFER", False)
+
+    @property
+    def introspection_secret(self):
+        """
+        Property to retrieve the shared secret internal services must send in the `X-Introspection-Secret` header to
+        use the token introspection endpoint, defaulting to None, which disables the endpoint.
+        Returns:
+        - Optional[str]: The shared secret.
+        """
+        return self._setting("INTROSPECTION_SECRET", None)
+
+
+class SettingsSnapshot:
+    """
+    Immutable copy of the JWT authentication settings, with the claims compiled into tuples of claim names.
+    """
+
+    __slots__ = (
+        "access_token_lifetime", "refresh_token_lifetime", "refresh_token_claim_keys", "access_token_claim_keys",
+        "access_token_user_field_claim_keys", "encrypt_key", "cache_using", "get_user_by_access_token",
+        "get_device_limit", "validated_token_cache_size", "uuid_local_cache_timeout", "uuid_local_cache_size",
+        "epoch_revocation", "encrypt_keys", "encrypt_key_id", "legacy_tokens", "last_login_update_interval",
+        "last_login_buffer", "introspection_secret",
+    )
+
+    def __init__(self, app_settings: AppSettings) -> None:
+        """
+        Compile the settings once.
+        Args:
+        - app_settings (AppSettings): Settings to read.
+        """
+        values = {
+            "refresh_token_claim_keys": tuple(app_settings.refresh_token_claims),
+            "access_token_claim_keys": tuple(app_settings.access_token_claims),
+            "access_token_user_field_claim_keys": tuple(app_settings.access_token_user_field_claims),
+            "encrypt_keys": MappingProxyType(dict(app_settings.encrypt_keys)),
+        }
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name] if name in values else getattr(app_settings, name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SettingsSnapshot is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("SettingsSnapshot is immutable")
+
 
 @functools.lru_cache
 def jwt_auth_app_settings() -> AppSettings:
@@ -139,3 +298,12 @@ def jwt_auth_app_settings() -> AppSettings:
 
 # Retrieve and store the JWT authentication app settings instance.
 app_setting = jwt_auth_app_settings()
+
+
+@receiver(setting_changed)
+def reload_app_settings(*, setting: str, **kwargs) -> None:
+    """
+    Compile the snapshot again when a JWT authentication setting changes.
+    """
+    if setting.startswith(app_setting.prefix):
+        app_setting.reload()
@@ -52,7 +52,7 @@ class JWTAuthentication(BaseJWTAuthentication):
         Returns:
         - AuthUser: Authenticated user object.
         """
-        if app_setting.get_user_by_access_token:
+        if app_setting.snapshot.get_user_by_access_token:
             return get_user_by_access_token(token=validated_token)
         return User.objects.get(id=validated_token[USER_ID])
 
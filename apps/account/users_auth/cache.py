@@ -1,7 +1,13 @@
-from typing import Any
+from typing import Any, Dict, Iterable
 
 from django.core.cache import cache
 
+"""
+The helpers below no longer close the cache after every operation: with a Redis backend, the connections of the
+cache belong to a process-wide pool (see `apps.core.redis_client.MeteredConnectionPool`) and are reused by every
+call, while closing them meant a new TCP connection and handshake per call.
+"""
+
 
 def get_cache(key: Any) -> Any:
     """
@@ -11,9 +17,18 @@ def get_cache(key: Any) -> Any:
     Returns:
     - Any: The cached value corresponding to the key, or None if not found.
     """
-    value = cache.get(key=key)
-    cache.close()
-    return value
+    return cache.get(key=key)
+
+
+def get_many_cache(keys: Iterable[Any]) -> Dict[Any, Any]:
+    """
+    Retrieve several values from the cache in a single round-trip.
+    Args:
+    - keys (Iterable[Any]): The keys used to fetch the cached values.
+    Returns:
+    - Dict[Any, Any]: The cached values keyed by their key, leaving out the keys not found.
+    """
+    return cache.get_many(keys=keys)
 
 
 def set_cache(key: Any, value: Any, timeout: int) -> None:
@@ -25,7 +40,17 @@ def set_cache(key: Any, value: Any, timeout: int) -> None:
     - timeout (int): Timeout period in seconds for the cached value.
     """
     cache.set(key=key, value=value, timeout=timeout)
-    cache.close()
+
+
+def set_many_cache(data: Dict[Any, Any], timeout: int) -> None:
+    """
+    Set several key-value pairs in the cache in a single round-trip.
+    Args:
+    - data (Dict[Any, Any]): The values to store in the cache, keyed by their key.
+    - timeout (int): Timeout period in seconds for the cached values.
+    """
+    if data:
+        cache.set_many(data=data, timeout=timeout)
 
 
 def delete_cache(key) -> bool:
@@ -36,9 +61,7 @@ def delete_cache(key) -> bool:
     Returns:
     - bool: True if the value was successfully deleted, False otherwise.
     """
-    cache_delete = cache.delete(key=key)
-    cache.close()
-    return cache_delete
+    return cache.delete(key=key)
 
 
 def clear_all_cache() -> None:
@@ -56,6 +79,4 @@ def incr_cache(key: Any) -> bool:
     Returns:
     - bool: True if the increment was successful, False otherwise.
     """
-    incr = cache.incr(key=key)
-    cache.close()
-    return incr
+    return cache.incr(key=key)
@@ -5,3 +5,5 @@ USER_ID = "id"
 UUID_FIELD = "uuid_field"
 IP_ADDRESS = "ip_address"
 DEVICE_NAME = "device_name"
+EPOCH_FIELD = "epoch"
+EPOCH_GENERATION_FIELD = "epoch_generation"
@@ -0,0 +1,183 @@
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveSmallIntegerField, When
+
+from apps.account.models import UserAuth
+from apps.core.redis_client import get_redis_client
+
+SLOT_KEY = "users_auth:slots:{user_id}:{token_type}"
+DIRTY_SLOTS_KEY = "users_auth:slots:dirty"
+SLOT_TIMEOUT = 60 * 60 * 24 * 30
+
+"""
+Claims one device login on the slot hash of a user and token type in one atomic step: the login count is compared
+with the device limit, then either incremented or, once the limit is reached, reset to 1 with the candidate UUID.
+The slot is marked dirty so that its count is persisted by `flush_device_slots`. A slot missing from Redis is
+seeded from ARGV when given, otherwise the script returns nil and the caller must retry with the UserAuth row.
+`flushed` holds the count the row had when the slot last matched it, a rotation resetting both to 1.
+Returns the row ID, the current UUID and whether it was rotated.
+"""
+CLAIM_SLOT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    if #ARGV < 6 then
+        return false
+    end
+    redis.call('HSET', KEYS[1], 'id', ARGV[4], 'count', ARGV[5], 'flushed', ARGV[5], 'uuid', ARGV[6])
+end
+local rotated = 0
+if tonumber(redis.call('HGET', KEYS[1], 'count')) >= tonumber(ARGV[1]) then
+    redis.call('HSET', KEYS[1], 'count', 1, 'flushed', 1, 'uuid', ARGV[2])
+    rotated = 1
+else
+    redis.call('HINCRBY', KEYS[1], 'count', 1)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('SADD', KEYS[2], KEYS[1])
+return {redis.call('HGET', KEYS[1], 'id'), redis.call('HGET', KEYS[1], 'uuid'), rotated}
+"""
+
+SET_SLOT_UUID_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HSET', KEYS[1], 'uuid', ARGV[1])
+    if ARGV[2] then
+        redis.call('HSET', KEYS[1], 'count', ARGV[2], 'flushed', ARGV[2])
+    end
+end
+return 1
+"""
+
+"""
+Aligns a flushed slot with its UserAuth row. A slot rotated since it was read is left alone. A slot whose UUID no
+longer matches the row missed a rotation made while Redis could not be reached, e.g. a logout, and is dropped so
+that the next login seeds it again from the row. Otherwise the slot takes the count of the row, which also holds
+the logins counted on the database meanwhile, plus the logins it counted since it was read.
+"""
+SYNC_SLOT_SCRIPT = """
+local slot_uuid = redis.call('HGET', KEYS[1], 'uuid')
+if not slot_uuid or slot_uuid ~= ARGV[1] then
+    return 0
+end
+if slot_uuid ~= ARGV[2] then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+local count = tonumber(ARGV[3]) + tonumber(redis.call('HGET', KEYS[1], 'count')) - tonumber(ARGV[4])
+redis.call('HSET', KEYS[1], 'count', count, 'flushed', ARGV[3])
+return 1
+"""
+
+
+def claim_slots(user_id: int, token_types: Iterable[int], device_limit: int, candidates: Dict[int, str],
+                seeds: Optional[Dict[int, UserAuth]] = None) -> Dict[int, Optional[Tuple[int, str, bool]]]:
+    """
+    Claim one device login per token type of a user, in one round-trip.
+    Args:
+    - user_id (int): The ID of the user.
+    - token_types (Iterable[int]): The types of token (access or refresh).
+    - device_limit (int): Number of logins after which the UUID is rotated.
+    - candidates (Dict[int, str]): UUIDs used if the slot of a token type is rotated, keyed by token type.
+    - seeds (Optional[Dict[int, UserAuth]]): UserAuth rows seeding the slots missing from Redis.
+    Returns:
+    - Dict[int, Optional[Tuple[int, str, bool]]]: (row ID, UUID, rotated) keyed by token type, None for the slots
+      missing from Redis and not seeded.
+    Raises:
+    - redis.RedisError: If the slots could not be claimed.
+    """
+    token_types = list(token_types)
+    client = get_redis_client()
+    script = client.register_script(CLAIM_SLOT_SCRIPT)
+    pipeline = client.pipeline(transaction=False)
+    for token_type in token_types:
+        args = [device_limit, candidates[token_type], SLOT_TIMEOUT]
+        if seeds and token_type in seeds:
+            seed = seeds[token_type]
+            args += [seed.id, seed.device_login_count, str(seed.uuid)]
+        script(keys=[SLOT_KEY.format(user_id=user_id, token_type=token_type), DIRTY_SLOTS_KEY], args=args,
+               client=pipeline)
+
+    claims = {}
+    for token_type, result in zip(token_types, pipeline.execute()):
+        claims[token_type] = (int(result[0]), result[1].decode(), bool(result[2])) if result else None
+    return claims
+
+
+def get_slot_uuid(user_id: int, token_type: int) -> Optional[str]:
+    """
+    Retrieve the UUID the slot of a user and token type was last rotated to.
+    Raises:
+    - redis.RedisError: If the slot could not be read.
+    """
+    slot_uuid = get_redis_client().hget(SLOT_KEY.format(user_id=user_id, token_type=token_type), "uuid")
+    return slot_uuid.decode() if slot_uuid else None
+
+
+def set_slot_uuid(user_id: int, token_type: int, slot_uuid: str, device_login_count: Optional[int] = None) -> None:
+    """
+    Align the slot of a user and token type, if it is in Redis, with a UUID rotated outside of it, e.g. on logout,
+    so that later logins do not keep minting tokens with the revoked UUID. Should Redis be unreachable, the slot is
+    dropped by the next `flush_device_slots` of it instead.
+    Raises:
+    - redis.RedisError: If the slot could not be written.
+    """
+    script = get_redis_client().register_script(SET_SLOT_UUID_SCRIPT)
+    args = [slot_uuid] if device_login_count is None else [slot_uuid, device_login_count]
+    script(keys=[SLOT_KEY.format(user_id=user_id, token_type=token_type)], args=args)
+
+
+def flush_device_slots(batch_size: int) -> int:
+    """
+    Persist the login counts of a batch of dirty slots to their UserAuth rows with one bulk update.
+
+    Each row is incremented by the logins its slot counted since the previous flush, and only while it still has
+    the UUID of the slot, so logins counted on the database while Redis was unreachable are kept. The slots are
+    then aligned with their rows by `SYNC_SLOT_SCRIPT`. UUIDs are not written here: rotations are persisted
+    synchronously by the login that rotated them, since token validation reads them from the database.
+    Args:
+    - batch_size (int): Maximum number of slots flushed.
+    Returns:
+    - int: Number of slots flushed, 0 once no slot is dirty.
+    Raises:
+    - redis.RedisError: If the slots could not be read.
+    """
+    client = get_redis_client()
+    keys = client.spop(DIRTY_SLOTS_KEY, batch_size)
+    if not keys:
+        return 0
+    pipeline = client.pipeline(transaction=False)
+    for key in keys:
+        pipeline.hmget(key, "id", "count", "flushed", "uuid")
+    slots = {
+        key: (int(row_id), int(count), int(flushed or count), slot_uuid.decode())
+        for key, (row_id, count, flushed, slot_uuid) in zip(keys, pipeline.execute())
+        if row_id is not None
+    }
+    row_ids = [row_id for row_id, _, _, _ in slots.values()]
+    increments = [
+        When(id=row_id, uuid=slot_uuid, then=F("device_login_count") + (count - flushed))
+        for row_id, count, flushed, slot_uuid in slots.values()
+        if count != flushed
+    ]
+    try:
+        with transaction.atomic():
+            if increments:
+                UserAuth.objects.filter(id__in=row_ids).update(
+                    device_login_count=Case(*increments, default=F("device_login_count"),
+                                            output_field=PositiveSmallIntegerField())
+                )
+            rows = {
+                row_id: (str(row_uuid), count)
+                for row_id, row_uuid, count in UserAuth.objects.filter(id__in=row_ids).values_list(
+                    "id", "uuid", "device_login_count")
+            }
+    except Exception:
+        client.sadd(DIRTY_SLOTS_KEY, *keys)
+        raise
+
+    script = client.register_script(SYNC_SLOT_SCRIPT)
+    pipeline = client.pipeline(transaction=False)
+    for key, (row_id, count, _, slot_uuid) in slots.items():
+        row_uuid, row_count = rows.get(row_id, ("", 0))
+        script(keys=[key], args=[slot_uuid, row_uuid, row_count, count], client=pipeline)
+    pipeline.execute()
+    return len(keys)
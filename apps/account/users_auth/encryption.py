@@ -1,9 +1,19 @@
 import base64
-from typing import ByteString, Any
+import functools
+from typing import ByteString, Any, Dict, List, Optional
 
 from Crypto.Cipher import AES
 from Crypto.Cipher._mode_ecb import EcbMode
+from Crypto.Random import get_random_bytes
 from Crypto.Util.Padding import pad, unpad
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from apps.account.users_auth.app_settings import app_setting
+
+NONCE_SIZE = 12
+TAG_SIZE = 16
+KEY_ID_SEPARATOR = "."
 
 
 def get_new_cipher(key: ByteString) -> EcbMode:
@@ -81,3 +91,133 @@ def decrypt(encrypted: ByteString, key: ByteString) -> str:
         raise ValueError(e)
     else:
         return decrypted_token
+
+
+class TokenCodec:
+    """
+    Encrypt and decrypt tokens with AES-GCM under versioned keys.
+
+    Tokens are encoded as `<key id>.<base64url(nonce + ciphertext + tag)>`, the key ID being authenticated as
+    associated data, so that keys can be rotated while the tokens encrypted with the previous ones remain readable.
+    Tokens without a key ID are legacy AES-ECB tokens, decrypted with `legacy_key` if it is set. The codec resolves
+    its keys once and keeps the legacy ECB cipher, which is stateless, instead of building one per token; AES-GCM
+    ciphers are bound to their nonce and are created per token.
+    """
+
+    def __init__(self, keys: Dict[str, ByteString], key_id: str, legacy_key: Optional[ByteString] = None) -> None:
+        """
+        Args:
+        - keys (Dict[str, ByteString]): AES keys keyed by key ID.
+        - key_id (str): ID of the key new tokens are encrypted with.
+        - legacy_key (Optional[ByteString]): Key of the legacy AES-ECB tokens, None to reject them.
+        Raises:
+        - ValueError: If `key_id` is not one of the keys, a key ID contains the separator, or the legacy key is also
+          one of the AES-GCM keys.
+        """
+        if key_id not in keys:
+            raise ValueError(f"Unknown encryption key id {key_id!r}")
+        if any(KEY_ID_SEPARATOR in kid for kid in keys):
+            raise ValueError(f"Encryption key ids cannot contain {KEY_ID_SEPARATOR!r}")
+        if legacy_key and bytes(legacy_key) in {bytes(key) for key in keys.values()}:
+            raise ValueError("The legacy AES-ECB key cannot be reused as an AES-GCM key")
+        self.keys = {kid.encode(): bytes(key) for kid, key in keys.items()}
+        self.key_id = key_id.encode()
+        self.legacy_cipher = get_new_cipher(key=legacy_key) if legacy_key else None
+
+    def encode(self, data: str) -> str:
+        """
+        Encrypt data under the current key.
+        Args:
+        - data (str): The data to encrypt in string format.
+        Returns:
+        - str: Key ID and encrypted data, in URL-safe base64.
+        """
+        nonce = get_random_bytes(NONCE_SIZE)
+        cipher = AES.new(self.keys[self.key_id], AES.MODE_GCM, nonce=nonce, mac_len=TAG_SIZE)
+        cipher.update(self.key_id)
+        ciphertext, tag = cipher.encrypt_and_digest(data.encode('utf-8'))
+        body = base64.urlsafe_b64encode(nonce + ciphertext + tag).rstrip(b"=")
+        return (self.key_id + KEY_ID_SEPARATOR.encode() + body).decode('ascii')
+
+    def decode(self, token: str) -> str:
+        """
+        Decrypt and authenticate a token encrypted under any known key, or a legacy token.
+        Args:
+        - token (str): Token returned by `encode`, or legacy AES-ECB token.
+        Returns:
+        - str: Decrypted data in string format.
+        Raises:
+        - ValueError: If the key is unknown, or the token was tampered with or is malformed.
+        """
+        key_id, separator, body = token.encode('ascii', errors='replace').partition(KEY_ID_SEPARATOR.encode())
+        if not separator:
+            return self.decode_legacy(token)
+        key = self.keys.get(key_id)
+        if key is None:
+            raise ValueError('Unknown encryption key')
+        raw = base64.urlsafe_b64decode(body + b"=" * (-len(body) % 4))
+        if len(raw) < NONCE_SIZE + TAG_SIZE:
+            raise ValueError('Invalid encrypted data')
+        cipher = AES.new(key, AES.MODE_GCM, nonce=raw[:NONCE_SIZE], mac_len=TAG_SIZE)
+        cipher.update(key_id)
+        return cipher.decrypt_and_verify(raw[NONCE_SIZE:-TAG_SIZE], raw[-TAG_SIZE:]).decode('utf-8')
+
+    def decode_legacy(self, token: str) -> str:
+        """
+        Decrypt a legacy AES-ECB token with the shared legacy cipher.
+        Raises:
+        - ValueError: If legacy tokens are not accepted, or decryption fails.
+        """
+        if self.legacy_cipher is None:
+            raise ValueError('Legacy tokens are not accepted')
+        ciphertext = ciphertext_decode(encrypted_data=token)
+        try:
+            return unpad(self.legacy_cipher.decrypt(ciphertext), AES.block_size).decode('utf-8')
+        except Exception as e:
+            raise ValueError(e)
+
+    def encode_many(self, data: List[str]) -> List[str]:
+        """
+        Encrypt several values under the current key.
+        Args:
+        - data (List[str]): The data to encrypt.
+        Returns:
+        - List[str]: The encrypted values, in the same order.
+        """
+        return [self.encode(value) for value in data]
+
+    def decode_many(self, tokens: List[str]) -> List[Optional[str]]:
+        """
+        Decrypt several tokens, a token failing to decrypt not failing the others.
+        Args:
+        - tokens (List[str]): Tokens to decrypt.
+        Returns:
+        - List[Optional[str]]: The decrypted values in the same order, None for the tokens that failed to decrypt.
+        """
+        decoded = []
+        for token in tokens:
+            try:
+                decoded.append(self.decode(token))
+            except ValueError:
+                decoded.append(None)
+        return decoded
+
+
+@functools.lru_cache
+def get_token_codec() -> TokenCodec:
+    """
+    Function to create once and retrieve the token codec configured by the JWT authentication settings.
+    Returns:
+    - TokenCodec: Codec holding the keys of `encrypt_keys`, and `encrypt_key` if `legacy_tokens` is enabled.
+    """
+    return TokenCodec(keys=app_setting.encrypt_keys, key_id=app_setting.encrypt_key_id,
+                      legacy_key=app_setting.encrypt_key if app_setting.legacy_tokens else None)
+
+
+@receiver(setting_changed)
+def reset_token_codec(*, setting: str, **kwargs) -> None:
+    """
+    Rebuild the token codec when a JWT authentication setting, such as the encryption keys, changes.
+    """
+    if setting.startswith(app_setting.prefix):
+        get_token_codec.cache_clear()
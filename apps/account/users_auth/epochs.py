@@ -0,0 +1,184 @@
+import logging
+import threading
+import uuid
+from typing import Dict, Optional, Tuple
+
+import redis
+
+from apps.account.users_auth.local_cache import invalidation_listener
+from apps.core.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+EPOCHS_KEY = "users_auth:epochs"
+EPOCHS_CHANNEL = "users_auth:epochs"
+EPOCH_FIELD_KEY = "{user_id}:{token_type}"
+GENERATION_FIELD = "generation"
+
+"""
+The epochs hash carries a random generation, created along with the hash and embedded in every token next to its
+epoch. Should the hash be lost, e.g. by a Redis restart without persistence, every epoch would fall back to 0 and
+revoked tokens would pass again; the hash is then recreated under a new generation instead, and tokens of another
+generation are checked against the UUID of their user.
+"""
+CURRENT_EPOCH_SCRIPT = """
+if redis.call('HSETNX', KEYS[1], ARGV[2], ARGV[3]) == 1 then
+    redis.call('PUBLISH', ARGV[4], ARGV[2] .. ':' .. ARGV[3])
+end
+return redis.call('HMGET', KEYS[1], ARGV[2], ARGV[1])
+"""
+
+ADVANCE_EPOCH_SCRIPT = """
+if redis.call('HSETNX', KEYS[1], ARGV[3], ARGV[4]) == 1 then
+    redis.call('PUBLISH', ARGV[2], ARGV[3] .. ':' .. ARGV[4])
+end
+local epoch = redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+redis.call('PUBLISH', ARGV[2], ARGV[1] .. ':' .. epoch)
+return epoch
+"""
+
+
+class EpochSnapshot:
+    """
+    Local replica of the revocation epochs of every user, answering "is this epoch still valid?" without any I/O.
+
+    A user and token type start at epoch 0 and move to the next epoch on every revocation; tokens are minted with
+    the current epoch and are valid as long as it did not move past them. Only users revoked at least once have an
+    entry, in the `EPOCHS_KEY` hash in Redis and in this snapshot. The snapshot is reloaded whenever the invalidation
+    listener (re)subscribes and is not `ready` while it is disconnected, in which case callers must fall back to the
+    UUID lookup. Epochs are only comparable within the `generation` of the hash they were read from.
+    """
+
+    def __init__(self) -> None:
+        self._epochs: Dict[str, int] = {}
+        self._generation: Optional[str] = None
+        self._ready = False
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    @property
+    def generation(self) -> Optional[str]:
+        return self._generation
+
+    def get(self, user_id: int, token_type: int) -> int:
+        """
+        Retrieve the current epoch of a user and token type.
+        """
+        return self._epochs.get(EPOCH_FIELD_KEY.format(user_id=user_id, token_type=token_type), 0)
+
+    def advance(self, field: str, epoch: int) -> None:
+        """
+        Move an epoch forward; older or repeated updates are ignored, so updates may arrive in any order.
+        Args:
+        - field (str): `EPOCH_FIELD_KEY` of the user and token type.
+        - epoch (int): New epoch.
+        """
+        with self._lock:
+            if epoch > self._epochs.get(field, 0):
+                self._epochs[field] = epoch
+
+    def on_message(self, data: str) -> None:
+        field, value = data.rsplit(":", 1)
+        if field == GENERATION_FIELD:
+            self.start_generation(value)
+        else:
+            self.advance(field, int(value))
+
+    def start_generation(self, generation: str) -> None:
+        """
+        Switch to a new generation of the epochs hash, dropping the epochs of the previous one.
+        """
+        with self._lock:
+            if generation != self._generation:
+                self._generation = generation
+                self._epochs = {}
+
+    def reload(self) -> None:
+        """
+        Replace the snapshot with the epochs stored in Redis, merging the updates of the same generation received
+        meanwhile.
+        """
+        stored = {field.decode(): value.decode() for field, value in get_redis_client().hgetall(EPOCHS_KEY).items()}
+        generation = stored.pop(GENERATION_FIELD, None)
+        with self._lock:
+            epochs = {field: int(epoch) for field, epoch in stored.items()}
+            if generation == self._generation:
+                for field, epoch in self._epochs.items():
+                    epochs[field] = max(epochs.get(field, 0), epoch)
+            self._generation = generation
+            self._epochs = epochs
+            self._ready = True
+
+    def invalidate(self) -> None:
+        self._ready = False
+
+
+epoch_snapshot = EpochSnapshot()
+invalidation_listener.register(EPOCHS_CHANNEL, on_message=epoch_snapshot.on_message,
+                               on_subscribe=epoch_snapshot.reload, on_disconnect=epoch_snapshot.invalidate)
+
+
+def current_epoch(user_id: int, token_type: int) -> Optional[Tuple[str, int]]:
+    """
+    Read the generation of the epochs and the current epoch of a user and token type from Redis, to be embedded in
+    a new token. The generation is created, and broadcast, if the epochs hash does not exist yet.
+
+    New tokens are not minted from the snapshot, which may lag behind a revocation and would then mint tokens
+    rejected as soon as it caught up.
+    Args:
+    - user_id (int): The ID of the user.
+    - token_type (int): The type of token (access or refresh).
+    Returns:
+    - Optional[Tuple[str, int]]: The generation and the current epoch, or None if Redis could not be reached.
+    """
+    script = get_redis_client().register_script(CURRENT_EPOCH_SCRIPT)
+    try:
+        generation, epoch = script(keys=[EPOCHS_KEY], args=[
+            EPOCH_FIELD_KEY.format(user_id=user_id, token_type=token_type), GENERATION_FIELD, uuid.uuid4().hex,
+            EPOCHS_CHANNEL
+        ])
+    except redis.RedisError as e:
+        logger.warning("Could not read the epoch of user %s: %s", user_id, e)
+        return None
+    return generation.decode(), int(epoch or 0)
+
+
+def advance_epoch(user_id: int, token_type: int) -> int:
+    """
+    Revoke every token of a user and token type by moving to the next epoch, and broadcast it to every process.
+    Args:
+    - user_id (int): The ID of the user.
+    - token_type (int): The type of token (access or refresh).
+    Returns:
+    - int: The new epoch.
+    Raises:
+    - redis.RedisError: If the epoch could not be moved, in which case the tokens are not revoked.
+    """
+    field = EPOCH_FIELD_KEY.format(user_id=user_id, token_type=token_type)
+    # The epoch is moved and broadcast in one Lua call, so that no process can miss a stored revocation while it
+    # stays subscribed.
+    script = get_redis_client().register_script(ADVANCE_EPOCH_SCRIPT)
+    epoch = script(keys=[EPOCHS_KEY], args=[field, EPOCHS_CHANNEL, GENERATION_FIELD, uuid.uuid4().hex])
+    epoch_snapshot.advance(field, epoch)
+    return epoch
+
+
+def is_epoch_valid(user_id: int, token_type: int, epoch: int, generation: Optional[str]) -> Optional[bool]:
+    """
+    Check locally whether a token epoch was revoked.
+    Args:
+    - user_id (int): The ID of the user.
+    - token_type (int): The type of token (access or refresh).
+    - epoch (int): Epoch carried by the token.
+    - generation (Optional[str]): Generation of the epochs carried by the token.
+    Returns:
+    - Optional[bool]: Whether the epoch is still valid, or None if the snapshot is not in sync with Redis or holds
+      another generation of the epochs.
+    """
+    invalidation_listener.ensure_started()
+    if not epoch_snapshot.ready or generation is None or generation != epoch_snapshot.generation:
+        return None
+    return epoch >= epoch_snapshot.get(user_id, token_type)
@@ -0,0 +1,172 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import redis
+
+from apps.account.users_auth.app_settings import app_setting
+from apps.core.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "users_auth:invalidate"
+
+
+class LocalCache:
+    """
+    Small per-process cache with a short time-to-live, used as the first tier in front of the shared cache.
+
+    Every eviction bumps a generation number. A value read from the shared tier is only stored if no eviction
+    happened since the read started, so an invalidation racing with a read can never be overwritten by the stale
+    value.
+    """
+
+    def __init__(self) -> None:
+        self._entries = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def generation(self) -> int:
+        """
+        Retrieve the current generation, to be passed to `set` once the value was read from the shared tier.
+        """
+        return self._generation
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Retrieve a value if it is cached and did not expire.
+        Args:
+        - key (str): Cache key.
+        Returns:
+        - Optional[Any]: The cached value, or None on a miss.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: str, value: Any, generation: int) -> None:
+        """
+        Cache a value for the configured time-to-live, unless an eviction happened since `generation` was taken.
+        Args:
+        - key (str): Cache key.
+        - value (Any): Value read from the shared tier.
+        - generation (int): Generation taken before reading the value.
+        """
+        timeout = app_setting.snapshot.uuid_local_cache_timeout
+        if timeout <= 0:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            if len(self._entries) >= app_setting.snapshot.uuid_local_cache_size:
+                self._entries.clear()
+            self._entries[key] = (value, time.monotonic() + timeout)
+
+    def delete(self, key: str) -> None:
+        """
+        Evict a key.
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Evict every key.
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+uuid_local_cache = LocalCache()
+
+
+class InvalidationListener:
+    """
+    Background thread applying the invalidations broadcast by other processes through Redis pub/sub.
+
+    Every local structure replicated from Redis registers its channel with handlers for the messages, for the
+    (re)subscriptions and for the disconnections. The thread is started lazily by the first lookup of every process,
+    after a pre-forking server forked its workers. Messages published while it is disconnected are lost, so the
+    structures must drop or reload their state on every (re)subscription.
+    """
+
+    def __init__(self) -> None:
+        self._channels: Dict[str, tuple] = {}
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def register(self, channel: str, on_message: Callable[[str], None], on_subscribe: Callable[[], None],
+                 on_disconnect: Callable[[], None]) -> None:
+        """
+        Register the handlers of a channel, before the listener is started.
+        Args:
+        - channel (str): Redis pub/sub channel.
+        - on_message (Callable[[str], None]): Called with the decoded data of every message.
+        - on_subscribe (Callable[[], None]): Called once subscribed, before any message is handled.
+        - on_disconnect (Callable[[], None]): Called when the connection to Redis was lost.
+        """
+        self._channels[channel] = (on_message, on_subscribe, on_disconnect)
+
+    def ensure_started(self) -> None:
+        """
+        Start the listener of the current process if it is not running yet.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="users-auth-invalidation", daemon=True).start()
+
+    def _run(self) -> None:
+        backoff = 1
+        while True:
+            pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(*self._channels)
+                for _, on_subscribe, _ in self._channels.values():
+                    on_subscribe()
+                backoff = 1
+                while True:
+                    # Poll instead of blocking in `listen`, which would hit the socket timeout of the pool.
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self._channels[message["channel"].decode()][0](message["data"].decode())
+            except redis.RedisError as e:
+                for _, _, on_disconnect in self._channels.values():
+                    on_disconnect()
+                logger.warning("Invalidation listener disconnected, retrying in %ss: %s", backoff, e)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                pubsub.close()
+
+
+invalidation_listener = InvalidationListener()
+invalidation_listener.register(INVALIDATION_CHANNEL, on_message=uuid_local_cache.delete,
+                               on_subscribe=uuid_local_cache.clear, on_disconnect=uuid_local_cache.clear)
+
+
+def publish_invalidation(key: str) -> None:
+    """
+    Evict a key from the local cache of this process and of every other process.
+
+    A failed broadcast is only logged: the other processes then see the change once their entry expires.
+    Args:
+    - key (str): Cache key to evict.
+    """
+    uuid_local_cache.delete(key)
+    try:
+        get_redis_client().publish(INVALIDATION_CHANNEL, key)
+    except redis.RedisError as e:
+        logger.warning("Could not broadcast the invalidation of %s: %s", key, e)
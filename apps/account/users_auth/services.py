@@ -1,8 +1,19 @@
+import logging
 import uuid
-from django.db import IntegrityError
+from collections import defaultdict
+from typing import Dict, Iterable, Tuple
+
+import redis
+from django.db import IntegrityError, transaction
+from django.db.models import F
 from apps.account.models import UserAuth
-from apps.account.users_auth.cache import get_cache, set_cache
+from apps.account.users_auth.cache import get_cache, get_many_cache, set_cache, set_many_cache
+from apps.account.users_auth import device_slots
 from apps.account.users_auth.app_settings import app_setting
+from apps.account.users_auth.epochs import advance_epoch
+from apps.account.users_auth.local_cache import uuid_local_cache, invalidation_listener, publish_invalidation
+
+logger = logging.getLogger(__name__)
 
 ACCESS_UUID_CACHE_KEY = "user:{user_id}:access:uuid"
 REFRESH_UUID_CACHE_KEY = "user:{user_id}:refresh:uuid"
@@ -49,33 +60,194 @@ def create_user_auth(user_id: int, token_type: int, uuid_filed: uuid.UUID | None
     return user_auth
 
 
-def get_user_auth_uuid(user_id: int, token_type: int) -> str:
+def get_or_create_user_auths(user_id: int, token_types: Iterable[int]) -> Dict[int, UserAuth]:
     """
-    Retrieve the UUID associated with a user and token type.
+    Retrieve the UserAuth objects of a user for several token types with one query, creating the missing ones with
+    one bulk insert.
     Args:
     - user_id (int): The ID of the user.
-    - token_type (int): The type of token (access or refresh).
+    - token_types (Iterable[int]): The types of token (access or refresh).
     Returns:
-    - str: The UUID as a string.
+    - Dict[int, UserAuth]: The latest UserAuth object of every token type, keyed by token type.
     """
-    if app_setting.cache_using:
-        access_uuid = get_cache(key=TOKEN_TYPE_KEY[token_type].format(user_id=user_id))
-        if access_uuid:
-            return access_uuid
+    token_types = list(token_types)
+    user_auths = {}
+    if not token_types:
+        return user_auths
+    for user_auth in UserAuth.objects.filter(user_id=user_id, token_type__in=token_types):
+        user_auths.setdefault(user_auth.token_type, user_auth)
+    missing = [UserAuth(user_id=user_id, token_type=token_type, uuid=uuid.uuid4())
+               for token_type in token_types if token_type not in user_auths]
+    for user_auth in UserAuth.objects.bulk_create(missing):
+        user_auths[user_auth.token_type] = user_auth
+    return user_auths
 
-    user_auths = UserAuth.objects.filter(user_id=user_id, token_type=token_type)
-    if user_auths.exists():
-        user_auth = user_auths.first()
-    else:
-        user_auth = create_user_auth(user_id=user_id, token_type=token_type)
 
-    if app_setting.cache_using:
-        set_cache(key=TOKEN_TYPE_KEY[token_type].format(user_id=user_id), value=str(user_auth.uuid),
-                  timeout=60 * 60 * 24 * 30)
+def claim_user_auth_uuids(user_id: int, token_types: Iterable[int]) -> Dict[int, str]:
+    """
+    Retrieve the UUIDs new tokens of a user must carry, counting one more device login per token type when a device
+    limit is set.
+
+    Device logins are counted by an atomic Lua script on Redis slots (see `device_slots`), so concurrent logins of a
+    shared account neither lock nor overwrite the UserAuth rows; the counts are persisted later by the
+    `flush_device_slots` command. A token type whose count reached the limit gets a new UUID, which revokes the
+    tokens of its other devices and is persisted at once. If Redis cannot be reached, the logins are counted on the
+    rows with `F()` updates instead, which `flush_device_slots` adds to the slots once Redis is back.
+    Args:
+    - user_id (int): The ID of the user.
+    - token_types (Iterable[int]): The types of token (access or refresh).
+    Returns:
+    - Dict[int, str]: The UUIDs as strings, keyed by token type.
+    """
+    device_limit = app_setting.snapshot.get_device_limit
+    if not device_limit:
+        return get_user_auth_uuids(user_id=user_id, token_types=token_types)
+
+    token_types = list(token_types)
+    candidates = {token_type: str(uuid.uuid4()) for token_type in token_types}
+    try:
+        claims = device_slots.claim_slots(user_id=user_id, token_types=token_types, device_limit=device_limit,
+                                          candidates=candidates)
+        missing = [token_type for token_type, claim in claims.items() if claim is None]
+        if missing:
+            seeds = get_or_create_user_auths(user_id=user_id, token_types=missing)
+            claims.update(device_slots.claim_slots(user_id=user_id, token_types=missing, device_limit=device_limit,
+                                                   candidates=candidates, seeds=seeds))
+    except redis.RedisError as e:
+        logger.warning("Could not claim the device slots of user %s, counting on the database: %s", user_id, e)
+        return claim_user_auth_uuids_in_db(user_id=user_id, token_types=token_types, device_limit=device_limit)
+
+    uuids = {}
+    for token_type, (user_auth_id, slot_uuid, rotated) in claims.items():
+        if rotated:
+            user_auth = UserAuth(id=user_auth_id, user_id=user_id, token_type=token_type, uuid=slot_uuid)
+            slot_uuid = persist_slot_uuid(user_auth=user_auth)
+        uuids[token_type] = slot_uuid
+    return uuids
+
+
+def persist_slot_uuid(user_auth: UserAuth) -> str:
+    """
+    Write the UUID a device slot was rotated to on its UserAuth row and make it visible to every process.
 
+    Two logins rotating the same slot may write their UUIDs in any order, so the slot is read again after every
+    write and its latest UUID written in turn, until the row matches it.
+    Args:
+    - user_auth (UserAuth): Unsaved UserAuth object with the ID of the row and the rotated UUID.
+    Returns:
+    - str: The UUID persisted on the row.
+    """
+    if app_setting.snapshot.epoch_revocation:
+        advance_epoch(user_id=user_auth.user_id, token_type=user_auth.token_type)
+
+    while True:
+        UserAuth.objects.filter(id=user_auth.id).update(uuid=user_auth.uuid, device_login_count=1)
+        slot_uuid = device_slots.get_slot_uuid(user_id=user_auth.user_id, token_type=user_auth.token_type)
+        if slot_uuid is None or slot_uuid == str(user_auth.uuid):
+            break
+        user_auth.uuid = slot_uuid
+
+    publish_user_auth_uuid(user_auth=user_auth)
     return str(user_auth.uuid)
 
 
+def claim_user_auth_uuids_in_db(user_id: int, token_types: Iterable[int], device_limit: int) -> Dict[int, str]:
+    """
+    Count one more device login per token type of a user on the UserAuth rows, rotating the UUIDs that reached the
+    device limit. Used when the Redis device slots cannot be reached.
+    Args:
+    - user_id (int): The ID of the user.
+    - token_types (Iterable[int]): The types of token (access or refresh).
+    - device_limit (int): Number of logins after which the UUID is rotated.
+    Returns:
+    - Dict[int, str]: The UUIDs as strings, keyed by token type.
+    """
+    user_auths = get_or_create_user_auths(user_id=user_id, token_types=token_types)
+    kept = [user_auth.id for user_auth in user_auths.values() if user_auth.device_login_count < device_limit]
+    if kept:
+        UserAuth.objects.filter(id__in=kept).update(device_login_count=F("device_login_count") + 1)
+    uuids = {}
+    for token_type, user_auth in user_auths.items():
+        if user_auth.id in kept:
+            uuids[token_type] = str(user_auth.uuid)
+        else:
+            uuids[token_type] = rotate_user_auth_uuid(user_auth=user_auth, device_login_count=1)
+    return uuids
+
+
+def get_user_auth_uuids(user_id: int, token_types: Iterable[int]) -> Dict[int, str]:
+    """
+    Retrieve the UUIDs associated with a user for several token types.
+    Args:
+    - user_id (int): The ID of the user.
+    - token_types (Iterable[int]): The types of token (access or refresh).
+    Returns:
+    - Dict[int, str]: The UUIDs as strings, keyed by token type.
+    """
+    uuids = get_many_user_auth_uuids(pairs=[(user_id, token_type) for token_type in token_types])
+    return {token_type: user_auth_uuid for (_, token_type), user_auth_uuid in uuids.items()}
+
+
+def get_many_user_auth_uuids(pairs: Iterable[Tuple[int, int]]) -> Dict[Tuple[int, int], str]:
+    """
+    Retrieve the UUIDs associated with several users and token types.
+
+    The UUIDs are first looked up in the per-process cache, which the invalidations broadcast by
+    `update_user_auth_uuid` keep in sync, then in the shared cache with a single `get_many` round-trip, and finally
+    in the database.
+    Args:
+    - pairs (Iterable[Tuple[int, int]]): (user ID, token type) pairs.
+    Returns:
+    - Dict[Tuple[int, int], str]: The UUIDs as strings, keyed by (user ID, token type).
+    """
+    keys = {(user_id, token_type): TOKEN_TYPE_KEY[token_type].format(user_id=user_id)
+            for user_id, token_type in pairs}
+    invalidation_listener.ensure_started()
+    uuids = {}
+    for pair, key in keys.items():
+        access_uuid = uuid_local_cache.get(key)
+        if access_uuid:
+            uuids[pair] = access_uuid
+    if len(uuids) == len(keys):
+        return uuids
+    generation = uuid_local_cache.generation()
+
+    if app_setting.snapshot.cache_using:
+        cached = get_many_cache(keys=[key for pair, key in keys.items() if pair not in uuids])
+        for pair, key in keys.items():
+            if cached.get(key):
+                uuids[pair] = cached[key]
+                uuid_local_cache.set(key, cached[key], generation)
+
+    missing = defaultdict(list)
+    for user_id, token_type in keys:
+        if (user_id, token_type) not in uuids:
+            missing[user_id].append(token_type)
+    loaded = {}
+    for user_id, token_types in missing.items():
+        for token_type, user_auth in get_or_create_user_auths(user_id=user_id, token_types=token_types).items():
+            key = keys[(user_id, token_type)]
+            uuids[(user_id, token_type)] = loaded[key] = str(user_auth.uuid)
+            uuid_local_cache.set(key, loaded[key], generation)
+
+    if app_setting.snapshot.cache_using and loaded:
+        set_many_cache(data=loaded, timeout=60 * 60 * 24 * 30)
+
+    return uuids
+
+
+def get_user_auth_uuid(user_id: int, token_type: int) -> str:
+    """
+    Retrieve the UUID associated with a user and token type.
+    Args:
+    - user_id (int): The ID of the user.
+    - token_type (int): The type of token (access or refresh).
+    Returns:
+    - str: The UUID as a string.
+    """
+    return get_user_auth_uuids(user_id=user_id, token_types=(token_type,))[token_type]
+
+
 def get_user_auth(user_id: int, token_type: int) -> UserAuth:
     """
     Retrieve the UserAuth object associated with a user and token type.
@@ -88,12 +260,13 @@ def get_user_auth(user_id: int, token_type: int) -> UserAuth:
     user_auths = UserAuth.objects.filter(user_id=user_id, token_type=token_type)
     if user_auths.exists():
         user_auth = user_auths.first()
-        if app_setting.cache_using and not get_cache(key=TOKEN_TYPE_KEY[token_type].format(user_id=user_id)):
+        if (app_setting.snapshot.cache_using
+                and not get_cache(key=TOKEN_TYPE_KEY[token_type].format(user_id=user_id))):
             set_cache(key=TOKEN_TYPE_KEY[token_type].format(user_id=user_id), value=str(user_auth.uuid),
                       timeout=60 * 60 * 24 * 30)
     else:
         user_auth = create_user_auth(user_id=user_id, token_type=token_type)
-        if app_setting.cache_using:
+        if app_setting.snapshot.cache_using:
             set_cache(key=TOKEN_TYPE_KEY[token_type].format(user_id=user_id), value=str(user_auth.uuid),
                       timeout=60 * 60 * 24 * 30)
 
@@ -111,13 +284,65 @@ def update_user_auth_uuid(user_id: int, token_type: int) -> str:
     """
     user_auths = UserAuth.objects.filter(user_id=user_id, token_type=token_type)
     if user_auths.exists():
-        user_auth = user_auths.first()
-        user_auth = save_user_auth_uuid(user_auth=user_auth)
-    else:
-        user_auth = create_user_auth(user_id=user_id, token_type=token_type)
+        return rotate_user_auth_uuid(user_auth=user_auths.first())
+
+    if app_setting.snapshot.epoch_revocation:
+        advance_epoch(user_id=user_id, token_type=token_type)
+    user_auth = create_user_auth(user_id=user_id, token_type=token_type)
+    publish_user_auth_uuid(user_auth=user_auth)
+    return str(user_auth.uuid)
+
+
+def rotate_user_auth_uuid(user_auth: UserAuth, device_login_count: int | None = None) -> str:
+    """
+    Give a UserAuth object a new UUID, revoking every token carrying the previous one.
+
+    With `epoch_revocation`, the epoch of the user is moved first, so that a failure to reach Redis leaves the tokens
+    valid everywhere rather than only in some processes. The device slot of the row, if any, is moved to the new UUID,
+    or dropped by the next `flush_device_slots` if Redis cannot be reached.
+    Args:
+    - user_auth (UserAuth): The UserAuth object to rotate.
+    - device_login_count (Optional[int]): New device login count, unchanged if None.
+    Returns:
+    - str: The new UUID as a string.
+    """
+    if app_setting.snapshot.epoch_revocation:
+        advance_epoch(user_id=user_auth.user_id, token_type=user_auth.token_type)
 
-    if app_setting.cache_using:
-        set_cache(key=TOKEN_TYPE_KEY[token_type].format(user_id=user_id), value=str(user_auth.uuid),
-                  timeout=60 * 60 * 24 * 30)
+    update_fields = ["uuid"]
+    if device_login_count is not None:
+        user_auth.device_login_count = device_login_count
+        update_fields.append("device_login_count")
+    while True:
+        try:
+            user_auth.uuid = uuid.uuid4()
+            with transaction.atomic():
+                user_auth.save(update_fields=update_fields)
+            break
+        except IntegrityError:
+            pass
 
+    try:
+        device_slots.set_slot_uuid(user_id=user_auth.user_id, token_type=user_auth.token_type,
+                                   slot_uuid=str(user_auth.uuid), device_login_count=device_login_count)
+    except redis.RedisError as e:
+        logger.warning("Could not update the device slot of user %s: %s", user_auth.user_id, e)
+    publish_user_auth_uuid(user_auth=user_auth)
     return str(user_auth.uuid)
+
+
+def publish_user_auth_uuid(user_auth: UserAuth) -> None:
+    """
+    Make the current UUID of a UserAuth object visible to every process.
+
+    The UUID is written to the shared cache, and the previous one is evicted from the cache of this process at once
+    and from the cache of every other process through Redis pub/sub once the transaction commits, so that they do
+    not read it back from the database.
+    Args:
+    - user_auth (UserAuth): The UserAuth object whose UUID changed.
+    """
+    key = TOKEN_TYPE_KEY[user_auth.token_type].format(user_id=user_auth.user_id)
+    if app_setting.snapshot.cache_using:
+        set_cache(key=key, value=str(user_auth.uuid), timeout=60 * 60 * 24 * 30)
+    uuid_local_cache.delete(key)
+    transaction.on_commit(lambda: publish_invalidation(key))
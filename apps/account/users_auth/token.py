@@ -1,19 +1,27 @@
-from typing import Dict
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import redis
 from django.http import HttpRequest
 from rest_framework_simplejwt.tokens import Token, UntypedToken
 from rest_framework_simplejwt.tokens import TokenError as BaseTokenError
 from django.utils.timezone import now
 from django.contrib.auth import get_user_model
 from .app_settings import app_setting
-from apps.account.users_auth.encryption import encrypt, decrypt
+from apps.account.users_auth.activity import record_login
+from apps.account.users_auth.encryption import get_token_codec
 from apps.account.users_auth.exceptions import TokenError
 from apps.account.users_auth.client import get_client_info
 from apps.account.models import UserAuth
 from datetime import datetime
 from django.db.models.fields.files import File
 from apps.account.users_auth.constants import ACCESS_TOKEN, REFRESH_TOKEN, UUID_FIELD, USER_ID, TOKEN_TYPE, DEVICE_NAME, \
-    IP_ADDRESS
-from apps.account.users_auth.services import get_user_auth_uuid, update_user_auth_uuid, get_user_auth
+    IP_ADDRESS, EPOCH_FIELD, EPOCH_GENERATION_FIELD
+from apps.account.users_auth.epochs import current_epoch, is_epoch_valid
+from apps.account.users_auth.services import get_user_auth_uuid, get_many_user_auth_uuids, claim_user_auth_uuids
+from apps.account.users_auth.token_cache import validated_tokens
+
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
@@ -28,22 +36,18 @@ class RefreshToken(Token):
     token_type = REFRESH_TOKEN
 
 
-def set_token_claims(*, token: Token, claims: Dict, **kwargs):
+def set_token_claims(*, token: Token, claims: Iterable[str], **kwargs):
     """
     Set claims (data fields) on a given token based on provided kwargs.
     Args:
     - token (Token): The token object to set claims on.
-    - claims (Dict): Dictionary containing claim names and their values.
+    - claims (Iterable[str]): Claim names, such as the claim key tuples of the settings snapshot or a claims dict.
     - **kwargs: Additional key-value pairs to set as claims on the token.
     """
     for key in claims:
-        claims[key] = kwargs[key]
-
-    for key, value in claims.items():
+        value = kwargs[key]
         if isinstance(value, File):
             token[key] = value.url
-        elif isinstance(value, File):
-            token[key] = value.url
         elif isinstance(value, datetime):
             token[key] = str(value)
         else:
@@ -61,35 +65,83 @@ def get_token_claims(*, token: Token, claims: Dict):
         claims[key] = token.get(key)
 
 
-def generate_refresh_token_with_claims(**kwargs) -> str:
+def set_token_epoch(*, token: Token, user_id: int, token_type: int) -> None:
     """
-    Generate a refresh token with specified claims.
+    Set the current revocation epoch of a user on a token, leaving it out if Redis could not be reached, in which
+    case the token is checked against the UUID of the user instead.
     Args:
-    - **kwargs: Key-value pairs representing token claims (e.g., user ID, UUID, device info).
+    - token (Token): The token object to set the epoch on.
+    - user_id (int): The ID of the user.
+    - token_type (int): The type of token (access or refresh).
+    """
+    current = current_epoch(user_id=user_id, token_type=token_type)
+    if current is not None:
+        token[EPOCH_GENERATION_FIELD], token[EPOCH_FIELD] = current
+
+
+def is_token_revoked(token: Token, token_type: int) -> bool:
+    """
+    Check whether a token was revoked since it was minted.
+    Tokens carrying an epoch are checked against the local epoch snapshot without any I/O while it is in sync with
+    Redis; other tokens are checked against the UUID of the user.
+    Args:
+    - token (Token): The token to check.
+    - token_type (int): The type of token (access or refresh).
     Returns:
-    - str: Encrypted refresh token string.
+    - bool: True if the token was revoked, False otherwise.
     """
-    refresh_token = RefreshToken()
+    revoked = is_token_epoch_revoked(token=token, token_type=token_type)
+    if revoked is not None:
+        return revoked
+    return get_user_auth_uuid(user_id=token[USER_ID], token_type=token_type) != token[UUID_FIELD]
 
-    if app_setting.get_device_limit:
-        user_auth = get_user_auth(user_id=kwargs[USER_ID], token_type=UserAuth.REFRESH_TOKEN)
-        if user_auth.device_login_count >= app_setting.get_device_limit:
-            user_auth.device_login_count = 0
-            uuid = update_user_auth_uuid(user_id=kwargs[USER_ID], token_type=UserAuth.REFRESH_TOKEN)
-            kwargs[UUID_FIELD] = uuid
-            user_auth.uuid = uuid
-        else:
-            kwargs[UUID_FIELD] = str(user_auth.uuid)
-        user_auth.device_login_count += 1
-        user_auth.save()
-    else:
-        kwargs[UUID_FIELD] = get_user_auth_uuid(user_id=kwargs[USER_ID], token_type=UserAuth.REFRESH_TOKEN)
 
-    set_token_claims(token=refresh_token, claims=app_setting.refresh_token_claims, **kwargs)
+def is_token_epoch_revoked(token: Token, token_type: int) -> Optional[bool]:
+    """
+    Check a token against the local epoch snapshot, without any I/O.
+    Args:
+    - token (Token): The token to check.
+    - token_type (int): The type of token (access or refresh).
+    Returns:
+    - Optional[bool]: Whether the token was revoked, or None if its UUID must be checked instead.
+    """
+    if app_setting.snapshot.epoch_revocation and EPOCH_FIELD in token:
+        valid = is_epoch_valid(user_id=token[USER_ID], token_type=token_type, epoch=token[EPOCH_FIELD],
+                               generation=token.get(EPOCH_GENERATION_FIELD))
+        if valid is not None:
+            return not valid
+    return None
+
 
-    refresh_token = encrypt_token(refresh_token)
+def build_token(*, token: Token, claims: Iterable[str], token_type: int, **kwargs) -> str:
+    """
+    Set the claims, and the revocation epoch if enabled, on a new token and encrypt it.
+    Args:
+    - token (Token): The new token object.
+    - claims (Iterable[str]): Claim names taken from kwargs.
+    - token_type (int): The type of token (access or refresh) as stored in UserAuth.
+    - **kwargs: Key-value pairs representing token claims, including the UUID.
+    Returns:
+    - str: Encrypted token string.
+    """
+    set_token_claims(token=token, claims=claims, **kwargs)
+    if app_setting.snapshot.epoch_revocation:
+        set_token_epoch(token=token, user_id=kwargs[USER_ID], token_type=token_type)
+    return encrypt_token(token)
 
-    return refresh_token
+
+def generate_refresh_token_with_claims(**kwargs) -> str:
+    """
+    Generate a refresh token with specified claims.
+    Args:
+    - **kwargs: Key-value pairs representing token claims (e.g., user ID, UUID, device info).
+    Returns:
+    - str: Encrypted refresh token string.
+    """
+    uuids = claim_user_auth_uuids(user_id=kwargs[USER_ID], token_types=(UserAuth.REFRESH_TOKEN,))
+    kwargs[UUID_FIELD] = uuids[UserAuth.REFRESH_TOKEN]
+    return build_token(token=RefreshToken(), claims=app_setting.snapshot.refresh_token_claim_keys,
+                       token_type=UserAuth.REFRESH_TOKEN, **kwargs)
 
 
 def generate_access_token_with_claims(**kwargs) -> str:
@@ -100,27 +152,10 @@ def generate_access_token_with_claims(**kwargs) -> str:
     Returns:
     - str: Encrypted access token string.
     """
-    access_token = AccessToken()
-
-    if app_setting.get_device_limit:
-        user_auth = get_user_auth(user_id=kwargs[USER_ID], token_type=UserAuth.ACCESS_TOKEN)
-        if user_auth.device_login_count >= app_setting.get_device_limit:
-            user_auth.device_login_count = 0
-            uuid = update_user_auth_uuid(user_id=kwargs[USER_ID], token_type=UserAuth.ACCESS_TOKEN)
-            kwargs[UUID_FIELD] = uuid
-            user_auth.uuid = uuid
-        else:
-            kwargs[UUID_FIELD] = str(user_auth.uuid)
-        user_auth.device_login_count += 1
-        user_auth.save()
-    else:
-        kwargs[UUID_FIELD] = get_user_auth_uuid(user_id=kwargs[USER_ID], token_type=UserAuth.ACCESS_TOKEN)
-
-    set_token_claims(token=access_token, claims=app_setting.access_token_claims, **kwargs)
-
-    access_token = encrypt_token(access_token)
-
-    return access_token
+    uuids = claim_user_auth_uuids(user_id=kwargs[USER_ID], token_types=(UserAuth.ACCESS_TOKEN,))
+    kwargs[UUID_FIELD] = uuids[UserAuth.ACCESS_TOKEN]
+    return build_token(token=AccessToken(), claims=app_setting.snapshot.access_token_claim_keys,
+                       token_type=UserAuth.ACCESS_TOKEN, **kwargs)
 
 
 def get_user_by_access_token(token: Token) -> User:
@@ -131,12 +166,8 @@ def get_user_by_access_token(token: Token) -> User:
     Returns:
     - User: User object based on the token claims.
     """
-    claims = app_setting.access_token_user_field_claims
-
-    get_token_claims(token=token, claims=claims)
-
     return User(
-        **claims
+        **{key: token.get(key) for key in app_setting.snapshot.access_token_user_field_claim_keys}
     )
 
 
@@ -151,7 +182,7 @@ def encrypt_token(token: Token) -> str:
     - TokenError: If encryption fails.
     """
     try:
-        encrypted_token = encrypt(data=str(token), key=app_setting.encrypt_key)
+        encrypted_token = get_token_codec().encode(data=str(token))
     except ValueError as err:
         raise TokenError(err)
     return encrypted_token
@@ -168,15 +199,40 @@ def decrypt_token(token: str) -> str:
     - TokenError: If decryption fails.
     """
     try:
-        decrypted_token = decrypt(encrypted=token.encode(), key=app_setting.encrypt_key)
+        decrypted_token = get_token_codec().decode(token=token)
     except ValueError as err:
         raise TokenError(err)
     return decrypted_token
 
 
+def update_last_login(user: User) -> None:
+    """
+    Record a login of a user, writing only `last_login`, and only if the previous one is older than
+    `last_login_update_interval`, so that bursts of logins and refreshes do not rewrite the row every time.
+    With `last_login_buffer`, the login is buffered in Redis and written later by the `flush_last_logins` command,
+    falling back to a direct write if Redis cannot be reached.
+    Args:
+    - user (User): User who logged in.
+    """
+    current_time = now()
+    interval = app_setting.snapshot.last_login_update_interval
+    if user.last_login is not None and (current_time - user.last_login).total_seconds() < interval:
+        return
+    user.last_login = current_time
+    if app_setting.snapshot.last_login_buffer:
+        try:
+            record_login(user_id=user.id, moment=current_time)
+            return
+        except redis.RedisError as e:
+            logger.warning("Could not buffer the login of user %s: %s", user.id, e)
+    user.save(update_fields=["last_login"])
+
+
 def generate_token(request: HttpRequest, user: User) -> Dict:
     """
     Generate access and refresh tokens for a given user based on client request information.
+    Both UserAuth rows are fetched, or created, together and `last_login` is written alone, so a login costs a fixed
+    small number of statements.
     Args:
     - request (HttpRequest): HTTP request object containing client information.
     - user (User): User object for whom tokens are generated.
@@ -184,12 +240,17 @@ def generate_token(request: HttpRequest, user: User) -> Dict:
     - Dict: Dictionary containing access and refresh tokens.
     """
     client_info = get_client_info(request=request)
-    refresh_token = generate_refresh_token_with_claims(**client_info, **user.__dict__)
+    uuids = claim_user_auth_uuids(user_id=user.id, token_types=(UserAuth.REFRESH_TOKEN, UserAuth.ACCESS_TOKEN))
+    claims = {**client_info, **user.__dict__}
 
-    access_token = generate_access_token_with_claims(**client_info, **user.__dict__)
+    refresh_token = build_token(token=RefreshToken(), claims=app_setting.snapshot.refresh_token_claim_keys,
+                                token_type=UserAuth.REFRESH_TOKEN,
+                                **{**claims, UUID_FIELD: uuids[UserAuth.REFRESH_TOKEN]})
 
-    user.last_login = now()
-    user.save()
+    access_token = build_token(token=AccessToken(), claims=app_setting.snapshot.access_token_claim_keys,
+                               token_type=UserAuth.ACCESS_TOKEN, **{**claims, UUID_FIELD: uuids[UserAuth.ACCESS_TOKEN]})
+
+    update_last_login(user=user)
 
     return {
         ACCESS_TOKEN: access_token,
@@ -197,6 +258,22 @@ def generate_token(request: HttpRequest, user: User) -> Dict:
     }
 
 
+def validate_client_info(token: Token, client_info: Dict) -> None:
+    """
+    Validate a token against client information: the device name for every token, and the IP address for access
+    tokens.
+    Args:
+    - token (Token): Token to be validated.
+    - client_info (Dict): Dictionary containing client information (e.g., device name, IP address).
+    Raises:
+    - TokenError: If the client does not match the token.
+    """
+    if client_info[DEVICE_NAME] != token[DEVICE_NAME]:
+        raise TokenError("invalid token")
+    if token[TOKEN_TYPE] == ACCESS_TOKEN and client_info[IP_ADDRESS] != token[IP_ADDRESS]:
+        raise TokenError("invalid token")
+
+
 def validate_refresh_token(token: Token, client_info: Dict) -> None:
     """
     Validate a refresh token against client information.
@@ -206,10 +283,8 @@ def validate_refresh_token(token: Token, client_info: Dict) -> None:
     Raises:
     - TokenError: If token validation fails.
     """
-    if client_info[DEVICE_NAME] != token[DEVICE_NAME]:
-        raise TokenError("invalid token")
-    uuid_field = get_user_auth_uuid(user_id=token[USER_ID], token_type=UserAuth.REFRESH_TOKEN)
-    if uuid_field != token[UUID_FIELD]:
+    validate_client_info(token=token, client_info=client_info)
+    if is_token_revoked(token=token, token_type=UserAuth.REFRESH_TOKEN):
         raise TokenError("invalid uuid")
 
 
@@ -222,16 +297,16 @@ def validate_access_token(token: Token, client_info: Dict) -> None:
     Raises:
     - TokenError: If token validation fails.
     """
-    if client_info[DEVICE_NAME] != token[DEVICE_NAME] or client_info[IP_ADDRESS] != token[IP_ADDRESS]:
-        raise TokenError("invalid token")
-    uuid_field = get_user_auth_uuid(user_id=token[USER_ID], token_type=UserAuth.ACCESS_TOKEN)
-    if uuid_field != token[UUID_FIELD]:
+    validate_client_info(token=token, client_info=client_info)
+    if is_token_revoked(token=token, token_type=UserAuth.ACCESS_TOKEN):
         raise TokenError("invalid token")
 
 
 def validate_token(request: HttpRequest, raw_token: str) -> Token:
     """
     Validate and decrypt a token string to retrieve the token object.
+    Tokens validated before are served from the in-process LRU without decrypting nor verifying them again, while
+    the client information and the UUID of the token are checked on every call.
     Args:
     - request (HttpRequest): HTTP request object containing client information.
     - raw_token (str): Raw token string to be validated and decrypted.
@@ -240,11 +315,14 @@ def validate_token(request: HttpRequest, raw_token: str) -> Token:
     Raises:
     - TokenError: If token validation or decryption fails.
     """
-    string_token = decrypt_token(token=raw_token)
-    try:
-        token = UntypedToken(token=string_token)
-    except BaseTokenError as err:
-        raise TokenError(err)
+    token = validated_tokens.get(raw_token)
+    if token is None:
+        string_token = decrypt_token(token=raw_token)
+        try:
+            token = UntypedToken(token=string_token)
+        except BaseTokenError as err:
+            raise TokenError(err)
+        validated_tokens.put(raw_token, token)
 
     client_info = get_client_info(request=request)
 
@@ -256,6 +334,54 @@ def validate_token(request: HttpRequest, raw_token: str) -> Token:
     return token
 
 
+def validate_tokens(raw_tokens: Sequence[Tuple[str, Dict]]) -> List[Union[Token, TokenError]]:
+    """
+    Validate a batch of token strings, each against the information of its own client, as `validate_token` would.
+    Tokens are decrypted and verified unless found in the in-process LRU, and the UUIDs of the tokens not settled
+    by the epoch snapshot are looked up together, with at most one `get_many` round-trip to the shared cache.
+    Args:
+    - raw_tokens (Sequence[Tuple[str, Dict]]): Raw token strings with their client information.
+    Returns:
+    - List[Union[Token, TokenError]]: The validated token, or the error it failed with, of every token in order.
+    """
+    results: List[Union[Token, TokenError, None]] = [validated_tokens.get(raw_token) for raw_token, _ in raw_tokens]
+    misses = [index for index, result in enumerate(results) if result is None]
+    decrypted = get_token_codec().decode_many(tokens=[raw_tokens[index][0] for index in misses])
+    for index, string_token in zip(misses, decrypted):
+        if string_token is None:
+            results[index] = TokenError("invalid token")
+            continue
+        try:
+            results[index] = UntypedToken(token=string_token)
+        except BaseTokenError as err:
+            results[index] = TokenError(err)
+            continue
+        validated_tokens.put(raw_tokens[index][0], results[index])
+
+    pending = {}
+    for index, token in enumerate(results):
+        if isinstance(token, TokenError) or token[TOKEN_TYPE] not in (ACCESS_TOKEN, REFRESH_TOKEN):
+            continue
+        token_type = UserAuth.ACCESS_TOKEN if token[TOKEN_TYPE] == ACCESS_TOKEN else UserAuth.REFRESH_TOKEN
+        try:
+            validate_client_info(token=token, client_info=raw_tokens[index][1])
+        except TokenError as err:
+            results[index] = err
+            continue
+        revoked = is_token_epoch_revoked(token=token, token_type=token_type)
+        if revoked is None:
+            pending[index] = (token[USER_ID], token_type)
+        elif revoked:
+            results[index] = TokenError("invalid token")
+
+    uuids = get_many_user_auth_uuids(pairs=set(pending.values())) if pending else {}
+    for index, pair in pending.items():
+        if uuids[pair] != results[index][UUID_FIELD]:
+            results[index] = TokenError("invalid token")
+
+    return results
+
+
 def refresh_access_token(request: HttpRequest, raw_refresh_token: str) -> str:
     """
     Refresh an access token based on a provided refresh token.
@@ -278,8 +404,7 @@ def refresh_access_token(request: HttpRequest, raw_refresh_token: str) -> str:
     except User.DoesNotExist as err:
         raise TokenError(err)
 
-    user.last_login = now()
-    user.save()
+    update_last_login(user=user)
 
     return generate_access_token_with_claims(**user.__dict__, **client_info)
 
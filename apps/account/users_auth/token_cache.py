@@ -0,0 +1,88 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework_simplejwt.tokens import Token
+
+from apps.account.users_auth.app_settings import app_setting
+
+
+class ValidatedTokenCache:
+    """
+    Bounded in-process LRU of tokens whose encryption and signature were already verified.
+
+    Entries are keyed by the SHA-256 digest of the raw token, so raw tokens are never kept in memory, and expire
+    with the `exp` claim of their token. Only the cryptographic work is cached: device, IP address and revocation
+    checks must still run on every request.
+    """
+
+    def __init__(self) -> None:
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(raw_token: str) -> bytes:
+        """
+        Hash a raw token into its cache key.
+        """
+        return hashlib.sha256(raw_token.encode()).digest()
+
+    def get(self, raw_token: str) -> Optional[Token]:
+        """
+        Retrieve the validated token of a raw token, if it was validated before and did not expire since.
+        Args:
+        - raw_token (str): Encrypted token string sent by the client.
+        Returns:
+        - Optional[Token]: The validated token, or None on a miss.
+        """
+        key = self._key(raw_token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            token, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return token
+
+    def put(self, raw_token: str, token: Token) -> None:
+        """
+        Remember a validated token until its expiry, evicting the least recently used tokens beyond the cache size.
+        Args:
+        - raw_token (str): Encrypted token string sent by the client.
+        - token (Token): The token decoded and verified from it.
+        """
+        size = app_setting.snapshot.validated_token_cache_size
+        if size <= 0 or "exp" not in token:
+            return
+        key = self._key(raw_token)
+        with self._lock:
+            self._entries[key] = (token, token["exp"])
+            self._entries.move_to_end(key)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Forget every validated token, e.g. after the encryption key changed.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+validated_tokens = ValidatedTokenCache()
+
+
+@receiver(setting_changed)
+def clear_validated_tokens(*, setting: str, **kwargs) -> None:
+    """
+    Forget the validated tokens when a JWT authentication setting, such as the encryption key, changes.
+    """
+    if setting.startswith(app_setting.prefix):
+        validated_tokens.clear()
@@ -0,0 +1,43 @@
+from rest_framework import status, views
+from rest_framework.response import Response
+
+from apps.account.permissions import HasIntrospectionSecret
+from apps.account.serializers.token import TokenIntrospectionSerializer
+from apps.account.users_auth.constants import DEVICE_NAME, IP_ADDRESS
+from apps.account.users_auth.exceptions import TokenError
+from apps.account.users_auth.token import validate_tokens
+
+
+class TokenIntrospection(views.APIView):
+    """
+    API view letting internal services, such as the gateway, verify a batch of tokens in one request.
+    Every token is validated against the information of the client that sent it, as the authentication of this app
+    would, and its claims are returned if it is valid.
+    """
+    authentication_classes = []
+    permission_classes = [HasIntrospectionSecret]
+
+    def post(self, request):
+        """
+        Handles POST requests to introspect a batch of tokens.
+
+        - Parameters:
+            - `request`: The HTTP request object containing the tokens and the information of their clients.
+        - Returns: A `Response` object with, in order, the validity of every token and either its claims or the
+         reason it is invalid.
+        """
+        serializer = TokenIntrospectionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        items = serializer.validated_data['tokens']
+        results = validate_tokens(raw_tokens=[
+            (item['token'], {DEVICE_NAME: item['device_name'], IP_ADDRESS: item['ip_address']}) for item in items
+        ])
+        return Response({
+            'results': [
+                {'valid': False, 'error': str(result)} if isinstance(result, TokenError)
+                else {'valid': True, 'claims': result.payload}
+                for result in results
+            ]
+        }, status=status.HTTP_200_OK)
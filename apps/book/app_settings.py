@@ -0,0 +1,258 @@
+import functools
+
+
+class AppSettings:
+
+    def __init__(self, prefix: str) -> None:
+        """
+        Initialize the AppSettings instance with a prefix.
+        Args:
+        - prefix (str): Prefix used to construct settings names.
+        """
+        self.prefix = prefix
+
+    def _setting(self, name: str, default: object):
+        """
+        Retrieve a setting value from Django settings, using a default value if not set.
+        Args:
+        - name (str): Name of the setting.
+        - default (object): Default value if setting is not found.
+        Returns:
+        - object: Retrieved setting value or default value.
+        """
+        from django.conf import settings
+        return getattr(settings, self.prefix + name, default)
+
+    @property
+    def autocomplete_prefix_length(self):
+        """
+        Property to retrieve the longest prefix answered from the in-process prefix index, defaulting to 3.
+        Returns:
+        - int: Prefixes up to this many characters are served without touching the database.
+        """
+        return self._setting("AUTOCOMPLETE_PREFIX_LENGTH", 3)
+
+    @property
+    def autocomplete_limit(self):
+        """
+        Property to retrieve the maximum number of autocomplete suggestions, defaulting to 10.
+        Returns:
+        - int: Maximum number of suggestions returned for a prefix.
+        """
+        return self._setting("AUTOCOMPLETE_LIMIT", 10)
+
+    @property
+    def autocomplete_refresh_interval(self):
+        """
+        Property to retrieve how often the in-process prefix index is rebuilt, defaulting to 5 minutes.
+        Returns:
+        - int: Refresh interval in seconds.
+        """
+        return self._setting("AUTOCOMPLETE_REFRESH_INTERVAL", 60 * 5)
+
+    @property
+    def export_itersize(self):
+        """
+        Property to retrieve how many rows the catalog export fetches and encodes per chunk, defaulting to 2000.
+        Returns:
+        - int: Number of rows per server-side cursor round-trip.
+        """
+        return self._setting("EXPORT_ITERSIZE", 2000)
+
+    @property
+    def score_batch_max_size(self):
+        """
+        Property to retrieve the maximum number of ratings accepted by one batch submission, defaulting to 500.
+        Returns:
+        - int: Maximum number of {book_id, rating} pairs per request.
+        """
+        return self._setting("SCORE_BATCH_MAX_SIZE", 500)
+
+    @property
+    def score_write_behind(self):
+        """
+        Property to determine if rating mutations are buffered in Redis instead of written synchronously.
+        Returns:
+        - bool: True if write-behind mode is enabled, False otherwise.
+        """
+        return self._setting("SCORE_WRITE_BEHIND", False)
+
+    @property
+    def score_write_behind_stream(self):
+        """
+        Property to retrieve the Redis stream buffering rating mutations, defaulting to 'reviews:write-behind'.
+        Returns:
+        - str: Key of the Redis stream.
+        """
+        return self._setting("SCORE_WRITE_BEHIND_STREAM", "reviews:write-behind")
+
+    @property
+    def score_write_behind_batch_size(self):
+        """
+        Property to retrieve how many buffered mutations the flusher applies per batch, defaulting to 5000.
+        Returns:
+        - int: Number of stream entries read and written per bulk statement.
+        """
+        return self._setting("SCORE_WRITE_BEHIND_BATCH_SIZE", 5000)
+
+    @property
+    def outbox_consumers(self):
+        """
+        Property to retrieve the consumers of the outbox relay, defaulting to the leaderboards, sketches and genres.
+        Returns:
+        - dict: Dotted paths of the consumer callables keyed by consumer name.
+        """
+        return self._setting("OUTBOX_CONSUMERS", {
+            "leaderboard": "apps.book.services.leaderboard.consume_events",
+            "sketches": "apps.book.services.sketches.consume_events",
+            "genres": "apps.book.services.genres.consume_events",
+        })
+
+    @property
+    def outbox_batch_size(self):
+        """
+        Property to retrieve how many outbox events are delivered to a consumer per batch, defaulting to 1000.
+        Returns:
+        - int: Number of events per batch.
+        """
+        return self._setting("OUTBOX_BATCH_SIZE", 1000)
+
+    @property
+    def outbox_poll_interval(self):
+        """
+        Property to retrieve how long the outbox relay sleeps when every consumer is caught up, defaulting to 1 second.
+        Returns:
+        - float: Poll interval in seconds.
+        """
+        return self._setting("OUTBOX_POLL_INTERVAL", 1)
+
+    @property
+    def outbox_retention_days(self):
+        """
+        Property to retrieve for how many days outbox events are kept once every consumer saw them, defaulting to 90.
+        Returns:
+        - int: Retention period in days, to keep at least `sketch_retention_days` and the trending window.
+        """
+        return self._setting("OUTBOX_RETENTION_DAYS", 90)
+
+    @property
+    def score_page_size(self):
+        """
+        Property to retrieve how many scores one page of the user's scores holds by default, defaulting to 20.
+        Returns:
+        - int: Default page size.
+        """
+        return self._setting("SCORE_PAGE_SIZE", 20)
+
+    @property
+    def score_page_max_size(self):
+        """
+        Property to retrieve the largest page size a client may request for the user's scores, defaulting to 100.
+        Returns:
+        - int: Maximum page size.
+        """
+        return self._setting("SCORE_PAGE_MAX_SIZE", 100)
+
+    @property
+    def change_feed_limit(self):
+        """
+        Property to retrieve the largest number of rating changes returned by one change feed call, defaulting to 1000.
+        Returns:
+        - int: Maximum number of changes per call.
+        """
+        return self._setting("CHANGE_FEED_LIMIT", 1000)
+
+    @property
+    def leaderboard_limit(self):
+        """
+        Property to retrieve the largest number of books a leaderboard read returns, defaulting to 100.
+        Returns:
+        - int: Maximum number of books per leaderboard read.
+        """
+        return self._setting("LEADERBOARD_LIMIT", 100)
+
+    @property
+    def leaderboard_half_life(self):
+        """
+        Property to retrieve the half-life of the trending scores, defaulting to 1 day.
+        Returns:
+        - int: Half-life in seconds after which a rating weighs half as much in the trending scores.
+        """
+        return self._setting("LEADERBOARD_HALF_LIFE", 60 * 60 * 24)
+
+    @property
+    def leaderboard_trending_window(self):
+        """
+        Property to retrieve how many half-lives of events a trending rebuild aggregates, defaulting to 10.
+        Returns:
+        - int: Number of half-lives.
+        """
+        return self._setting("LEADERBOARD_TRENDING_WINDOW", 10)
+
+    @property
+    def leaderboard_prior_weight(self):
+        """
+        Property to retrieve how many virtual ratings damp the top-rated scores, defaulting to 5.
+        Returns:
+        - int: Weight of the prior mean in the Bayesian average.
+        """
+        return self._setting("LEADERBOARD_PRIOR_WEIGHT", 5)
+
+    @property
+    def leaderboard_prior_mean(self):
+        """
+        Property to retrieve the rating the top-rated scores are damped towards, defaulting to 3.
+        Returns:
+        - float: Prior mean of the Bayesian average.
+        """
+        return self._setting("LEADERBOARD_PRIOR_MEAN", 3.0)
+
+    @property
+    def sketch_retention_days(self):
+        """
+        Property to retrieve how many days the daily unique raters sketches are kept, defaulting to 90.
+        Returns:
+        - int: Retention in days, and the longest window the statistics can be requested over.
+        """
+        return self._setting("SKETCH_RETENTION_DAYS", 90)
+
+    @property
+    def stats_max_books(self):
+        """
+        Property to retrieve how many books and genres one statistics request may merge, defaulting to 100.
+        Returns:
+        - int: Maximum number of books and genres per request.
+        """
+        return self._setting("STATS_MAX_BOOKS", 100)
+
+    @property
+    def lookup_max_size(self):
+        """
+        Property to retrieve the maximum number of books one batch lookup may request, defaulting to 50.
+        Returns:
+        - int: Maximum number of book IDs per request.
+        """
+        return self._setting("LOOKUP_MAX_SIZE", 50)
+
+    @property
+    def genres_cache_timeout(self):
+        """
+        Property to retrieve how long the number of books of every genre stays cached, defaulting to 1 hour.
+        Returns:
+        - int: Timeout in seconds, bounding the staleness after book changes made outside `import_books`.
+        """
+        return self._setting("GENRES_CACHE_TIMEOUT", 60 * 60)
+
+
+@functools.lru_cache
+def book_app_settings() -> AppSettings:
+    """
+    Function to cache and retrieve an instance of AppSettings for the book application.
+    Returns:
+    - AppSettings: Instance of AppSettings configured with book settings.
+    """
+    return AppSettings("BOOK_")
+
+
+# Retrieve and store the book app settings instance.
+app_setting = book_app_settings()
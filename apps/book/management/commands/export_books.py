@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.book.app_settings import app_setting
+from apps.book.services.export import EXPORT_FORMATS, export_catalog
+
+
+class Command(BaseCommand):
+    """
+    Django command to dump the whole catalog as NDJSON or CSV into a file or stdout.
+    Books are read through a server-side cursor and written chunk by chunk, so memory stays flat whatever the size
+    of the catalog.
+    """
+
+    help = 'Stream the books table as NDJSON or CSV into a file or stdout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-format', choices=sorted(EXPORT_FORMATS), default='ndjson',
+                            help='Output format')
+        parser.add_argument('--output', default='-', help='File to write, "-" writes stdout')
+        parser.add_argument('--itersize', type=int, default=app_setting.export_itersize,
+                            help='Number of rows fetched per round-trip')
+
+    def handle(self, *args, **options):
+        path = options['output']
+        if options['itersize'] < 1:
+            raise CommandError('--itersize must be a positive integer')
+
+        try:
+            stream = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f'Cannot open {path}: {e}')
+
+        try:
+            for chunk in export_catalog(export_format=options['output_format'], itersize=options['itersize']):
+                stream.write(chunk)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        if stream is not sys.stdout:
+            self.stdout.write(self.style.SUCCESS(f'Catalog exported to {path}'))
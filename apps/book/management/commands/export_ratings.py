@@ -0,0 +1,201 @@
+import os
+import shutil
+import tempfile
+import time
+from urllib.parse import quote
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.book.app_settings import app_setting
+
+RATING_SCHEMA = pa.schema([
+    ("review_id", pa.int32()),
+    ("book_id", pa.int32()),
+    ("user_id", pa.int64()),
+    ("rating", pa.int8()),
+])
+GENRE_FIELD = pa.field("genre", pa.dictionary(pa.int32(), pa.string()))
+"""
+File written into every export, so that only a directory written by a previous export is ever replaced. Its name
+starts with a dot, which Parquet readers skip when reading the directory as a dataset.
+"""
+EXPORT_MARKER = ".export_ratings"
+
+
+class PartitionWriter:
+    """
+    Buffer the rows of one partition as columns and write them to its Parquet file when flushed.
+    """
+
+    def __init__(self, path, schema, row_group_size, compression):
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.columns = [[] for _ in schema]
+        self.writer = pq.ParquetWriter(path, schema, compression=compression)
+
+    def append(self, values):
+        """
+        Append one row to the buffer.
+        """
+        for column, value in zip(self.columns, values):
+            column.append(value)
+
+    def flush(self):
+        """
+        Write the buffered rows as one row group.
+        """
+        if not self.columns[0]:
+            return
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(self.columns, self.schema)],
+            schema=self.schema
+        )
+        self.writer.write_batch(batch, row_group_size=self.row_group_size)
+        self.columns = [[] for _ in self.schema]
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+class Command(BaseCommand):
+    """
+    Django command exporting every rating, with the genre of the rated book, to Parquet files for offline training.
+    Ratings are streamed through a server-side cursor and buffered per partition; every partition is flushed once
+    the partitions together buffer a row group worth of rows, so memory is bounded by the row group size whatever
+    the size of the `reviews` table and the number of genres.
+    Partitions follow the Hive layout (`genre=<name>/part-0.parquet`) understood by pyarrow, pandas and Spark.
+    Files are written to a staging directory next to the output directory, which replaces it only once every file
+    is complete: readers never see truncated files, and partitions of genres that no longer exist are removed.
+    An existing output directory is only replaced if it holds the marker of a previous export or is empty.
+    """
+
+    help = 'Export the ratings to Parquet files partitioned by the genre of the rated books'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir', help='Directory the Parquet files are written to, replaced on success')
+        parser.add_argument('--partition-by', choices=('genre', 'none'), default='genre',
+                            help='Write one file per genre, or a single file with a genre column')
+        parser.add_argument('--itersize', type=int, default=app_setting.export_itersize,
+                            help='Number of rows fetched per server-side cursor round-trip')
+        parser.add_argument('--row-group-size', type=int, default=100000,
+                            help='Number of rows per Parquet row group')
+        parser.add_argument('--compression', choices=('zstd', 'snappy', 'gzip', 'none'), default='zstd',
+                            help='Parquet compression codec')
+
+    def handle(self, *args, **options):
+        itersize = options['itersize']
+        row_group_size = options['row_group_size']
+        if itersize < 1 or row_group_size < 1:
+            raise CommandError('--itersize and --row-group-size must be positive integers')
+
+        output_dir = os.path.abspath(options['output_dir'])
+        try:
+            self.check_output(output_dir)
+            os.makedirs(os.path.dirname(output_dir), exist_ok=True)
+            staging_dir = self.make_sibling_dir(output_dir)
+            open(os.path.join(staging_dir, EXPORT_MARKER), 'wb').close()
+        except OSError as e:
+            raise CommandError(f'Cannot create {output_dir}: {e}')
+
+        compression = None if options['compression'] == 'none' else options['compression']
+        partitioned = options['partition_by'] == 'genre'
+        writers = {}
+        buffered = 0
+        exported = 0
+        started = time.monotonic()
+
+        try:
+            with connection.chunked_cursor() as cursor:
+                cursor.cursor.itersize = itersize
+                cursor.execute(
+                    "SELECT r.id, r.book_id, r.account_user_id, r.rating, b.genre "
+                    "FROM reviews r JOIN books b ON b.id = r.book_id"
+                )
+                for *values, genre in cursor:
+                    if partitioned:
+                        writer = writers.get(genre)
+                        if writer is None:
+                            writer = writers[genre] = self.open_partition(staging_dir, genre, row_group_size,
+                                                                          compression)
+                        writer.append(values)
+                    else:
+                        writer = writers.get(None)
+                        if writer is None:
+                            writer = writers[None] = PartitionWriter(
+                                os.path.join(staging_dir, 'ratings.parquet'), RATING_SCHEMA.append(GENRE_FIELD),
+                                row_group_size, compression
+                            )
+                        writer.append((*values, genre))
+                    buffered += 1
+                    if buffered >= row_group_size:
+                        for writer in writers.values():
+                            writer.flush()
+                        buffered = 0
+                    exported += 1
+                    if exported % itersize == 0:
+                        elapsed = time.monotonic() - started
+                        self.stdout.write(f'{exported} ratings exported, {exported / elapsed:.0f} rows/sec')
+            files = len(writers)
+            while writers:
+                writers.popitem()[1].close()
+            self.replace_output(staging_dir, output_dir)
+        except BaseException:
+            for writer in writers.values():
+                try:
+                    writer.close()
+                except Exception:  # noqa
+                    pass
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+
+        elapsed = time.monotonic() - started
+        rate = exported / elapsed if elapsed else exported
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {exported} ratings into {files} files in {elapsed:.2f}s, {rate:.0f} rows/sec'
+        ))
+
+    @staticmethod
+    def make_sibling_dir(output_dir):
+        """
+        Create a hidden temporary directory next to the output directory, on the same filesystem so it can be renamed.
+        """
+        return tempfile.mkdtemp(prefix=f'.{os.path.basename(output_dir)}.', dir=os.path.dirname(output_dir))
+
+    @staticmethod
+    def check_output(output_dir):
+        """
+        Refuse to replace an existing path that is not a previous export nor an empty directory.
+        """
+        if not os.path.lexists(output_dir):
+            return
+        if not os.path.isdir(output_dir) or os.path.islink(output_dir):
+            raise CommandError(f'{output_dir} exists and is not a directory')
+        if os.listdir(output_dir) and not os.path.isfile(os.path.join(output_dir, EXPORT_MARKER)):
+            raise CommandError(f'{output_dir} is not empty and was not written by a previous export, not replacing it')
+
+    @staticmethod
+    def replace_output(staging_dir, output_dir):
+        """
+        Swap the complete staging directory in place of the output directory and remove the previous export.
+        """
+        previous_dir = None
+        Command.check_output(output_dir)
+        if os.path.exists(output_dir):
+            previous_dir = Command.make_sibling_dir(output_dir)
+            os.rename(output_dir, os.path.join(previous_dir, 'export'))
+        os.rename(staging_dir, output_dir)
+        if previous_dir is not None:
+            shutil.rmtree(previous_dir, ignore_errors=True)
+
+    @staticmethod
+    def open_partition(output_dir, genre, row_group_size, compression):
+        """
+        Create the directory of a genre partition and open its Parquet file.
+        """
+        directory = os.path.join(output_dir, f'genre={quote(genre, safe="")}')
+        os.makedirs(directory, exist_ok=True)
+        return PartitionWriter(os.path.join(directory, 'part-0.parquet'), RATING_SCHEMA, row_group_size, compression)
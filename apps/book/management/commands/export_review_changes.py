@@ -0,0 +1,123 @@
+import json
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from apps.book.app_settings import app_setting
+from apps.book.serializers.score import ScoreChangeSerializer
+from apps.book.services import outbox
+
+
+class Command(BaseCommand):
+    """
+    Django command writing the rating changes recorded after a cursor as NDJSON, one change per line.
+    With `--state-file` the cursor is read from and saved to that file after every batch, so running the command
+    periodically syncs a downstream copy of the ratings in time proportional to the number of changes.
+    With `--snapshot` every stored rating is first written as a "created" change, including the ratings recorded
+    before the outbox existed, and the feed then resumes from the cursor taken with the snapshot; changes committed
+    meanwhile may be written twice, so downstream copies must apply them as upserts. A cursor whose change was
+    pruned from the outbox is refused, and the copy must then be synced again with `--snapshot`.
+    """
+
+    help = 'Write the rating inserts, updates and deletes recorded after a cursor as NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=int, default=None,
+                            help='ID of the last change already synced, overrides the state file')
+        parser.add_argument('--state-file', default=None,
+                            help='File holding the cursor, read on start and updated after every batch')
+        parser.add_argument('--output', default='-', help='File the changes are appended to, "-" writes stdout')
+        parser.add_argument('--batch-size', type=int, default=app_setting.change_feed_limit,
+                            help='Number of changes read per query')
+        parser.add_argument('--snapshot', action='store_true',
+                            help='Write every stored rating first, then the changes following the snapshot')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be a positive integer')
+
+        since = options['since']
+        state_file = options['state_file']
+        if since is None:
+            since = self.read_state(state_file)
+
+        try:
+            stream = sys.stdout if options['output'] == '-' else open(options['output'], 'a', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f'Cannot open {options["output"]}: {e}')
+
+        written = 0
+        try:
+            if options['snapshot']:
+                since, written = self.write_snapshot(stream, batch_size)
+                self.write_state(state_file, since)
+            while True:
+                try:
+                    changes = outbox.read_changes(since=since, limit=batch_size)
+                except outbox.ExpiredCursor as e:
+                    raise CommandError(f'{e}, sync again with --snapshot')
+                if not changes:
+                    break
+                for change in ScoreChangeSerializer(changes, many=True).data:
+                    stream.write(json.dumps(change) + '\n')
+                stream.flush()
+                since = changes[-1]['id']
+                written += len(changes)
+                self.write_state(state_file, since)
+                if len(changes) < batch_size:
+                    break
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        self.stderr.write(self.style.SUCCESS(f'Wrote {written} changes, next cursor {since}'))
+
+    @staticmethod
+    def write_snapshot(stream, batch_size):
+        """
+        Write every stored rating in one consistent snapshot and return the cursor of the snapshot and the number
+        of ratings written.
+        """
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            since = outbox.last_event_id()
+            after_review_id = 0
+            written = 0
+            while True:
+                changes = outbox.read_snapshot(cursor=since, after_review_id=after_review_id, limit=batch_size)
+                for change in ScoreChangeSerializer(changes, many=True).data:
+                    stream.write(json.dumps(change) + '\n')
+                stream.flush()
+                written += len(changes)
+                if len(changes) < batch_size:
+                    return since, written
+                after_review_id = changes[-1]['review_id']
+
+    @staticmethod
+    def read_state(state_file):
+        """
+        Return the cursor saved in the state file, or 0 if there is none yet.
+        """
+        if not state_file or not os.path.exists(state_file):
+            return 0
+        try:
+            with open(state_file, encoding='utf-8') as file:
+                return int(file.read().strip() or 0)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read the cursor from {state_file}: {e}')
+
+    @staticmethod
+    def write_state(state_file, since):
+        """
+        Atomically replace the cursor saved in the state file.
+        """
+        if not state_file:
+            return
+        temporary = f'{state_file}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            file.write(f'{since}\n')
+        os.replace(temporary, state_file)
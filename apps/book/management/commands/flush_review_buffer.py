@@ -0,0 +1,73 @@
+import os
+import socket
+
+import redis
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.book.app_settings import app_setting
+from apps.book.services import write_behind
+
+
+class Command(BaseCommand):
+    """
+    Django command draining the Redis write-behind buffer of rating mutations into the database.
+    Every batch is applied with one bulk upsert and one bulk delete. Entries delivered to any flusher but left
+    unacknowledged for longer than `--min-idle`, e.g. because that flusher crashed, are taken over and replayed on
+    start and whenever the buffer is idle, after which the fences no buffered mutation can be older than are pruned.
+    """
+
+    help = 'Flush rating mutations buffered in Redis into the reviews table in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=app_setting.score_write_behind_batch_size,
+                            help='Number of buffered mutations applied per batch')
+        parser.add_argument('--block', type=int, default=5000,
+                            help='Milliseconds to wait for new mutations before polling again')
+        parser.add_argument('--consumer', default=f'{socket.gethostname()}-{os.getpid()}',
+                            help='Name of this flusher in the consumer group')
+        parser.add_argument('--min-idle', type=int, default=60000,
+                            help='Milliseconds a mutation delivered to another flusher stays unacknowledged before '
+                                 'it is taken over')
+        parser.add_argument('--once', action='store_true', help='Drain the buffer once and exit')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        consumer = options['consumer']
+        if batch_size < 1 or options['block'] < 1:
+            raise CommandError('--batch-size and --block must be positive integers')
+
+        flushed = 0
+        try:
+            write_behind.ensure_flusher_group()
+            flushed += self.recover(consumer=consumer, batch_size=batch_size, min_idle=options['min_idle'])
+
+            while True:
+                count = write_behind.flush_batch(consumer=consumer, batch_size=batch_size,
+                                                 block=None if options['once'] else options['block'])
+                flushed += count
+                if not count:
+                    if options['once']:
+                        break
+                    flushed += self.recover(consumer=consumer, batch_size=batch_size, min_idle=options['min_idle'])
+        except redis.RedisError as e:
+            raise CommandError(f'Redis unavailable: {e}')
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} buffered rating mutations'))
+
+    def recover(self, consumer, batch_size, min_idle):
+        """
+        Replay the mutations left unacknowledged by crashed flushers, then forget the flushers that are gone and the
+        fences that are no longer needed.
+        """
+        recovered, start_id = 0, '0-0'
+        while True:
+            count, start_id = write_behind.recover_batch(consumer=consumer, batch_size=batch_size, min_idle=min_idle,
+                                                         start_id=start_id)
+            recovered += count
+            if start_id == '0-0':
+                break
+        write_behind.remove_idle_flushers(min_idle=min_idle)
+        write_behind.prune_fences()
+        return recovered
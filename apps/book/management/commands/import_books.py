@@ -0,0 +1,157 @@
+import csv
+import io
+import json
+import sys
+import time
+from itertools import islice
+
+import redis
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from apps.book.services import genres
+
+STAGING_TABLE = "books_import_staging"
+FIELDS = ("title", "author", "genre")
+MAX_LENGTHS = {"title": 200, "author": 200, "genre": 50}
+
+
+def read_csv(stream):
+    """
+    Yield one dictionary per CSV row, using the header row for the keys.
+    """
+    yield from csv.DictReader(stream)
+
+
+def read_jsonl(stream):
+    """
+    Yield one dictionary per non-empty JSON line.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise CommandError(f'Invalid JSON on line {line_number}: {e}')
+
+
+READERS = {
+    "csv": read_csv,
+    "jsonl": read_jsonl,
+}
+
+
+def clean_row(row):
+    """
+    Return the (title, author, genre) tuple of a row, or None if it would violate the books table.
+    """
+    if not isinstance(row, dict):
+        return None
+    values = tuple(str(row.get(field) or "").strip() for field in FIELDS)
+    for field, value in zip(FIELDS, values):
+        if not value or len(value) > MAX_LENGTHS[field]:
+            return None
+    return values
+
+
+class Command(BaseCommand):
+    """
+    Django command to bulk load books from a CSV or JSONL file, or from stdin.
+    Rows are streamed in fixed-size batches: every batch is written into a temporary staging table with COPY and
+    merged into `books` with `ON CONFLICT DO NOTHING`, so memory stays constant whatever the size of the input and
+    books that already exist are skipped.
+    """
+
+    help = 'Stream books from a CSV or JSONL file (or stdin) into the books table through COPY'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help='CSV or JSONL file to import, "-" reads stdin')
+        parser.add_argument('--input-format', choices=sorted(READERS), default=None,
+                            help='Input format, guessed from the file extension by default')
+        parser.add_argument('--batch-size', type=int, default=50000, help='Number of rows copied per batch')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be a positive integer')
+
+        input_format = options['input_format']
+        if input_format is None:
+            input_format = 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+        try:
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f'Cannot open {path}: {e}')
+
+        try:
+            read, inserted, skipped, elapsed = self.import_rows(READERS[input_format](stream), batch_size)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        if inserted:
+            try:
+                genres.invalidate()
+            except redis.RedisError as e:
+                self.stderr.write(self.style.WARNING(f'Genre book counts not refreshed, Redis unavailable: {e}'))
+
+        rate = read / elapsed if elapsed else read
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {inserted} of {read} rows ({read - inserted - skipped} already present, {skipped} invalid) '
+            f'in {elapsed:.2f}s, {rate:.0f} rows/sec'
+        ))
+
+    def import_rows(self, rows, batch_size):
+        """
+        Copy the rows into the staging table batch by batch and merge every batch into `books`.
+        Returns the number of rows read, inserted and skipped, and the elapsed time in seconds.
+        """
+        read = inserted = skipped = 0
+        started = time.monotonic()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} ("
+                "position BIGSERIAL, title TEXT NOT NULL, author TEXT NOT NULL, genre TEXT NOT NULL"
+                ")"
+            )
+            try:
+                while True:
+                    batch = list(islice(rows, batch_size))
+                    if not batch:
+                        break
+
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer)
+                    for row in batch:
+                        values = clean_row(row)
+                        if values is None:
+                            skipped += 1
+                        else:
+                            writer.writerow(values)
+                    read += len(batch)
+                    buffer.seek(0)
+
+                    with transaction.atomic():
+                        cursor.copy_expert(
+                            f"COPY {STAGING_TABLE} (title, author, genre) FROM STDIN WITH (FORMAT csv)", buffer
+                        )
+                        cursor.execute(
+                            f"INSERT INTO books (title, author, genre) "
+                            f"SELECT title, author, genre FROM {STAGING_TABLE} ORDER BY position "
+                            f"ON CONFLICT (title, author, genre) DO NOTHING"
+                        )
+                        inserted += cursor.rowcount
+                        cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+
+                    elapsed = time.monotonic() - started
+                    rate = read / elapsed if elapsed else read
+                    self.stdout.write(f'{read} rows read, {inserted} inserted, {rate:.0f} rows/sec')
+            finally:
+                cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+
+        return read, inserted, skipped, time.monotonic() - started
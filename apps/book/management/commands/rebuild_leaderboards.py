@@ -0,0 +1,28 @@
+import redis
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.book.services import leaderboard
+
+
+class Command(BaseCommand):
+    """
+    Django command recomputing the top-rated and trending leaderboards from Postgres.
+    Run it once to seed the leaderboards, and whenever they may have drifted, e.g. after Redis lost its data or a
+    book changed genre. The offset of the outbox consumer is moved past the aggregated events.
+    """
+
+    help = 'Rebuild the Redis leaderboards of top-rated and trending books from Postgres'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', default='leaderboard',
+                            help='Name of the outbox consumer maintaining the leaderboards, "" to leave offsets')
+
+    def handle(self, *args, **options):
+        try:
+            top, trending = leaderboard.rebuild(consumer=options['consumer'] or None)
+        except redis.RedisError as e:
+            raise CommandError(f'Redis unavailable: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt the leaderboards: {top} top-rated books, {trending} trending books'
+        ))
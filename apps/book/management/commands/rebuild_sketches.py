@@ -0,0 +1,24 @@
+import redis
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.book.services import sketches
+
+
+class Command(BaseCommand):
+    """
+    Django command recomputing the unique raters and rating distribution sketches from Postgres.
+    Run it once to seed the sketches, since the outbox consumer only builds them for the books rated afterwards, and
+    whenever they may have drifted, e.g. after Redis lost its data.
+    """
+
+    help = 'Rebuild the Redis sketches of unique raters and rating distributions from Postgres'
+
+    def handle(self, *args, **options):
+        try:
+            books, genres = sketches.rebuild()
+        except redis.RedisError as e:
+            raise CommandError(f'Redis unavailable: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt the sketches: {books} book histograms, {genres} genre histograms'
+        ))
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.book.app_settings import app_setting
+from apps.book.services import outbox
+
+
+class Command(BaseCommand):
+    """
+    Django command tailing the `reviews_outbox` table and fanning rating events out to the registered consumers.
+    Every consumer keeps its own offset in `reviews_outbox_offsets`, so a slow or failing consumer never holds the
+    others back and a restarted relay resumes where each consumer stopped. Whenever every consumer is caught up,
+    the events every registered consumer has seen and older than `BOOK_OUTBOX_RETENTION_DAYS` are pruned.
+    """
+
+    help = 'Relay rating events from the transactional outbox to the consumers registered in BOOK_OUTBOX_CONSUMERS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', action='append', dest='consumers',
+                            help='Relay to this consumer only, can be repeated')
+        parser.add_argument('--batch-size', type=int, default=app_setting.outbox_batch_size,
+                            help='Number of events delivered to a consumer per batch')
+        parser.add_argument('--interval', type=float, default=app_setting.outbox_poll_interval,
+                            help='Seconds to sleep when every consumer is caught up')
+        parser.add_argument('--once', action='store_true', help='Relay until every consumer is caught up and exit')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be a positive integer')
+
+        try:
+            consumers = outbox.get_consumers(options['consumers'])
+        except KeyError as e:
+            raise CommandError(f'Unknown outbox consumer {e}')
+        except ImportError as e:
+            raise CommandError(f'Cannot import outbox consumer: {e}')
+        if not consumers:
+            raise CommandError('No outbox consumer is registered in BOOK_OUTBOX_CONSUMERS')
+
+        totals = dict.fromkeys(consumers, 0)
+        pruned = 0
+        try:
+            while True:
+                delivered = outbox.relay_once(consumers, batch_size=batch_size)
+                for name, count in delivered.items():
+                    totals[name] += count
+                if any(delivered.values()):
+                    continue
+                deleted = outbox.prune(limit=batch_size)
+                pruned += deleted
+                if deleted == batch_size:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        for name, count in totals.items():
+            self.stdout.write(self.style.SUCCESS(f'Relayed {count} events to {name}'))
+        self.stdout.write(self.style.SUCCESS(f'Pruned {pruned} events'))
@@ -0,0 +1,75 @@
+# Generated by Django 5.0.7 on 2026-10-19 05:20
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='Review',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('rating', models.IntegerField(verbose_name='rating')),
+            ],
+            options={
+                'verbose_name': 'Review',
+                'verbose_name_plural': 'Reviews',
+                'db_table': 'reviews',
+                'ordering': ('-id',),
+            },
+        ),
+        migrations.CreateModel(
+            name='Book',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200, verbose_name='title')),
+                ('author', models.CharField(max_length=200, verbose_name='author')),
+                ('genre', models.CharField(max_length=50, verbose_name='genre')),
+            ],
+            options={
+                'verbose_name': 'Book',
+                'verbose_name_plural': 'Books',
+                'db_table': 'books',
+                'ordering': ('id',),
+                'indexes': [models.Index(fields=['genre'], include=('id', 'title', 'author'), name='books_genre_covering_idx'), django.contrib.postgres.indexes.GinIndex(fields=['title'], name='books_title_trgm_idx', opclasses=['gin_trgm_ops']), django.contrib.postgres.indexes.GinIndex(fields=['author'], name='books_author_trgm_idx', opclasses=['gin_trgm_ops'])],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='book',
+            constraint=models.UniqueConstraint(fields=('title', 'author', 'genre'), name='books_title_author_genre_key'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='account_user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to=settings.AUTH_USER_MODEL, verbose_name='account user'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='book',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='book.book', verbose_name='book'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['account_user', 'book'], include=('rating',), name='reviews_user_book_covering_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(fields=('book', 'account_user'), name='unique_user_book_review'),
+        ),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.CheckConstraint(check=models.Q(('rating__gte', 1), ('rating__lte', 5)), name='reviews_rating_check'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.7 on 2026-10-19 05:28
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event_type', models.PositiveSmallIntegerField(choices=[(1, 'created'), (2, 'updated'), (3, 'deleted')], verbose_name='event type')),
+                ('review_id', models.IntegerField(verbose_name='review id')),
+                ('book_id', models.IntegerField(verbose_name='book id')),
+                ('account_user_id', models.BigIntegerField(verbose_name='account user id')),
+                ('rating', models.IntegerField(blank=True, null=True, verbose_name='rating')),
+                ('created_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), verbose_name='created at')),
+            ],
+            options={
+                'verbose_name': 'Review event',
+                'verbose_name_plural': 'Review events',
+                'db_table': 'reviews_outbox',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ReviewEventOffset',
+            fields=[
+                ('consumer', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='consumer')),
+                ('last_event_id', models.BigIntegerField(default=0, verbose_name='last event id')),
+                ('updated_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), verbose_name='updated at')),
+            ],
+            options={
+                'verbose_name': 'Review event offset',
+                'verbose_name_plural': 'Review event offsets',
+                'db_table': 'reviews_outbox_offsets',
+            },
+        ),
+    ]
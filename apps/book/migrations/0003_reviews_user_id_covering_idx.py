@@ -0,0 +1,19 @@
+# Generated by Django 5.0.7 on 2026-10-19 05:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0002_review_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['account_user', 'id'], include=('book', 'rating'), name='reviews_user_id_covering_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.7 on 2026-10-19 06:11
+
+import apps.book.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0003_reviews_user_id_covering_idx'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='reviewevent',
+            options={'ordering': ('xact_id', 'id'), 'verbose_name': 'Review event', 'verbose_name_plural': 'Review events'},
+        ),
+        migrations.AddField(
+            model_name='reviewevent',
+            name='xact_id',
+            field=models.BigIntegerField(db_default=apps.book.models.CurrentTransactionId(), verbose_name='transaction id'),
+        ),
+        migrations.AddIndex(
+            model_name='reviewevent',
+            index=models.Index(fields=['xact_id', 'id'], name='reviews_outbox_xact_idx'),
+        ),
+    ]
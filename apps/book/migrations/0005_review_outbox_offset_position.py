@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-19 06:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0004_review_outbox_xact_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='revieweventoffset',
+            name='last_xact_id',
+            field=models.BigIntegerField(default=0, verbose_name='last transaction id'),
+        ),
+        migrations.RunSQL(
+            sql="UPDATE reviews_outbox_offsets o SET last_xact_id = e.xact_id "
+                "FROM reviews_outbox e WHERE e.id = o.last_event_id",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
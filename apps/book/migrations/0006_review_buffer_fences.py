@@ -0,0 +1,32 @@
+# Generated by Django 5.0.7 on 2026-10-19 06:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0005_review_outbox_offset_position'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewBufferFence',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('account_user_id', models.BigIntegerField(verbose_name='account user id')),
+                ('book_id', models.IntegerField(verbose_name='book id')),
+                ('entry_ms', models.BigIntegerField(verbose_name='stream entry time')),
+                ('entry_seq', models.BigIntegerField(verbose_name='stream entry sequence')),
+            ],
+            options={
+                'verbose_name': 'Review buffer fence',
+                'verbose_name_plural': 'Review buffer fences',
+                'db_table': 'reviews_buffer_fences',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reviewbufferfence',
+            constraint=models.UniqueConstraint(fields=('account_user_id', 'book_id'), name='reviews_buffer_fences_pair_key'),
+        ),
+    ]
@@ -0,0 +1,153 @@
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.db import models
+from django.db.models.functions import Now
+from django.utils.translation import gettext_lazy as _
+
+
+class Book(models.Model):
+    """
+    Model representing a book of the catalog.
+    Mapped onto the `books` table queried with raw SQL by the book and score views.
+    """
+    id = models.AutoField(primary_key=True)
+    title = models.CharField(max_length=200, verbose_name=_("title"))
+    author = models.CharField(max_length=200, verbose_name=_("author"))
+    genre = models.CharField(max_length=50, verbose_name=_("genre"))
+
+    class Meta:
+        db_table = "books"
+        verbose_name = _("Book")
+        verbose_name_plural = _("Books")
+        ordering = ("id",)
+        constraints = [
+            models.UniqueConstraint(fields=["title", "author", "genre"], name="books_title_author_genre_key"),
+        ]
+        indexes = [
+            models.Index(fields=["genre"], include=["id", "title", "author"], name="books_genre_covering_idx"),
+            GinIndex(fields=["title"], opclasses=["gin_trgm_ops"], name="books_title_trgm_idx"),
+            GinIndex(fields=["author"], opclasses=["gin_trgm_ops"], name="books_author_trgm_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.title} - {self.author} - {self.genre}"
+
+
+class Review(models.Model):
+    """
+    Model representing the rating a user gave to a book.
+    Mapped onto the `reviews` table queried with raw SQL by the score views.
+    """
+    id = models.AutoField(primary_key=True)
+    book = models.ForeignKey(
+        Book, on_delete=models.CASCADE, related_name="reviews", db_index=False, verbose_name=_("book")
+    )
+    account_user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="reviews", db_index=False,
+        verbose_name=_("account user")
+    )
+    rating = models.IntegerField(verbose_name=_("rating"))
+
+    class Meta:
+        db_table = "reviews"
+        verbose_name = _("Review")
+        verbose_name_plural = _("Reviews")
+        ordering = ("-id",)
+        constraints = [
+            models.UniqueConstraint(fields=["book", "account_user"], name="unique_user_book_review"),
+            models.CheckConstraint(check=models.Q(rating__gte=1, rating__lte=5), name="reviews_rating_check"),
+        ]
+        indexes = [
+            models.Index(fields=["account_user", "book"], include=["rating"], name="reviews_user_book_covering_idx"),
+            models.Index(fields=["account_user", "id"], include=["book", "rating"], name="reviews_user_id_covering_idx"),
+        ]
+
+    def __str__(self):
+        return f"book id: {self.book_id} - user id: {self.account_user_id} - rating: {self.rating}"
+
+
+class CurrentTransactionId(models.Func):
+    """
+    Database function returning the 64-bit ID of the current transaction, as `pg_current_xact_id()`.
+    """
+    template = "pg_current_xact_id()::text::bigint"
+    arity = 0
+    output_field = models.BigIntegerField()
+
+
+class ReviewEvent(models.Model):
+    """
+    Model representing a rating mutation recorded in the transactional outbox.
+    Every write to `reviews` inserts its events in the same statement, and the outbox relay fans them out to the
+    consumers maintaining state derived from the ratings.
+    """
+
+    class EventType(models.IntegerChoices):
+        CREATED = 1, _("created")
+        UPDATED = 2, _("updated")
+        DELETED = 3, _("deleted")
+
+    id = models.BigAutoField(primary_key=True)
+    event_type = models.PositiveSmallIntegerField(choices=EventType.choices, verbose_name=_("event type"))
+    review_id = models.IntegerField(verbose_name=_("review id"))
+    book_id = models.IntegerField(verbose_name=_("book id"))
+    account_user_id = models.BigIntegerField(verbose_name=_("account user id"))
+    rating = models.IntegerField(null=True, blank=True, verbose_name=_("rating"))
+    created_at = models.DateTimeField(db_default=Now(), verbose_name=_("created at"))
+    xact_id = models.BigIntegerField(db_default=CurrentTransactionId(), verbose_name=_("transaction id"))
+
+    class Meta:
+        db_table = "reviews_outbox"
+        verbose_name = _("Review event")
+        verbose_name_plural = _("Review events")
+        ordering = ("xact_id", "id")
+        indexes = [
+            models.Index(fields=["xact_id", "id"], name="reviews_outbox_xact_idx"),
+        ]
+
+    def __str__(self):
+        return f"event id: {self.id} - {self.get_event_type_display()} - book id: {self.book_id}"
+
+
+class ReviewEventOffset(models.Model):
+    """
+    Model representing the last outbox event delivered to a consumer of the outbox relay.
+    The transaction ID of the event is stored with its ID, so the offset keeps its position once the event is pruned.
+    """
+    consumer = models.CharField(max_length=100, primary_key=True, verbose_name=_("consumer"))
+    last_xact_id = models.BigIntegerField(default=0, verbose_name=_("last transaction id"))
+    last_event_id = models.BigIntegerField(default=0, verbose_name=_("last event id"))
+    updated_at = models.DateTimeField(db_default=Now(), verbose_name=_("updated at"))
+
+    class Meta:
+        db_table = "reviews_outbox_offsets"
+        verbose_name = _("Review event offset")
+        verbose_name_plural = _("Review event offsets")
+
+    def __str__(self):
+        return f"{self.consumer} - last event id: {self.last_event_id}"
+
+
+class ReviewBufferFence(models.Model):
+    """
+    Model representing the newest write-behind stream entry applied to the rating of a user for a book.
+    Buffered mutations are only applied if they are newer than the fence of their (user, book) pair, so that an
+    entry replayed late, by a flusher taking over a crashed one or after a direct write, never overwrites a newer
+    rating. Fences are kept after the rating is deleted, and removed once no older entry is left in the stream.
+    """
+    id = models.BigAutoField(primary_key=True)
+    account_user_id = models.BigIntegerField(verbose_name=_("account user id"))
+    book_id = models.IntegerField(verbose_name=_("book id"))
+    entry_ms = models.BigIntegerField(verbose_name=_("stream entry time"))
+    entry_seq = models.BigIntegerField(verbose_name=_("stream entry sequence"))
+
+    class Meta:
+        db_table = "reviews_buffer_fences"
+        verbose_name = _("Review buffer fence")
+        verbose_name_plural = _("Review buffer fences")
+        constraints = [
+            models.UniqueConstraint(fields=["account_user_id", "book_id"], name="reviews_buffer_fences_pair_key"),
+        ]
+
+    def __str__(self):
+        return f"user id: {self.account_user_id} - book id: {self.book_id} - entry: {self.entry_ms}-{self.entry_seq}"
@@ -8,6 +8,22 @@ class BookSerializer(serializers.Serializer):
     genre = serializers.CharField(max_length=50)
 
 
+class LeaderboardSerializer(BookSerializer):
+    score = serializers.FloatField()
+
+
+class BookLookupSerializer(BookSerializer):
+    rating_count = serializers.IntegerField()
+    rating_average = serializers.FloatField(allow_null=True)
+    my_rating = serializers.IntegerField(allow_null=True)
+
+
+class GenreSerializer(serializers.Serializer):
+    genre = serializers.CharField(max_length=50)
+    book_count = serializers.IntegerField()
+    rating_count = serializers.IntegerField()
+    rating_average = serializers.FloatField(allow_null=True)
+
 """
 Serializer for validating and deserializing data related to books.
 This serializer is used to handle the data input and output for book objects.
@@ -31,3 +47,43 @@ This serializer is used to handle the data input and output for book objects.
     - Represents the genre or category of the book.
     - This field is required and must be a string with a maximum length of 50 characters.
 """
+
+"""
+Serializer for representing one book of a leaderboard.
+It extends `BookSerializer` with the score the book is ranked by.
+
+    - Type: Float
+    - For the top-rated leaderboards, the average rating damped towards the prior mean.
+    - For the trending leaderboards, the number of recent ratings, each weighted by its exponential decay.
+"""
+
+"""
+Serializer for representing one book of a batch lookup.
+It extends `BookSerializer` with the rating statistics of the book and the rating of the current user.
+
+    - Type: Integer
+    - Represents the number of ratings of the book.
+
+    - Type: Float
+    - Represents the average rating of the book, or null if it was never rated.
+
+    - Type: Integer
+    - Represents the rating the current user gave to the book, or null if the user did not rate it or is anonymous.
+"""
+
+"""
+Serializer for representing one genre of the catalog with its statistics.
+
+    - Type: String
+    - Maximum Length: 50 characters
+    - Represents the name of the genre.
+
+    - Type: Integer
+    - Represents the number of books of the genre.
+
+    - Type: Integer
+    - Represents the number of ratings of the books of the genre.
+
+    - Type: Float
+    - Represents the average rating of the books of the genre, or null if none of them was rated.
+"""
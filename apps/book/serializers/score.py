@@ -6,6 +6,29 @@ class ScoreSerializer(serializers.Serializer):
     rating = serializers.IntegerField(min_value=1, max_value=5, required=False)
 
 
+class ScoreBatchSerializer(ScoreSerializer):
+    book_id = serializers.IntegerField(min_value=1)
+    rating = serializers.IntegerField(min_value=1, max_value=5)
+
+
+class ScoreListSerializer(serializers.Serializer):
+    id = serializers.IntegerField(allow_null=True)
+    book_id = serializers.IntegerField()
+    title = serializers.CharField(max_length=200)
+    author = serializers.CharField(max_length=200)
+    genre = serializers.CharField(max_length=50)
+    rating = serializers.IntegerField(min_value=1, max_value=5)
+
+
+class ScoreChangeSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    type = serializers.CharField()
+    review_id = serializers.IntegerField()
+    book_id = serializers.IntegerField()
+    user_id = serializers.IntegerField(source='account_user_id')
+    rating = serializers.IntegerField(allow_null=True)
+    created_at = serializers.DateTimeField(allow_null=True)
+
 """
 Serializer for validating and deserializing data related to scores (reviews) for books.
 This serializer is used to handle the data input for adding or updating book scores.
@@ -17,4 +40,69 @@ This serializer is used to handle the data input for adding or updating book sco
     - `min_value=1`: The rating must be at least 1.
     - `max_value=5`: The rating must not exceed 5.
     - `required=False`: This field is optional, meaning it can be omitted from the input data.
-"""
\ No newline at end of file
+"""
+
+"""
+Serializer for validating one item of a batch of scores submitted at once.
+It extends `ScoreSerializer` and makes both fields required, since the book is not part of the URL.
+
+    - Type: Integer
+    - `min_value=1`: The book ID must be a positive integer.
+    - This field is required.
+
+    - Type: Integer
+    - `min_value=1`: The rating must be at least 1.
+    - `max_value=5`: The rating must not exceed 5.
+    - This field is required.
+"""
+
+"""
+Serializer for representing one score of the authenticated user, together with the rated book.
+
+    - Type: Integer
+    - Represents the unique identifier of the review, used as the pagination cursor.
+
+    - Type: Integer
+    - Represents the unique identifier of the rated book.
+
+    - Type: String
+    - Maximum Length: 200 characters
+    - Represents the title of the rated book.
+
+    - Type: String
+    - Maximum Length: 200 characters
+    - Represents the name of the author of the rated book.
+
+    - Type: String
+    - Maximum Length: 50 characters
+    - Represents the genre of the rated book.
+
+    - Type: Integer
+    - `min_value=1`: The rating is at least 1.
+    - `max_value=5`: The rating does not exceed 5.
+"""
+
+"""
+Serializer for representing one change of the ratings, as read from the transactional outbox.
+
+    - Type: Integer
+    - Represents the unique identifier of the change, used as the `since` cursor of the change feed.
+
+    - Type: String
+    - One of `created`, `updated` or `deleted`.
+
+    - Type: Integer
+    - Represents the unique identifier of the changed review.
+
+    - Type: Integer
+    - Represents the unique identifier of the rated book.
+
+    - Type: Integer
+    - Represents the unique identifier of the user who rated the book.
+
+    - Type: Integer
+    - Represents the new rating, or null when the review was deleted.
+
+    - Type: DateTime
+    - Represents when the change was made.
+"""
@@ -0,0 +1,150 @@
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from django.db import connection
+
+from apps.book.app_settings import app_setting
+
+BOOK_COLUMNS = ("id", "title", "author", "genre")
+
+
+def escape_like(value: str) -> str:
+    """
+    Escape the LIKE wildcards in a user supplied value.
+    Args:
+    - value (str): Raw value typed by the user.
+    Returns:
+    - str: Value safe to embed in a LIKE/ILIKE pattern.
+    """
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class PrefixIndex:
+    """
+    In-process index mapping every short prefix of book titles and authors to its first suggestions.
+
+    The index is built from the `books` table by a background thread, never on a request thread, and rebuilt at most
+    once per refresh interval. Until the first build completes, lookups fall back to the trigram-indexed query, and
+    while a rebuild runs they keep answering from the previous snapshot. The entries and their build time are
+    published together as one tuple, so a lookup never sees one without the other.
+    """
+
+    def __init__(self) -> None:
+        self._snapshot: Optional[Tuple[Dict[str, List[Dict]], float]] = None
+        self._generation = 0
+        self._building = False
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        """
+        Drop the current snapshot, so lookups fall back to the database until the index is built again.
+        """
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+    def lookup(self, prefix: str, limit: int) -> Optional[List[Dict]]:
+        """
+        Retrieve suggestions for a prefix from the in-process index.
+        Args:
+        - prefix (str): Prefix typed by the user.
+        - limit (int): Maximum number of suggestions.
+        Returns:
+        - Optional[List[Dict]]: Suggestions for the prefix, or None if the prefix is too long to be indexed or the
+          index is not built yet.
+        """
+        key = prefix.casefold()
+        if len(key) > app_setting.autocomplete_prefix_length:
+            return None
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - snapshot[1] >= app_setting.autocomplete_refresh_interval:
+            self._schedule_build()
+        if snapshot is None:
+            return None
+        return snapshot[0].get(key, [])[:limit]
+
+    def _schedule_build(self) -> None:
+        """
+        Start a background build unless one is already running.
+        """
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._run_build, name="book-prefix-index", daemon=True).start()
+
+    def _run_build(self) -> None:
+        try:
+            self.build()
+        finally:
+            with self._lock:
+                self._building = False
+            connection.close()
+
+    def build(self) -> None:
+        """
+        Stream the catalog ordered by title and keep the first suggestions of every short prefix.
+
+        The snapshot is only published if the index was not invalidated while it was being built.
+        """
+        generation = self._generation
+        max_length = app_setting.autocomplete_prefix_length
+        capacity = app_setting.autocomplete_limit
+        entries: Dict[str, List[Dict]] = {}
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT id, title, author, genre FROM books ORDER BY title, id")
+            for row in cursor:
+                book = dict(zip(BOOK_COLUMNS, row))
+                for value in (book["title"], book["author"]):
+                    key = value.casefold()
+                    for length in range(1, min(len(key), max_length) + 1):
+                        bucket = entries.setdefault(key[:length], [])
+                        if len(bucket) < capacity and all(item["id"] != book["id"] for item in bucket):
+                            bucket.append(book)
+
+        with self._lock:
+            if generation == self._generation:
+                self._snapshot = (entries, time.monotonic())
+
+
+prefix_index = PrefixIndex()
+
+
+def search_books_by_prefix(prefix: str, limit: int) -> List[Dict]:
+    """
+    Query the database for books whose title or author starts with the prefix.
+
+    The `ILIKE 'prefix%'` predicates are served by the `pg_trgm` GIN indexes on `books.title` and `books.author`.
+    Args:
+    - prefix (str): Prefix typed by the user.
+    - limit (int): Maximum number of suggestions.
+    Returns:
+    - List[Dict]: Matching books ordered by title.
+    """
+    pattern = f"{escape_like(prefix)}%"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT id, title, author, genre FROM books "
+            "WHERE title ILIKE %s OR author ILIKE %s "
+            "ORDER BY title, id LIMIT %s",
+            [pattern, pattern, limit]
+        )
+        rows = cursor.fetchall()
+    return [dict(zip(BOOK_COLUMNS, row)) for row in rows]
+
+
+def autocomplete(prefix: str, limit: int) -> List[Dict]:
+    """
+    Suggest books for a prefix, answering short prefixes from memory and longer ones from the database.
+    Args:
+    - prefix (str): Prefix typed by the user.
+    - limit (int): Maximum number of suggestions.
+    Returns:
+    - List[Dict]: Suggested books.
+    """
+    suggestions = prefix_index.lookup(prefix=prefix, limit=limit)
+    if suggestions is not None:
+        return suggestions
+    return search_books_by_prefix(prefix=prefix, limit=limit)
@@ -0,0 +1,89 @@
+import csv
+import io
+import json
+from typing import Iterable, Iterator, Tuple
+
+from django.db import connection
+
+EXPORT_COLUMNS = ("id", "title", "author", "genre")
+
+
+def iter_catalog_rows(itersize: int) -> Iterator[Tuple]:
+    """
+    Stream every book through a server-side named cursor.
+
+    Only `itersize` rows are held by the client at a time, so memory stays flat whatever the size of the catalog.
+    Args:
+    - itersize (int): Number of rows fetched from the server per round-trip.
+    Returns:
+    - Iterator[Tuple]: Book rows as (id, title, author, genre) tuples ordered by id.
+    """
+    with connection.chunked_cursor() as cursor:
+        cursor.cursor.itersize = itersize
+        cursor.execute("SELECT id, title, author, genre FROM books ORDER BY id")
+        yield from cursor
+
+
+def ndjson_chunks(rows: Iterable[Tuple], chunk_rows: int) -> Iterator[str]:
+    """
+    Encode rows as newline delimited JSON, grouping `chunk_rows` lines per chunk.
+    Args:
+    - rows (Iterable[Tuple]): Book rows.
+    - chunk_rows (int): Number of rows per yielded chunk.
+    Returns:
+    - Iterator[str]: NDJSON chunks.
+    """
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False))
+        if len(lines) >= chunk_rows:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def csv_chunks(rows: Iterable[Tuple], chunk_rows: int) -> Iterator[str]:
+    """
+    Encode rows as CSV with a header line, grouping `chunk_rows` lines per chunk.
+    Args:
+    - rows (Iterable[Tuple]): Book rows.
+    - chunk_rows (int): Number of rows per yielded chunk.
+    Returns:
+    - Iterator[str]: CSV chunks.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            count = 0
+    yield buffer.getvalue()
+
+
+"""
+Maps every export format to its content type, file extension and chunk encoder.
+"""
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson", ndjson_chunks),
+    "csv": ("text/csv", "csv", csv_chunks),
+}
+
+
+def export_catalog(export_format: str, itersize: int) -> Iterator[str]:
+    """
+    Stream the whole catalog encoded in the requested format.
+    Args:
+    - export_format (str): One of the keys of `EXPORT_FORMATS`.
+    - itersize (int): Number of rows fetched per round-trip and encoded per chunk.
+    Returns:
+    - Iterator[str]: Encoded chunks.
+    """
+    encoder = EXPORT_FORMATS[export_format][2]
+    return encoder(iter_catalog_rows(itersize=itersize), chunk_rows=itersize)
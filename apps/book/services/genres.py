@@ -0,0 +1,176 @@
+from typing import Dict, List
+
+from django.db import connection
+
+from apps.book.app_settings import app_setting
+from apps.book.services.leaderboard import fetch_book_stats
+from apps.core.redis_client import get_redis_client
+
+BOOK_GENRES_KEY = "books:genres:book:genre"
+BOOK_RATINGS_KEY = "books:genres:book:ratings"
+BOOK_TOTALS_KEY = "books:genres:book:totals"
+GENRE_RATINGS_KEY = "books:genres:ratings"
+GENRE_TOTALS_KEY = "books:genres:totals"
+GENRE_BOOKS_KEY = "books:genres:books"
+SEEDED_KEY = "books:genres:seeded"
+
+"""
+Replaces the number and sum of the ratings of a book and applies the difference to the counters of its genre in
+one atomic step, so the counters of a genre stay the sum of the counters of its books. The genre each book was
+counted in is kept as well, so a book that changed genre is moved between the counters of both genres. Writing the
+same values twice is a no-op, which makes redelivered events harmless.
+"""
+REPLACE_BOOK_SCRIPT = """
+local previous = redis.call('HGET', KEYS[1], ARGV[1])
+if previous then
+    redis.call('HINCRBY', KEYS[4], previous, -tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or 0))
+    redis.call('HINCRBY', KEYS[5], previous, -tonumber(redis.call('HGET', KEYS[3], ARGV[1]) or 0))
+end
+if tonumber(ARGV[3]) == 0 then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    redis.call('HDEL', KEYS[2], ARGV[1])
+    redis.call('HDEL', KEYS[3], ARGV[1])
+else
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[3])
+    redis.call('HSET', KEYS[3], ARGV[1], ARGV[4])
+    redis.call('HINCRBY', KEYS[4], ARGV[2], ARGV[3])
+    redis.call('HINCRBY', KEYS[5], ARGV[2], ARGV[4])
+end
+return 1
+"""
+REPLACE_BOOK_KEYS = [BOOK_GENRES_KEY, BOOK_RATINGS_KEY, BOOK_TOTALS_KEY, GENRE_RATINGS_KEY, GENRE_TOTALS_KEY]
+
+
+def invalidate() -> None:
+    """
+    Drop the number of books of every genre, so the next read counts them again after the catalog changed.
+    Raises:
+    - redis.RedisError: If the counters could not be reached.
+    """
+    get_redis_client().delete(GENRE_BOOKS_KEY)
+
+
+def write_book_stats(client, stats: List[tuple], book_ids: List[int]) -> None:
+    """
+    Replace the rating counters of some books, and of their genres, with `REPLACE_BOOK_SCRIPT`.
+    Args:
+    - client (redis.StrictRedis): Redis client.
+    - stats (List[tuple]): (book_id, genre, number of ratings, sum of the ratings) tuples.
+    - book_ids (List[int]): IDs of the books to write, the ones missing from `stats` are removed.
+    """
+    script = client.register_script(REPLACE_BOOK_SCRIPT)
+    pipeline = client.pipeline(transaction=False)
+    found = {book_id: (genre, count, total) for book_id, genre, count, total in stats}
+    for book_id in book_ids:
+        genre, count, total = found.get(book_id, ("", 0, 0))
+        script(keys=REPLACE_BOOK_KEYS, args=[book_id, genre, count, total], client=pipeline)
+    pipeline.execute()
+
+
+def consume_events(events: List) -> None:
+    """
+    Outbox consumer keeping the rating counters of the genres up to date.
+
+    The number and sum of the ratings of the books touched by the events are recomputed from `reviews` in one
+    query and replace their previous values, so a batch costs as many index lookups as it touched books instead of a
+    scan of the whole `reviews` table on the next read.
+    Args:
+    - events (List[OutboxEvent]): Rating events delivered by the outbox relay.
+    """
+    book_ids = sorted({event.book_id for event in events})
+    if book_ids:
+        write_book_stats(get_redis_client(), fetch_book_stats(book_ids), book_ids)
+
+
+def seed(client) -> None:
+    """
+    Write the rating counters of every rated book, when Redis has none yet.
+    Args:
+    - client (redis.StrictRedis): Redis client.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT b.id, b.genre, COUNT(r.id), SUM(r.rating) "
+            "FROM reviews r JOIN books b ON b.id = r.book_id GROUP BY b.id, b.genre"
+        )
+        stats = cursor.fetchall()
+    write_book_stats(client, stats, [book_id for book_id, _, _, _ in stats])
+    client.set(SEEDED_KEY, 1)
+
+
+def count_books(client) -> Dict[bytes, bytes]:
+    """
+    Count the books of every genre and cache the counts for `genres_cache_timeout` seconds.
+    Args:
+    - client (redis.StrictRedis): Redis client.
+    Returns:
+    - Dict[bytes, bytes]: Number of books keyed by genre, encoded as stored in Redis.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT genre, COUNT(*) FROM books GROUP BY genre")
+        counts = {genre.encode(): str(count).encode() for genre, count in cursor.fetchall()}
+    pipeline = client.pipeline(transaction=True)
+    pipeline.delete(GENRE_BOOKS_KEY)
+    if counts:
+        pipeline.hset(GENRE_BOOKS_KEY, mapping=counts)
+        pipeline.expire(GENRE_BOOKS_KEY, app_setting.genres_cache_timeout)
+    pipeline.execute()
+    return counts
+
+
+def compute_genre_stats() -> List[Dict]:
+    """
+    Aggregate the number of books and the number and average of the ratings of every genre in one query.
+    Returns:
+    - List[Dict]: Statistics of every genre, ordered by genre.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT b.genre, COUNT(DISTINCT b.id), COUNT(r.id), AVG(r.rating)::float8
+            FROM books b
+            LEFT JOIN reviews r ON r.book_id = b.id
+            GROUP BY b.genre
+            ORDER BY b.genre
+            """
+        )
+        rows = cursor.fetchall()
+    return [
+        {"genre": genre, "book_count": book_count, "rating_count": rating_count, "rating_average": rating_average}
+        for genre, book_count, rating_count, rating_average in rows
+    ]
+
+
+def genre_stats() -> List[Dict]:
+    """
+    Retrieve the statistics of every genre from the counters kept in Redis.
+
+    The rating counters are maintained by `consume_events` and seeded from Postgres the first time Redis is read
+    without them; the number of books is counted again once `genres_cache_timeout` expired or the catalog changed.
+    Returns:
+    - List[Dict]: Statistics of every genre, ordered by genre.
+    Raises:
+    - redis.RedisError: If the counters could not be read.
+    """
+    client = get_redis_client()
+    if not client.exists(SEEDED_KEY):
+        seed(client)
+    pipeline = client.pipeline(transaction=False)
+    pipeline.hgetall(GENRE_BOOKS_KEY)
+    pipeline.hgetall(GENRE_RATINGS_KEY)
+    pipeline.hgetall(GENRE_TOTALS_KEY)
+    book_counts, rating_counts, rating_totals = pipeline.execute()
+    if not book_counts:
+        book_counts = count_books(client)
+
+    stats = []
+    for genre in sorted(book_counts):
+        count = int(rating_counts.get(genre, 0))
+        stats.append({
+            "genre": genre.decode(),
+            "book_count": int(book_counts[genre]),
+            "rating_count": count,
+            "rating_average": int(rating_totals.get(genre, 0)) / count if count else None,
+        })
+    return stats
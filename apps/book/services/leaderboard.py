@@ -0,0 +1,289 @@
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+import redis
+from django.db import connection
+
+from apps.book.app_settings import app_setting
+from apps.book.models import ReviewEvent
+from apps.book.services import outbox
+from apps.core.redis_client import get_redis_client
+
+TOP_KEY = "books:top:{scope}"
+TRENDING_KEY = "books:trending:{scope}"
+TOP_KEYS = "books:top:keys"
+TRENDING_KEYS = "books:trending:keys"
+LANDMARK_KEY = "books:trending:landmark"
+POSITION_KEY = "books:trending:position"
+GLOBAL_SCOPE = "global"
+
+"""
+Trending scores are stored relative to a landmark time, so that an event only increments its books and never
+rewrites the others. Scores are rescaled to a new landmark once they grow past `exp(REBASE_EXPONENT)`, and books
+whose decayed score fell below `MIN_TRENDING_SCORE` are dropped on the way.
+"""
+REBASE_EXPONENT = 20
+MIN_TRENDING_SCORE = 1e-3
+
+"""
+Trending increments are not idempotent, so the position of the last event counted, `<transaction ID>:<event ID>`,
+is stored next to the boards and updated in the same transaction as them. Events at or before it are redelivered
+ones, after a relay failed between Redis and the commit of its offset or after a rebuild, and are skipped.
+"""
+
+"""
+Maps every leaderboard to the key pattern of its sorted sets.
+"""
+BOARDS = {
+    "top": TOP_KEY,
+    "trending": TRENDING_KEY,
+}
+
+
+def scope_keys(pattern: str, genre: str) -> Tuple[str, str]:
+    """
+    Build the keys of the global and of the genre leaderboards a book belongs to.
+    Args:
+    - pattern (str): Key pattern of the leaderboard.
+    - genre (str): Genre of the book.
+    Returns:
+    - Tuple[str, str]: Key of the global leaderboard and key of the genre leaderboard.
+    """
+    return pattern.format(scope=GLOBAL_SCOPE), pattern.format(scope=f"genre:{genre}")
+
+
+def decay_rate() -> float:
+    """
+    Compute the rate at which trending scores decay, from the configured half-life.
+    Returns:
+    - float: Decay rate per second.
+    """
+    return math.log(2) / app_setting.leaderboard_half_life
+
+
+def rated_score(count: int, total: int) -> float:
+    """
+    Damp the average rating of a book towards the prior mean, so that a single 5 does not top the leaderboard.
+    Args:
+    - count (int): Number of ratings of the book.
+    - total (int): Sum of the ratings of the book.
+    Returns:
+    - float: Bayesian average of the ratings.
+    """
+    weight = app_setting.leaderboard_prior_weight
+    return (weight * app_setting.leaderboard_prior_mean + total) / (weight + count)
+
+
+def fetch_book_stats(book_ids: Optional[List[int]] = None) -> List[Tuple[int, str, int, int]]:
+    """
+    Aggregate the ratings of some books, or of every book, in one query.
+    Args:
+    - book_ids (Optional[List[int]]): IDs of the books, all of them by default.
+    Returns:
+    - List[Tuple[int, str, int, int]]: (book_id, genre, number of ratings, sum of the ratings) tuples.
+    """
+    query = (
+        "SELECT b.id, b.genre, COUNT(r.id), COALESCE(SUM(r.rating), 0) "
+        "FROM books b LEFT JOIN reviews r ON r.book_id = b.id "
+    )
+    params = []
+    if book_ids is not None:
+        query += "WHERE b.id = ANY(%s) "
+        params.append(list(book_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(query + "GROUP BY b.id, b.genre", params)
+        return cursor.fetchall()
+
+
+def consume_events(events: List) -> None:
+    """
+    Outbox consumer keeping the leaderboards up to date.
+
+    The top-rated scores of the books touched by the events are recomputed from `reviews`, which makes redelivered
+    events harmless. Every created or updated rating adds its decayed weight to the trending scores of its book,
+    unless it was already counted according to `POSITION_KEY`.
+    Args:
+    - events (List[OutboxEvent]): Rating events delivered by the outbox relay.
+    """
+    stats = fetch_book_stats(sorted({event.book_id for event in events}))
+    genres = {book_id: genre for book_id, genre, _, _ in stats}
+
+    client = get_redis_client()
+    with client.pipeline(transaction=True) as pipeline:
+        while True:
+            try:
+                pipeline.watch(POSITION_KEY)
+                position = parse_position(pipeline.get(POSITION_KEY))
+                trending = [
+                    (event.book_id, genres[event.book_id], event.created_at.timestamp())
+                    for event in events
+                    if (event.xact_id, event.id) > position
+                    and event.event_type != ReviewEvent.EventType.DELETED and event.book_id in genres
+                ]
+                landmark = get_landmark(client, now=max(timestamp for _, _, timestamp in trending)) if trending else 0
+
+                pipeline.multi()
+                for book_id, genre, count, total in stats:
+                    keys = scope_keys(TOP_KEY, genre)
+                    for key in keys:
+                        if count:
+                            pipeline.zadd(key, {book_id: rated_score(count, total)})
+                        else:
+                            pipeline.zrem(key, book_id)
+                    pipeline.sadd(TOP_KEYS, *keys)
+
+                rate = decay_rate()
+                for book_id, genre, timestamp in trending:
+                    keys = scope_keys(TRENDING_KEY, genre)
+                    for key in keys:
+                        pipeline.zincrby(key, math.exp(rate * (timestamp - landmark)), book_id)
+                    pipeline.sadd(TRENDING_KEYS, *keys)
+                last = (events[-1].xact_id, events[-1].id)
+                if last > position:
+                    pipeline.set(POSITION_KEY, format_position(last))
+                pipeline.execute()
+                return
+            except redis.WatchError:
+                continue
+
+
+def parse_position(value: Optional[bytes]) -> Tuple[int, int]:
+    """
+    Decode the position of the last event counted by the trending leaderboards.
+    Args:
+    - value (Optional[bytes]): Value of `POSITION_KEY`, None if no event was counted yet.
+    Returns:
+    - Tuple[int, int]: Transaction ID and ID of the event, (0, 0) if there is none.
+    """
+    if not value:
+        return 0, 0
+    xact_id, event_id = value.split(b":")
+    return int(xact_id), int(event_id)
+
+
+def format_position(position: Tuple[int, int]) -> str:
+    """
+    Encode the position of an event as stored in `POSITION_KEY`.
+    Args:
+    - position (Tuple[int, int]): Transaction ID and ID of the event.
+    Returns:
+    - str: The encoded position.
+    """
+    return f"{position[0]}:{position[1]}"
+
+
+def get_landmark(client, now: float) -> float:
+    """
+    Retrieve the landmark time of the trending scores, moving it to `now` when the scores grew too large.
+    Args:
+    - client (redis.StrictRedis): Redis client.
+    - now (float): Timestamp of the newest event about to be recorded.
+    Returns:
+    - float: Landmark timestamp the new increments must be relative to.
+    """
+    client.setnx(LANDMARK_KEY, now)
+    landmark = float(client.get(LANDMARK_KEY))
+    if decay_rate() * (now - landmark) <= REBASE_EXPONENT:
+        return landmark
+
+    factor = math.exp(-decay_rate() * (now - landmark))
+    pipeline = client.pipeline(transaction=True)
+    for key in client.smembers(TRENDING_KEYS):
+        pipeline.zunionstore(key, {key: factor})
+        pipeline.zremrangebyscore(key, "-inf", MIN_TRENDING_SCORE)
+    pipeline.set(LANDMARK_KEY, now)
+    pipeline.execute()
+    return now
+
+
+def top_books(board: str, genre: Optional[str], limit: int) -> List[Tuple[int, float]]:
+    """
+    Retrieve the best books of a leaderboard with a single `ZREVRANGE`.
+
+    Trending scores are converted from the landmark time to the current time, so they read as the number of
+    ratings received, each weighted by its decay.
+    Args:
+    - board (str): One of the keys of `BOARDS`.
+    - genre (Optional[str]): Genre of the leaderboard, the global leaderboard if None.
+    - limit (int): Number of books returned.
+    Returns:
+    - List[Tuple[int, float]]: (book_id, score) pairs, best first.
+    Raises:
+    - redis.RedisError: If the leaderboard could not be read.
+    """
+    pattern = BOARDS[board]
+    key = pattern.format(scope=f"genre:{genre}" if genre else GLOBAL_SCOPE)
+    client = get_redis_client()
+    if board == "trending":
+        pipeline = client.pipeline(transaction=False)
+        pipeline.zrevrange(key, 0, limit - 1, withscores=True)
+        pipeline.get(LANDMARK_KEY)
+        entries, landmark = pipeline.execute()
+        factor = math.exp(-decay_rate() * (time.time() - float(landmark))) if landmark else 1
+    else:
+        entries = client.zrevrange(key, 0, limit - 1, withscores=True)
+        factor = 1
+    return [(int(member), score * factor) for member, score in entries]
+
+
+def rebuild(consumer: Optional[str] = None) -> Tuple[int, int]:
+    """
+    Recompute every leaderboard from Postgres and swap it in atomically.
+
+    Top-rated scores are aggregated from `reviews`. Trending scores are aggregated from the outbox events of the
+    last `leaderboard_trending_window` half-lives; older events would weigh less than a thousandth of a rating.
+    The position of the last aggregated event is stored in the same transaction as the boards, so that the relay
+    skips these events even if it delivers them again; the offset of the outbox consumer maintaining the
+    leaderboards is then moved past them, so that it does not have to.
+    Args:
+    - consumer (Optional[str]): Name of the outbox consumer running `consume_events`, if any.
+    Returns:
+    - Tuple[int, int]: Number of books in the global top-rated and trending leaderboards.
+    """
+    top: Dict[str, Dict[int, float]] = {}
+    for book_id, genre, count, total in fetch_book_stats():
+        if count:
+            for key in scope_keys(TOP_KEY, genre):
+                top.setdefault(key, {})[book_id] = rated_score(count, total)
+
+    now = time.time()
+    half_life = app_setting.leaderboard_half_life
+    last_position = outbox.last_event_position()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT o.book_id, b.genre, SUM(exp(%s * (extract(epoch FROM o.created_at) - %s)))::float8
+            FROM reviews_outbox o
+            JOIN books b ON b.id = o.book_id
+            WHERE ROW(o.xact_id, o.id) <= ROW(%s::bigint, %s::bigint) AND o.event_type <> %s
+              AND o.created_at >= to_timestamp(%s)
+            GROUP BY o.book_id, b.genre
+            """,
+            [decay_rate(), now, *last_position, ReviewEvent.EventType.DELETED.value,
+             now - half_life * app_setting.leaderboard_trending_window]
+        )
+        trending_rows = cursor.fetchall()
+    trending: Dict[str, Dict[int, float]] = {}
+    for book_id, genre, score in trending_rows:
+        for key in scope_keys(TRENDING_KEY, genre):
+            trending.setdefault(key, {})[book_id] = score
+
+    client = get_redis_client()
+    stale = client.smembers(TOP_KEYS) | client.smembers(TRENDING_KEYS)
+    pipeline = client.pipeline(transaction=True)
+    pipeline.delete(TOP_KEYS, TRENDING_KEYS, *stale)
+    for registry, boards in ((TOP_KEYS, top), (TRENDING_KEYS, trending)):
+        for key, scores in boards.items():
+            pipeline.zadd(key, scores)
+        if boards:
+            pipeline.sadd(registry, *boards)
+    pipeline.set(LANDMARK_KEY, now)
+    pipeline.set(POSITION_KEY, format_position(last_position))
+    pipeline.execute()
+
+    if consumer:
+        outbox.advance_offset(consumer=consumer, position=last_position)
+
+    return (len(top.get(TOP_KEY.format(scope=GLOBAL_SCOPE), {})),
+            len(trending.get(TRENDING_KEY.format(scope=GLOBAL_SCOPE), {})))
@@ -0,0 +1,73 @@
+from typing import Dict, Iterable, List, Optional
+
+from django.db import connection
+
+from apps.book.services import write_behind
+
+MEMO_ATTRIBUTE = "_book_lookup_memo"
+
+
+def request_memo(request) -> Dict:
+    """
+    Retrieve the memo of the books already looked up while handling a request, creating it on first use.
+
+    The memo lives on the underlying Django request, so it is shared by every view and helper handling the same
+    request and dropped with it.
+    Args:
+    - request (Request): The DRF or Django request being handled.
+    Returns:
+    - Dict: Looked up books keyed by (user_id, book_id), None for the books that do not exist.
+    """
+    http_request = getattr(request, "_request", request)
+    memo = getattr(http_request, MEMO_ATTRIBUTE, None)
+    if memo is None:
+        memo = {}
+        setattr(http_request, MEMO_ATTRIBUTE, memo)
+    return memo
+
+
+def lookup_books(user_id: Optional[int], book_ids: Iterable[int],
+                 memo: Optional[Dict] = None) -> List[Optional[Dict]]:
+    """
+    Retrieve many books with their rating statistics and the rating of the user, in one query.
+
+    The books missing from the memo are fetched with a single `= ANY(%s)` query joining the aggregate of their
+    reviews and the review of the user; repeated IDs and IDs already in the memo cost nothing.
+    Args:
+    - user_id (Optional[int]): The ID of the user, None for anonymous users.
+    - book_ids (Iterable[int]): IDs of the books, possibly repeated.
+    - memo (Optional[Dict]): Memo shared across the lookups of a request, see `request_memo`.
+    Returns:
+    - List[Optional[Dict]]: The books in the order of `book_ids`, None for the books that do not exist.
+    """
+    book_ids = list(book_ids)
+    memo = {} if memo is None else memo
+    missing = sorted({book_id for book_id in book_ids if (user_id, book_id) not in memo})
+
+    if missing:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT b.id, b.title, b.author, b.genre, stats.rating_count, stats.rating_average, mine.rating
+                FROM books b
+                CROSS JOIN LATERAL (
+                    SELECT COUNT(*) AS rating_count, AVG(r.rating)::float8 AS rating_average
+                    FROM reviews r WHERE r.book_id = b.id
+                ) stats
+                LEFT JOIN reviews mine ON mine.book_id = b.id AND mine.account_user_id = %s
+                WHERE b.id = ANY(%s)
+                """,
+                [user_id, missing]
+            )
+            rows = cursor.fetchall()
+
+        columns = ("id", "title", "author", "genre", "rating_count", "rating_average", "my_rating")
+        found = {row[0]: dict(zip(columns, row)) for row in rows}
+        if user_id is not None and write_behind.is_enabled():
+            for book_id, rating in write_behind.pending_ratings(user_id).items():
+                if book_id in found:
+                    found[book_id]["my_rating"] = rating
+        for book_id in missing:
+            memo[(user_id, book_id)] = found.get(book_id)
+
+    return [memo[(user_id, book_id)] for book_id in book_ids]
@@ -0,0 +1,315 @@
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+from apps.book.app_settings import app_setting
+from apps.book.models import ReviewEvent
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxEvent(NamedTuple):
+    """
+    Rating mutation read from the `reviews_outbox` table, as delivered to the outbox consumers.
+    """
+    id: int
+    event_type: int
+    review_id: int
+    book_id: int
+    account_user_id: int
+    rating: Optional[int]
+    created_at: datetime
+    xact_id: int
+
+
+"""
+Events are delivered in (transaction ID, event ID) order and only once every transaction with a lower ID has ended.
+Event IDs are allocated when a mutation runs but become visible when it commits, so a lower event ID can appear
+after a higher one and cannot be used as a cursor on its own; transaction IDs below the `xmin` of the current
+snapshot, on the other hand, belong to transactions that already committed or rolled back, so no event can appear
+behind them anymore, however long the transaction that wrote it ran.
+"""
+VISIBLE_XMIN = "pg_snapshot_xmin(pg_current_snapshot())::text::bigint"
+
+
+class ExpiredCursor(Exception):
+    """
+    Raised when a change feed cursor points to an event that was pruned from the outbox.
+    """
+
+
+def get_consumers(names: Optional[Iterable[str]] = None) -> Dict[str, Callable[[List[OutboxEvent]], None]]:
+    """
+    Import the consumers registered in the `BOOK_OUTBOX_CONSUMERS` setting.
+    Args:
+    - names (Optional[Iterable[str]]): Names of the consumers to import, all of them by default.
+    Returns:
+    - Dict[str, Callable]: Consumer callables keyed by consumer name.
+    Raises:
+    - KeyError: If one of the names is not registered.
+    - ImportError: If a dotted path cannot be imported.
+    """
+    registered = app_setting.outbox_consumers
+    if names is None:
+        names = registered
+    consumers = {}
+    for name in names:
+        path = registered[name]
+        consumers[name] = import_string(path) if isinstance(path, str) else path
+    return consumers
+
+
+def event_position(event_id: int) -> Tuple[int, int]:
+    """
+    Resolve the position of an event in the delivery order.
+    Args:
+    - event_id (int): ID of the event, 0 for the position before the first event.
+    Returns:
+    - Tuple[int, int]: Transaction ID and ID of the event.
+    Raises:
+    - ExpiredCursor: If the event is no longer in the outbox.
+    """
+    if not event_id:
+        return 0, 0
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT xact_id FROM reviews_outbox WHERE id = %s", [event_id])
+        row = cursor.fetchone()
+    if row is None:
+        raise ExpiredCursor(f"Event {event_id} was pruned from the outbox")
+    return row[0], event_id
+
+
+def fetch_events(after: Tuple[int, int], limit: int) -> List[OutboxEvent]:
+    """
+    Read the outbox events following a position in delivery order.
+
+    Only events of transactions that ended before every transaction still running are returned, so that the
+    position of the last returned event can safely be used as the next cursor.
+    Args:
+    - after (Tuple[int, int]): Only return events delivered after this (transaction ID, event ID) position,
+      (0, 0) to read from the beginning.
+    - limit (int): Maximum number of events returned.
+    Returns:
+    - List[OutboxEvent]: Events in delivery order.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT id, event_type, review_id, book_id, account_user_id, rating, created_at, xact_id
+            FROM reviews_outbox
+            WHERE ROW(xact_id, id) > ROW(%s::bigint, %s::bigint) AND xact_id < {VISIBLE_XMIN}
+            ORDER BY xact_id, id
+            LIMIT %s
+            """,
+            [*after, limit]
+        )
+        return [OutboxEvent(*row) for row in cursor.fetchall()]
+
+
+def last_event_position() -> Tuple[int, int]:
+    """
+    Retrieve the position of the last event that can be delivered, in delivery order.
+    Returns:
+    - Tuple[int, int]: Transaction ID and ID of the event, (0, 0) if there is none yet.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT xact_id, id FROM reviews_outbox WHERE xact_id < {VISIBLE_XMIN} "
+            f"ORDER BY xact_id DESC, id DESC LIMIT 1"
+        )
+        row = cursor.fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def last_event_id() -> int:
+    """
+    Retrieve the ID of the last event that can be delivered, in delivery order.
+    Returns:
+    - int: The event ID, 0 if there is none yet.
+    """
+    return last_event_position()[1]
+
+
+def advance_offset(consumer: str, position: Tuple[int, int]) -> None:
+    """
+    Move the offset of a consumer forward to a position, leaving it untouched if it is already past that position.
+    Args:
+    - consumer (str): Name of the consumer.
+    - position (Tuple[int, int]): Transaction ID and ID of the last event the consumer has seen.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO reviews_outbox_offsets (consumer, last_xact_id, last_event_id) VALUES (%s, %s, %s)
+            ON CONFLICT (consumer) DO UPDATE
+            SET last_xact_id = EXCLUDED.last_xact_id, last_event_id = EXCLUDED.last_event_id, updated_at = now()
+            WHERE ROW(EXCLUDED.last_xact_id, EXCLUDED.last_event_id)
+                > ROW(reviews_outbox_offsets.last_xact_id, reviews_outbox_offsets.last_event_id)
+            """,
+            [consumer, *position]
+        )
+
+
+def relay_batch(consumer: str, handler: Callable[[List[OutboxEvent]], None], batch_size: int) -> int:
+    """
+    Deliver the next batch of outbox events to a consumer and advance its offset.
+
+    The offset row of the consumer is locked with `FOR UPDATE SKIP LOCKED`, so concurrent relays never deliver the
+    same batch twice, and it is only advanced once the handler returned. The offset holds the whole position of the
+    last event, so it stays valid once that event was pruned. Handlers writing to the database do it in
+    the same transaction as the offset and see every event exactly once; other handlers see them at least once.
+    Args:
+    - consumer (str): Name of the consumer.
+    - handler (Callable): Callable receiving the list of events.
+    - batch_size (int): Maximum number of events delivered.
+    Returns:
+    - int: Number of events delivered.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO reviews_outbox_offsets (consumer, last_xact_id, last_event_id) VALUES (%s, 0, 0) "
+            "ON CONFLICT (consumer) DO NOTHING",
+            [consumer]
+        )
+        cursor.execute(
+            "SELECT last_xact_id, last_event_id FROM reviews_outbox_offsets WHERE consumer = %s "
+            "FOR UPDATE SKIP LOCKED",
+            [consumer]
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return 0
+
+        events = fetch_events(after=row, limit=batch_size)
+        if not events:
+            return 0
+
+        handler(events)
+        cursor.execute(
+            "UPDATE reviews_outbox_offsets SET last_xact_id = %s, last_event_id = %s, updated_at = now() "
+            "WHERE consumer = %s",
+            [events[-1].xact_id, events[-1].id, consumer]
+        )
+    return len(events)
+
+
+def relay_once(consumers: Dict[str, Callable[[List[OutboxEvent]], None]], batch_size: int) -> Dict[str, int]:
+    """
+    Deliver one batch of outbox events to every consumer.
+
+    A failing consumer is logged and keeps its offset, so the same events are retried on the next pass without
+    holding the other consumers back.
+    Args:
+    - consumers (Dict[str, Callable]): Consumer callables keyed by consumer name.
+    - batch_size (int): Maximum number of events delivered to each consumer.
+    Returns:
+    - Dict[str, int]: Number of events delivered keyed by consumer name.
+    """
+    delivered = {}
+    for name, handler in consumers.items():
+        try:
+            delivered[name] = relay_batch(name, handler, batch_size=batch_size)
+        except Exception:  # noqa
+            logger.exception("Outbox consumer %s failed, its offset was not advanced", name)
+            delivered[name] = 0
+    return delivered
+
+
+def prune(limit: int) -> int:
+    """
+    Delete the oldest outbox events that every registered consumer has already seen.
+
+    Events younger than `outbox_retention_days` are kept whatever the offsets, so that the change feed readers,
+    which keep their cursor outside of `reviews_outbox_offsets`, and the rebuilds of the sketches and leaderboards
+    still find them. Offsets of consumers that are no longer registered are ignored, and nothing is deleted until
+    every registered consumer has an offset.
+    Args:
+    - limit (int): Maximum number of events deleted.
+    Returns:
+    - int: Number of events deleted.
+    """
+    consumers = list(app_setting.outbox_consumers)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT last_xact_id, last_event_id FROM reviews_outbox_offsets WHERE consumer = ANY(%s)",
+            [consumers]
+        )
+        offsets = cursor.fetchall()
+        if not offsets or len(offsets) < len(consumers):
+            return 0
+        cursor.execute(
+            """
+            DELETE FROM reviews_outbox WHERE id IN (
+                SELECT id FROM reviews_outbox
+                WHERE ROW(xact_id, id) <= ROW(%s::bigint, %s::bigint)
+                  AND created_at < now() - make_interval(days => %s)
+                ORDER BY xact_id, id
+                LIMIT %s
+            )
+            """,
+            [*min(offsets), app_setting.outbox_retention_days, limit]
+        )
+        return cursor.rowcount
+
+
+"""
+Maps every outbox event type to the name exposed by the change feed.
+"""
+EVENT_TYPE_NAMES = {
+    ReviewEvent.EventType.CREATED: "created",
+    ReviewEvent.EventType.UPDATED: "updated",
+    ReviewEvent.EventType.DELETED: "deleted",
+}
+
+
+def read_changes(since: int, limit: int) -> List[Dict]:
+    """
+    Read the rating changes following a cursor, for consumers syncing incrementally.
+
+    The cost is one range scan of the outbox (transaction ID, event ID) index, proportional to the number of changes
+    returned and not to the size of the `reviews` table.
+    Args:
+    - since (int): ID of the last change already seen by the consumer, 0 to read from the beginning.
+    - limit (int): Maximum number of changes returned.
+    Returns:
+    - List[Dict]: Changes in delivery order, with their event type name.
+    Raises:
+    - ExpiredCursor: If the change `since` points to was pruned, the consumer must take a new snapshot.
+    """
+    return [
+        dict(event._asdict(), type=EVENT_TYPE_NAMES[event.event_type])
+        for event in fetch_events(after=event_position(since), limit=limit)
+    ]
+
+
+def read_snapshot(cursor: int, after_review_id: int, limit: int) -> List[Dict]:
+    """
+    Read the stored ratings as synthetic "created" changes, for consumers syncing from scratch.
+
+    The outbox only holds the mutations recorded since it was introduced, so ratings inserted before it, or
+    straight into the `reviews` table like the seed data of `setup.sh`, never appear in `read_changes`. A consumer
+    starting from scratch reads the snapshot in a single REPEATABLE READ transaction, together with `last_event_id`
+    as the cursor, then follows `read_changes` from that cursor. Changes committed while the snapshot was taken
+    may be seen twice, once in the snapshot and once in the feed, so consumers must apply "created" and "updated"
+    changes as upserts.
+    Args:
+    - cursor (int): Cursor the changes are tagged with, from `last_event_id` in the same transaction.
+    - after_review_id (int): Only return ratings with a higher ID, 0 to read from the beginning.
+    - limit (int): Maximum number of changes returned.
+    Returns:
+    - List[Dict]: Changes in rating ID order.
+    """
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(
+            "SELECT id, book_id, account_user_id, rating FROM reviews WHERE id > %s ORDER BY id LIMIT %s",
+            [after_review_id, limit]
+        )
+        rows = db_cursor.fetchall()
+    return [
+        {"id": cursor, "type": EVENT_TYPE_NAMES[ReviewEvent.EventType.CREATED], "review_id": review_id,
+         "book_id": book_id, "account_user_id": account_user_id, "rating": rating, "created_at": None}
+        for review_id, book_id, account_user_id, rating in rows
+    ]
@@ -0,0 +1,88 @@
+from django.db import connection
+from apps.book.services import write_behind
+
+
+def get_recommendations(user_id, book_id):
+    """
+    Generates book recommendations based on the genre of the reviewed book and ratings from similar users.
+
+    This function:
+    1. Retrieves the genre of the reviewed book.
+    2. Gathers a list of books that the user has already rated, including mutations still buffered in Redis.
+    3. Collects ratings from other users who have reviewed books in the same genre.
+    4. Identifies users with similar reading preferences.
+    5. Provides recommendations of books highly rated by similar users that the current user has not yet rated.
+
+    Args:
+        user_id (int): The ID of the user requesting recommendations.
+        book_id (int): The ID of the book that was reviewed.
+
+    Returns:
+        list: A list of dictionaries containing recommended books with their IDs, titles, and average ratings.
+    """
+    recommendations = []
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT genre FROM books WHERE id = %s",
+                [book_id]
+            )
+            genre_row = cursor.fetchone()
+
+            if not genre_row:
+                return {"message": "Genre not found"}
+
+            genre = genre_row[0]
+
+            cursor.execute(
+                "SELECT book_id, rating FROM reviews WHERE account_user_id = %s",
+                [user_id]
+            )
+            rated_books = write_behind.overlay_ratings(user_id, dict(cursor.fetchall()))
+
+            if not rated_books:
+                return {"message": "There is not enough data about you"}
+
+            rated_books_ids = list(rated_books)
+
+            cursor.execute("""
+                SELECT r.account_user_id, r.book_id, r.rating
+                FROM reviews r
+                JOIN books b ON r.book_id = b.id
+                WHERE b.genre = %s AND r.account_user_id != %s
+            """, [genre, user_id])
+
+            similar_users_ratings = cursor.fetchall()
+
+            user_profiles = {}
+            for other_user_id, book_id, rating in similar_users_ratings:
+                if other_user_id not in user_profiles:
+                    user_profiles[other_user_id] = {}
+                user_profiles[other_user_id][book_id] = rating
+
+            similar_users = []
+            for other_user_id, ratings in user_profiles.items():
+                common_books = set(ratings.keys()) & set(rated_books_ids)
+                if common_books:
+                    similar_users.append(other_user_id)
+
+            if similar_users:
+                cursor.execute("""
+                    SELECT r.book_id, b.title, AVG(r.rating) as avg_rating
+                    FROM reviews r
+                    JOIN books b ON r.book_id = b.id
+                    WHERE r.account_user_id IN %s AND r.book_id NOT IN %s
+                    GROUP BY r.book_id, b.title
+                    ORDER BY avg_rating DESC
+                """, [tuple(similar_users), tuple(rated_books_ids)])
+
+                potential_recommendations = cursor.fetchall()
+
+                recommendations = [{"book_id": book_id, "title": title, "rating": avg_rating} for
+                                   book_id, title, avg_rating in potential_recommendations]
+
+    except Exception as e:
+        return {"error": str(e)}
+
+    return recommendations
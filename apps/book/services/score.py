@@ -0,0 +1,340 @@
+from typing import Dict, List, Optional, Set, Tuple
+
+from django.db import connection
+
+from apps.book.models import ReviewEvent
+
+CREATED, UPDATED, DELETED = ReviewEvent.EventType.values
+
+
+def add_review(user_id: int, book_id: int, rating: int) -> Tuple[bool, bool]:
+    """
+    Create a review if the user has not rated the book yet, recording its outbox event in the same statement.
+    Args:
+    - user_id (int): The ID of the user rating the book.
+    - book_id (int): The ID of the rated book.
+    - rating (int): The rating, from 1 to 5.
+    Returns:
+    - Tuple[bool, bool]: Whether the book exists, and whether the review was created.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH book AS (SELECT id FROM books WHERE id = %s),
+            inserted AS (
+                INSERT INTO reviews (book_id, account_user_id, rating)
+                SELECT id, %s, %s FROM book
+                ON CONFLICT (book_id, account_user_id) DO NOTHING
+                RETURNING id, book_id, account_user_id, rating
+            ),
+            event AS (
+                INSERT INTO reviews_outbox (event_type, review_id, book_id, account_user_id, rating)
+                SELECT %s, id, book_id, account_user_id, rating FROM inserted
+            )
+            SELECT EXISTS (SELECT 1 FROM book), EXISTS (SELECT 1 FROM inserted)
+            """,
+            [book_id, user_id, rating, CREATED]
+        )
+        book_exists, created = cursor.fetchone()
+    return book_exists, created
+
+
+def upsert_review(user_id: int, book_id: int, rating: int) -> Tuple[bool, Optional[bool]]:
+    """
+    Create or update the review of a user for a book, recording its outbox event in the same statement.
+
+    `xmax = 0` on the row returned by `INSERT ... ON CONFLICT DO UPDATE` tells an insert from an update.
+    Args:
+    - user_id (int): The ID of the user rating the book.
+    - book_id (int): The ID of the rated book.
+    - rating (int): The rating, from 1 to 5.
+    Returns:
+    - Tuple[bool, Optional[bool]]: Whether the book exists, and whether the review was created (None if the book
+      does not exist).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH book AS (SELECT id FROM books WHERE id = %s),
+            upserted AS (
+                INSERT INTO reviews (book_id, account_user_id, rating)
+                SELECT id, %s, %s FROM book
+                ON CONFLICT (book_id, account_user_id) DO UPDATE SET rating = EXCLUDED.rating
+                RETURNING id, book_id, account_user_id, rating, (xmax = 0) AS created
+            ),
+            event AS (
+                INSERT INTO reviews_outbox (event_type, review_id, book_id, account_user_id, rating)
+                SELECT CASE WHEN created THEN %s ELSE %s END, id, book_id, account_user_id, rating FROM upserted
+            )
+            SELECT EXISTS (SELECT 1 FROM book), (SELECT created FROM upserted)
+            """,
+            [book_id, user_id, rating, CREATED, UPDATED]
+        )
+        book_exists, created = cursor.fetchone()
+    return book_exists, created
+
+
+def update_review(user_id: int, book_id: int, rating: int) -> bool:
+    """
+    Update the existing review of a user for a book, recording its outbox event in the same statement.
+    Args:
+    - user_id (int): The ID of the user rating the book.
+    - book_id (int): The ID of the rated book.
+    - rating (int): The new rating, from 1 to 5.
+    Returns:
+    - bool: True if the review existed and was updated, False otherwise.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH updated AS (
+                UPDATE reviews SET rating = %s WHERE book_id = %s AND account_user_id = %s
+                RETURNING id, book_id, account_user_id, rating
+            ),
+            event AS (
+                INSERT INTO reviews_outbox (event_type, review_id, book_id, account_user_id, rating)
+                SELECT %s, id, book_id, account_user_id, rating FROM updated
+            )
+            SELECT EXISTS (SELECT 1 FROM updated)
+            """,
+            [rating, book_id, user_id, UPDATED]
+        )
+        return cursor.fetchone()[0]
+
+
+def delete_review(user_id: int, book_id: int) -> bool:
+    """
+    Delete the review of a user for a book, recording its outbox event in the same statement.
+    Args:
+    - user_id (int): The ID of the user who rated the book.
+    - book_id (int): The ID of the rated book.
+    Returns:
+    - bool: True if the review existed and was deleted, False otherwise.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH deleted AS (
+                DELETE FROM reviews WHERE book_id = %s AND account_user_id = %s
+                RETURNING id, book_id, account_user_id
+            ),
+            event AS (
+                INSERT INTO reviews_outbox (event_type, review_id, book_id, account_user_id)
+                SELECT %s, id, book_id, account_user_id FROM deleted
+            )
+            SELECT EXISTS (SELECT 1 FROM deleted)
+            """,
+            [book_id, user_id, DELETED]
+        )
+        return cursor.fetchone()[0]
+
+
+def bulk_upsert_reviews(user_id: int, ratings: Dict[int, int]) -> Tuple[List[int], List[int], List[int]]:
+    """
+    Create or update many reviews of a user with a single statement.
+
+    The submitted pairs are passed as two arrays and expanded with `unnest`, joined to `books` so unknown books are
+    skipped instead of aborting the whole batch, and written with `INSERT ... ON CONFLICT DO UPDATE`.
+    `xmax = 0` on the returned rows tells the inserted rows from the updated ones, and the outbox events of all the
+    written rows are recorded in the same statement.
+    Args:
+    - user_id (int): The ID of the user rating the books.
+    - ratings (Dict[int, int]): Ratings to write keyed by book ID.
+    Returns:
+    - Tuple[List[int], List[int], List[int]]: IDs of the books whose review was created, updated, and of the books
+      that do not exist.
+    """
+    book_ids = list(ratings)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH upserted AS (
+                INSERT INTO reviews (book_id, account_user_id, rating)
+                SELECT submitted.book_id, %s, submitted.rating
+                FROM unnest(%s::integer[], %s::integer[]) AS submitted (book_id, rating)
+                JOIN books b ON b.id = submitted.book_id
+                ON CONFLICT (book_id, account_user_id) DO UPDATE SET rating = EXCLUDED.rating
+                RETURNING id, book_id, account_user_id, rating, (xmax = 0) AS created
+            ),
+            event AS (
+                INSERT INTO reviews_outbox (event_type, review_id, book_id, account_user_id, rating)
+                SELECT CASE WHEN created THEN %s ELSE %s END, id, book_id, account_user_id, rating FROM upserted
+            )
+            SELECT book_id, created FROM upserted
+            """,
+            [user_id, book_ids, [ratings[book_id] for book_id in book_ids], CREATED, UPDATED]
+        )
+        rows = cursor.fetchall()
+
+    created = [book_id for book_id, is_created in rows if is_created]
+    updated = [book_id for book_id, is_created in rows if not is_created]
+    written = set(created) | set(updated)
+    missing = [book_id for book_id in book_ids if book_id not in written]
+    return created, updated, missing
+
+
+def apply_review_mutations(upserts: List[Tuple[int, int, int]], deletes: List[Tuple[int, int]]) -> None:
+    """
+    Apply rating mutations of many users with one bulk upsert and one bulk delete.
+
+    Mutations referencing books or users that no longer exist are dropped. Callers must pass at most one mutation
+    per (user, book) pair. The outbox events of the written rows are recorded by the same statements.
+    Args:
+    - upserts (List[Tuple[int, int, int]]): (user_id, book_id, rating) triples to create or update.
+    - deletes (List[Tuple[int, int]]): (user_id, book_id) pairs to delete.
+    """
+    with connection.cursor() as cursor:
+        if upserts:
+            user_ids, book_ids, ratings = zip(*upserts)
+            cursor.execute(
+                """
+                WITH upserted AS (
+                    INSERT INTO reviews (book_id, account_user_id, rating)
+                    SELECT submitted.book_id, submitted.user_id, submitted.rating
+                    FROM unnest(%s::bigint[], %s::integer[], %s::integer[]) AS submitted (user_id, book_id, rating)
+                    JOIN books b ON b.id = submitted.book_id
+                    JOIN account_user u ON u.id = submitted.user_id
+                    ON CONFLICT (book_id, account_user_id) DO UPDATE SET rating = EXCLUDED.rating
+                    RETURNING id, book_id, account_user_id, rating, (xmax = 0) AS created
+                )
+                INSERT INTO reviews_outbox (event_type, review_id, book_id, account_user_id, rating)
+                SELECT CASE WHEN created THEN %s ELSE %s END, id, book_id, account_user_id, rating FROM upserted
+                """,
+                [list(user_ids), list(book_ids), list(ratings), CREATED, UPDATED]
+            )
+        if deletes:
+            user_ids, book_ids = zip(*deletes)
+            cursor.execute(
+                """
+                WITH deleted AS (
+                    DELETE FROM reviews r
+                    USING unnest(%s::bigint[], %s::integer[]) AS removed (user_id, book_id)
+                    WHERE r.account_user_id = removed.user_id AND r.book_id = removed.book_id
+                    RETURNING r.id, r.book_id, r.account_user_id
+                )
+                INSERT INTO reviews_outbox (event_type, review_id, book_id, account_user_id)
+                SELECT %s, id, book_id, account_user_id FROM deleted
+                """,
+                [list(user_ids), list(book_ids), DELETED]
+            )
+
+
+def claim_review_fences(fences: List[Tuple[int, int, int, int]]) -> Set[Tuple[int, int]]:
+    """
+    Move the write-behind fences of (user, book) pairs forward to stream entries, in one statement.
+
+    Fences already at or past the given entry are left untouched. Concurrent claims of the same pair wait for each
+    other on its row, so when called in the transaction writing the ratings, only the newest entry of a pair is ever
+    written, whichever transaction commits first.
+    Args:
+    - fences (List[Tuple[int, int, int, int]]): (user_id, book_id, entry time, entry sequence) tuples, at most one
+      per (user, book) pair.
+    Returns:
+    - Set[Tuple[int, int]]: (user_id, book_id) pairs whose fence was moved forward.
+    """
+    if not fences:
+        return set()
+    user_ids, book_ids, entry_ms, entry_seq = zip(*fences)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO reviews_buffer_fences (account_user_id, book_id, entry_ms, entry_seq)
+            SELECT * FROM unnest(%s::bigint[], %s::integer[], %s::bigint[], %s::bigint[])
+            ON CONFLICT (account_user_id, book_id) DO UPDATE
+            SET entry_ms = EXCLUDED.entry_ms, entry_seq = EXCLUDED.entry_seq
+            WHERE ROW(EXCLUDED.entry_ms, EXCLUDED.entry_seq)
+                > ROW(reviews_buffer_fences.entry_ms, reviews_buffer_fences.entry_seq)
+            RETURNING account_user_id, book_id
+            """,
+            [list(user_ids), list(book_ids), list(entry_ms), list(entry_seq)]
+        )
+        return set(cursor.fetchall())
+
+
+def delete_review_fences(up_to: Tuple[int, int]) -> int:
+    """
+    Delete the write-behind fences at or before a stream entry.
+    Args:
+    - up_to (Tuple[int, int]): Entry time and sequence of the newest fence deleted.
+    Returns:
+    - int: Number of fences deleted.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM reviews_buffer_fences WHERE ROW(entry_ms, entry_seq) <= ROW(%s::bigint, %s::bigint)",
+            list(up_to)
+        )
+        return cursor.rowcount
+
+
+def list_user_reviews(user_id: int, limit: int, before: Optional[int] = None,
+                      genre: Optional[str] = None) -> List[Dict]:
+    """
+    Retrieve one page of the reviews of a user, newest first, together with the rated books.
+
+    Pages are addressed by keyset on `(account_user_id, id)`: the next page starts below the last review ID of the
+    previous one, so every page is a single backward range scan of the `reviews_user_id_covering_idx` index, which
+    also carries `book_id` and `rating`, whatever the depth of the page. Books are joined by primary key.
+    Args:
+    - user_id (int): The ID of the user.
+    - limit (int): Maximum number of reviews returned.
+    - before (Optional[int]): Only return reviews with a lower ID, i.e. the cursor of the previous page.
+    - genre (Optional[str]): Only return reviews of books of this genre.
+    Returns:
+    - List[Dict]: Reviews with the ID, title, author and genre of the rated book.
+    """
+    conditions = ["r.account_user_id = %s"]
+    params = [user_id]
+    if before is not None:
+        conditions.append("r.id < %s")
+        params.append(before)
+    if genre:
+        conditions.append("b.genre = %s")
+        params.append(genre)
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT r.id, r.book_id, b.title, b.author, b.genre, r.rating
+            FROM reviews r
+            JOIN books b ON b.id = r.book_id
+            WHERE {" AND ".join(conditions)}
+            ORDER BY r.id DESC
+            LIMIT %s
+            """,
+            params
+        )
+        rows = cursor.fetchall()
+    return [dict(zip(("id", "book_id", "title", "author", "genre", "rating"), row)) for row in rows]
+
+
+def list_unreviewed_books(user_id: int, book_ids: List[int], genre: Optional[str] = None) -> List[Dict]:
+    """
+    Retrieve the books among `book_ids` that the user has not reviewed yet, in one query.
+    Args:
+    - user_id (int): The ID of the user.
+    - book_ids (List[int]): IDs of the books.
+    - genre (Optional[str]): Only return books of this genre.
+    Returns:
+    - List[Dict]: ID, title, author and genre of the books, highest ID first.
+    """
+    params = [list(book_ids), user_id]
+    genre_condition = ""
+    if genre:
+        genre_condition = "AND b.genre = %s"
+        params.append(genre)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT b.id, b.title, b.author, b.genre
+            FROM books b
+            WHERE b.id = ANY(%s)
+              AND NOT EXISTS (SELECT 1 FROM reviews r WHERE r.account_user_id = %s AND r.book_id = b.id)
+              {genre_condition}
+            ORDER BY b.id DESC
+            """,
+            params
+        )
+        rows = cursor.fetchall()
+    return [dict(zip(("book_id", "title", "author", "genre"), row)) for row in rows]
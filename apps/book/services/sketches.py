@@ -0,0 +1,255 @@
+import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.db import connection
+
+from apps.book.app_settings import app_setting
+from apps.book.models import ReviewEvent
+from apps.core.redis_client import get_redis_client
+
+BOOK_RATERS_KEY = "books:raters:book:{book_id}:{day}"
+GENRE_RATERS_KEY = "books:raters:genre:{genre}:{day}"
+BOOK_HISTOGRAM_KEY = "books:histogram:book:{book_id}"
+GENRE_HISTOGRAM_KEY = "books:histogram:genre:{genre}"
+BOOK_GENRES_KEY = "books:histogram:genres"
+RATINGS = (1, 2, 3, 4, 5)
+QUANTILES = (0.25, 0.5, 0.75, 0.9)
+
+"""
+Replaces the rating histogram of a book and applies the difference to the histogram of its genre in one atomic
+step, so the genre histogram stays the sum of the histograms of its books. Writing the same histogram twice is a
+no-op, which makes redelivered events harmless. The genre each histogram was added to is kept in `BOOK_GENRES_KEY`;
+when a book changed genre, its stored histogram is first moved from the histogram of its previous genre. Every key
+is passed in KEYS, so the caller reads the previous genre first and the script returns 0 without writing anything
+when it changed in the meantime.
+"""
+REPLACE_HISTOGRAM_SCRIPT = """
+local previous = redis.call('HGET', KEYS[3], ARGV[1]) or ''
+if previous ~= ARGV[3] then
+    return 0
+end
+if previous ~= '' and previous ~= ARGV[2] then
+    local stored = redis.call('HGETALL', KEYS[1])
+    for i = 1, #stored, 2 do
+        redis.call('HINCRBY', KEYS[4], stored[i], -tonumber(stored[i + 1]))
+        redis.call('HINCRBY', KEYS[2], stored[i], stored[i + 1])
+    end
+end
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[2])
+for i = 1, #ARGV - 3 do
+    local new = tonumber(ARGV[i + 3])
+    local old = tonumber(redis.call('HGET', KEYS[1], i) or 0)
+    if new ~= old then
+        redis.call('HINCRBY', KEYS[2], i, new - old)
+        if new == 0 then
+            redis.call('HDEL', KEYS[1], i)
+        else
+            redis.call('HSET', KEYS[1], i, new)
+        end
+    end
+end
+return 1
+"""
+
+
+def day_key(moment: datetime.datetime) -> str:
+    """
+    Format the UTC day of a moment as used in the keys of the unique raters sketches.
+    """
+    return moment.astimezone(datetime.timezone.utc).strftime("%Y%m%d")
+
+
+def fetch_histograms(book_ids: List[int]) -> Dict[int, tuple]:
+    """
+    Count the ratings of some books per rating value in one query.
+    Args:
+    - book_ids (List[int]): IDs of the books.
+    Returns:
+    - Dict[int, tuple]: (genre, {rating: count}) pairs keyed by book ID, for the books that exist.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT b.id, b.genre, r.rating, COUNT(r.id) "
+            "FROM books b LEFT JOIN reviews r ON r.book_id = b.id "
+            "WHERE b.id = ANY(%s) GROUP BY b.id, b.genre, r.rating",
+            [book_ids]
+        )
+        rows = cursor.fetchall()
+
+    histograms = {}
+    for book_id, genre, rating, count in rows:
+        histograms.setdefault(book_id, (genre, {}))
+        if rating is not None:
+            histograms[book_id][1][rating] = count
+    return histograms
+
+
+def consume_events(events: List) -> None:
+    """
+    Outbox consumer keeping the unique raters and rating distribution sketches up to date.
+
+    Every created or updated rating adds its user to the HyperLogLogs of its book and genre for the day of the
+    event. The rating histograms of the touched books are recomputed from `reviews` and written with
+    `REPLACE_HISTOGRAM_SCRIPT`, which also follows books to their new genre; the books whose stored genre changed
+    between reading it and running the script are written again. Both updates are idempotent.
+    Args:
+    - events (List[OutboxEvent]): Rating events delivered by the outbox relay.
+    """
+    histograms = fetch_histograms(sorted({event.book_id for event in events}))
+    client = get_redis_client()
+    script = client.register_script(REPLACE_HISTOGRAM_SCRIPT)
+    ttl = app_setting.sketch_retention_days * 24 * 60 * 60
+
+    pipeline = client.pipeline(transaction=False)
+    for event in events:
+        if event.event_type == ReviewEvent.EventType.DELETED or event.book_id not in histograms:
+            continue
+        day = day_key(event.created_at)
+        genre = histograms[event.book_id][0]
+        for key in (BOOK_RATERS_KEY.format(book_id=event.book_id, day=day),
+                    GENRE_RATERS_KEY.format(genre=genre, day=day)):
+            pipeline.pfadd(key, event.account_user_id)
+            pipeline.expire(key, ttl)
+    pipeline.execute()
+
+    pending = list(histograms)
+    while pending:
+        previous_genres = client.hmget(BOOK_GENRES_KEY, pending)
+        pipeline = client.pipeline(transaction=False)
+        for book_id, previous in zip(pending, previous_genres):
+            genre, counts = histograms[book_id]
+            previous = previous.decode() if previous is not None else ""
+            script(keys=[BOOK_HISTOGRAM_KEY.format(book_id=book_id), GENRE_HISTOGRAM_KEY.format(genre=genre),
+                         BOOK_GENRES_KEY, GENRE_HISTOGRAM_KEY.format(genre=previous or genre)],
+                   args=[book_id, genre, previous, *(counts.get(rating, 0) for rating in RATINGS)], client=pipeline)
+        pending = [book_id for book_id, written in zip(pending, pipeline.execute()) if not written]
+
+
+def rebuild() -> Tuple[int, int]:
+    """
+    Recompute every sketch from Postgres and swap them in atomically.
+
+    Histograms are aggregated from `reviews`, so they also cover the ratings recorded before the outbox existed and
+    follow the books that changed genre. Unique raters are aggregated from the outbox events still within the
+    retention period, under the current genre of their books.
+    Returns:
+    - Tuple[int, int]: Number of books and of genres with a histogram.
+    Raises:
+    - redis.RedisError: If the sketches could not be written.
+    """
+    books: Dict[int, Tuple[str, Dict[int, int]]] = {}
+    genres: Dict[str, Dict[int, int]] = {}
+    raters: Dict[str, Set[int]] = {}
+    retention = app_setting.sketch_retention_days
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT b.id, b.genre, r.rating, COUNT(r.id) "
+            "FROM reviews r JOIN books b ON b.id = r.book_id GROUP BY b.id, b.genre, r.rating"
+        )
+        for book_id, genre, rating, count in cursor.fetchall():
+            books.setdefault(book_id, (genre, {}))[1][rating] = count
+            genres.setdefault(genre, dict.fromkeys(RATINGS, 0))[rating] += count
+
+        cursor.execute(
+            "SELECT DISTINCT o.book_id, b.genre, o.account_user_id, (o.created_at AT TIME ZONE 'UTC')::date "
+            "FROM reviews_outbox o JOIN books b ON b.id = o.book_id "
+            "WHERE o.event_type <> %s AND o.created_at >= now() - make_interval(days => %s)",
+            [ReviewEvent.EventType.DELETED.value, retention]
+        )
+        for book_id, genre, account_user_id, day in cursor.fetchall():
+            day = day.strftime("%Y%m%d")
+            for key in (BOOK_RATERS_KEY.format(book_id=book_id, day=day),
+                        GENRE_RATERS_KEY.format(genre=genre, day=day)):
+                raters.setdefault(key, set()).add(account_user_id)
+
+    client = get_redis_client()
+    stale = [BOOK_GENRES_KEY]
+    for pattern in (BOOK_HISTOGRAM_KEY.format(book_id="*"), GENRE_HISTOGRAM_KEY.format(genre="*"),
+                    BOOK_RATERS_KEY.format(book_id="*", day="*"), GENRE_RATERS_KEY.format(genre="*", day="*")):
+        stale += client.scan_iter(match=pattern, count=1000)
+
+    pipeline = client.pipeline(transaction=True)
+    pipeline.delete(*stale)
+    for book_id, (genre, counts) in books.items():
+        pipeline.hset(BOOK_HISTOGRAM_KEY.format(book_id=book_id), mapping=counts)
+    if books:
+        pipeline.hset(BOOK_GENRES_KEY, mapping={book_id: genre for book_id, (genre, _) in books.items()})
+    for genre, counts in genres.items():
+        pipeline.hset(GENRE_HISTOGRAM_KEY.format(genre=genre), mapping=counts)
+    for key, users in raters.items():
+        pipeline.pfadd(key, *users)
+        pipeline.expire(key, retention * 24 * 60 * 60)
+    pipeline.execute()
+    return len(books), len(genres)
+
+
+def quantile(histogram: Dict[int, int], q: float) -> Optional[int]:
+    """
+    Compute a quantile of the ratings from their histogram.
+    Args:
+    - histogram (Dict[int, int]): Number of ratings keyed by rating value.
+    - q (float): Quantile, between 0 and 1.
+    Returns:
+    - Optional[int]: Smallest rating with at least a `q` share of the ratings at or below it, None if empty.
+    """
+    total = sum(histogram.values())
+    seen = 0
+    for rating in RATINGS:
+        seen += histogram.get(rating, 0)
+        if total and seen >= q * total:
+            return rating
+    return None
+
+
+def merged_stats(book_ids: Iterable[int], genres: Iterable[str], days: int) -> Dict:
+    """
+    Merge the sketches of some books and genres into one set of statistics.
+
+    HyperLogLogs are merged by Redis within `PFCOUNT`, which counts the union of every given day of every given
+    book and genre, so a user rating several of them is counted once. Histograms are summed in memory, leaving out
+    the books whose genre is also requested, since their ratings are already part of the genre histogram.
+    Args:
+    - book_ids (Iterable[int]): IDs of the books.
+    - genres (Iterable[str]): Genres.
+    - days (int): Number of days, up to today, the unique raters are counted over.
+    Returns:
+    - Dict: Number of unique raters, and number, mean, histogram and quantiles of the ratings.
+    Raises:
+    - redis.RedisError: If the sketches could not be read.
+    """
+    book_ids, genres = list(book_ids), list(genres)
+    today = datetime.datetime.now(datetime.timezone.utc)
+    window = [day_key(today - datetime.timedelta(days=offset)) for offset in range(days)]
+    raters_keys = [BOOK_RATERS_KEY.format(book_id=book_id, day=day) for book_id in book_ids for day in window]
+    raters_keys += [GENRE_RATERS_KEY.format(genre=genre, day=day) for genre in genres for day in window]
+    if book_ids and genres:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT id FROM books WHERE id = ANY(%s) AND genre = ANY(%s)", [book_ids, genres])
+            covered = {row[0] for row in cursor.fetchall()}
+    else:
+        covered = set()
+    histogram_keys = [BOOK_HISTOGRAM_KEY.format(book_id=book_id) for book_id in book_ids if book_id not in covered]
+    histogram_keys += [GENRE_HISTOGRAM_KEY.format(genre=genre) for genre in genres]
+
+    client = get_redis_client()
+    pipeline = client.pipeline(transaction=False)
+    pipeline.pfcount(*raters_keys)
+    for key in histogram_keys:
+        pipeline.hgetall(key)
+    unique_raters, *stored = pipeline.execute()
+
+    histogram = dict.fromkeys(RATINGS, 0)
+    for counts in stored:
+        for rating, count in counts.items():
+            histogram[int(rating)] += int(count)
+    count = sum(histogram.values())
+
+    return {
+        "unique_raters": unique_raters,
+        "ratings": {
+            "count": count,
+            "mean": sum(rating * number for rating, number in histogram.items()) / count if count else None,
+            "histogram": histogram,
+            "quantiles": {f"p{round(q * 100)}": quantile(histogram, q) for q in QUANTILES},
+        },
+    }
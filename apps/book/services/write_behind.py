@@ -0,0 +1,331 @@
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import redis
+from django.db import transaction
+
+from apps.book.app_settings import app_setting
+from apps.book.services import score as score_service
+from apps.core.redis_client import get_blocking_redis_client, get_redis_client
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "reviews:pending:{user_id}"
+FLUSHER_GROUP = "reviews-flusher"
+DELETED = "0"
+
+"""
+Appends a mutation to the stream and records it in the user's pending hash in one atomic step.
+The pending value is `<rating>:<stream entry id>`, so the flusher only clears it if no newer mutation replaced it.
+"""
+ENQUEUE_SCRIPT = """
+local entry_id = redis.call('XADD', KEYS[1], '*', 'user_id', ARGV[1], 'book_id', ARGV[2], 'rating', ARGV[3])
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[3] .. ':' .. entry_id)
+return entry_id
+"""
+
+"""
+Removes flushed mutations from the pending hashes, unless a newer mutation for the same book was buffered since.
+"""
+CLEAR_SCRIPT = """
+for i = 1, #KEYS do
+    if redis.call('HGET', KEYS[i], ARGV[2 * i - 1]) == ARGV[2 * i] then
+        redis.call('HDEL', KEYS[i], ARGV[2 * i - 1])
+    end
+end
+return #KEYS
+"""
+
+"""
+Drops the pending mutations of a user for some books, which are about to be written directly to the database, and
+returns the ID of the newest entry left in the stream. Every buffered mutation of these books is at or before that
+entry, so fencing them at that entry keeps a late flush from overwriting the direct write.
+"""
+FENCE_SCRIPT = """
+for i = 1, #ARGV do
+    redis.call('HDEL', KEYS[2], ARGV[i])
+end
+local last = redis.call('XREVRANGE', KEYS[1], '+', '-', 'COUNT', 1)[1]
+if last then
+    return last[1]
+end
+return false
+"""
+
+
+def is_enabled() -> bool:
+    """
+    Determine if rating mutations are buffered in Redis.
+    Returns:
+    - bool: True if write-behind mode is enabled, False otherwise.
+    """
+    return app_setting.score_write_behind
+
+
+def parse_entry_id(entry_id: Union[bytes, str]) -> Tuple[int, int]:
+    """
+    Split a stream entry ID into its time and sequence parts, which order the entries.
+    Args:
+    - entry_id (Union[bytes, str]): The stream entry ID, as `<milliseconds>-<sequence>`.
+    Returns:
+    - Tuple[int, int]: Entry time and sequence.
+    """
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode()
+    ms, seq = entry_id.split("-", 1)
+    return int(ms), int(seq)
+
+
+@contextmanager
+def direct_write(user_id: int, book_ids: List[int]) -> Iterator[None]:
+    """
+    Fence the buffered mutations of a user for some books before writing their ratings directly to the database.
+
+    In write-behind mode, the pending mutations of the books are dropped and their fences moved to the newest entry
+    of the stream, so that neither the overlay nor a later flush brings an older buffered rating back over the
+    direct write. The block runs in the transaction that moved the fences.
+    Args:
+    - user_id (int): The ID of the user.
+    - book_ids (List[int]): IDs of the books written directly.
+    Raises:
+    - redis.RedisError: If the buffer could not be reached, in which case nothing is written.
+    """
+    if not is_enabled():
+        yield
+        return
+    client = get_redis_client()
+    last_id = client.register_script(FENCE_SCRIPT)(
+        keys=[app_setting.score_write_behind_stream, PENDING_KEY.format(user_id=user_id)], args=book_ids
+    )
+    with transaction.atomic():
+        if last_id:
+            entry_ms, entry_seq = parse_entry_id(last_id)
+            score_service.claim_review_fences([(user_id, book_id, entry_ms, entry_seq) for book_id in book_ids])
+        yield
+
+
+def enqueue_reviews(user_id: int, ratings: Dict[int, Optional[int]]) -> None:
+    """
+    Buffer rating mutations of a user in one round-trip.
+    Args:
+    - user_id (int): The ID of the user rating the books.
+    - ratings (Dict[int, Optional[int]]): New ratings keyed by book ID, None to delete the rating.
+    Raises:
+    - redis.RedisError: If the mutations could not be buffered.
+    """
+    client = get_redis_client()
+    script = client.register_script(ENQUEUE_SCRIPT)
+    stream = app_setting.score_write_behind_stream
+    pending_key = PENDING_KEY.format(user_id=user_id)
+
+    pipe = client.pipeline(transaction=False)
+    for book_id, rating in ratings.items():
+        script(keys=[stream, pending_key], args=[user_id, book_id, DELETED if rating is None else rating], client=pipe)
+    pipe.execute()
+
+
+def pending_ratings(user_id: int) -> Dict[int, Optional[int]]:
+    """
+    Retrieve the buffered mutations of a user that were not flushed yet.
+    Args:
+    - user_id (int): The ID of the user.
+    Returns:
+    - Dict[int, Optional[int]]: Pending ratings keyed by book ID, None for a pending deletion.
+    """
+    pending = get_redis_client().hgetall(PENDING_KEY.format(user_id=user_id))
+    ratings = {}
+    for book_id, value in pending.items():
+        rating = value.decode().split(":", 1)[0]
+        ratings[int(book_id)] = None if rating == DELETED else int(rating)
+    return ratings
+
+
+def overlay_ratings(user_id: int, ratings: Dict[int, int]) -> Dict[int, int]:
+    """
+    Overlay the user's pending mutations on ratings read from the database, so users always see their own changes.
+    Args:
+    - user_id (int): The ID of the user.
+    - ratings (Dict[int, int]): Ratings of the user keyed by book ID, as stored in the database.
+    Returns:
+    - Dict[int, int]: Ratings keyed by book ID including the pending mutations.
+    """
+    if not is_enabled():
+        return ratings
+    overlaid = dict(ratings)
+    for book_id, rating in pending_ratings(user_id).items():
+        if rating is None:
+            overlaid.pop(book_id, None)
+        else:
+            overlaid[book_id] = rating
+    return overlaid
+
+
+def overlay_reviews(user_id: int, reviews: List[Dict], genre: Optional[str] = None,
+                    first_page: bool = False) -> List[Dict]:
+    """
+    Overlay the user's pending mutations on a page of `score.list_user_reviews`, so users always see their own
+    changes in their list of ratings.
+
+    Pending ratings of listed books replace the stored ones and pending deletions drop them. Books rated but not
+    flushed yet have no review ID; they are listed first on the first page, as the newest ratings.
+    Args:
+    - user_id (int): The ID of the user.
+    - reviews (List[Dict]): One page of reviews, as stored in the database.
+    - genre (Optional[str]): Genre the page is filtered by.
+    - first_page (bool): Whether the page is the first one.
+    Returns:
+    - List[Dict]: The page including the pending mutations.
+    """
+    if not is_enabled():
+        return reviews
+    pending = pending_ratings(user_id)
+    if not pending:
+        return reviews
+
+    overlaid = []
+    if first_page:
+        added = [book_id for book_id, rating in pending.items() if rating is not None]
+        for book in score_service.list_unreviewed_books(user_id=user_id, book_ids=added, genre=genre):
+            overlaid.append(dict(book, id=None, rating=pending[book["book_id"]]))
+    for review in reviews:
+        if review["book_id"] not in pending:
+            overlaid.append(review)
+        elif pending[review["book_id"]] is not None:
+            overlaid.append(dict(review, rating=pending[review["book_id"]]))
+    return overlaid
+
+
+def ensure_flusher_group() -> None:
+    """
+    Create the consumer group of the flusher, and the stream itself, if they do not exist yet.
+    """
+    client = get_redis_client()
+    try:
+        client.xgroup_create(app_setting.score_write_behind_stream, FLUSHER_GROUP, id="0", mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def flush_batch(consumer: str, batch_size: int, block: Optional[int] = None) -> int:
+    """
+    Drain one batch of new buffered mutations into the database.
+    Args:
+    - consumer (str): Name of this flusher in the consumer group.
+    - batch_size (int): Maximum number of stream entries to drain.
+    - block (Optional[int]): Milliseconds to wait for new entries, None to return immediately. Waits go through
+      `get_blocking_redis_client`, whose socket timeout outlasts them.
+    Returns:
+    - int: Number of stream entries drained.
+    """
+    client = get_redis_client() if block is None else get_blocking_redis_client(block)
+    response = client.xreadgroup(FLUSHER_GROUP, consumer, {app_setting.score_write_behind_stream: ">"},
+                                 count=batch_size, block=block)
+    return apply_entries(response[0][1] if response else [])
+
+
+def recover_batch(consumer: str, batch_size: int, min_idle: int, start_id: str = "0-0") -> Tuple[int, str]:
+    """
+    Take over and drain one batch of mutations delivered to a flusher but never acknowledged.
+
+    Entries pending for longer than `min_idle` are claimed with `XAUTOCLAIM` whichever flusher they were delivered
+    to, so the mutations of a flusher that crashed are replayed by the next one even though it runs under another
+    consumer name. `min_idle` must exceed the time a live flusher needs to apply a batch.
+    Args:
+    - consumer (str): Name of this flusher in the consumer group.
+    - batch_size (int): Maximum number of stream entries to claim.
+    - min_idle (int): Milliseconds an entry must have been pending before it is claimed.
+    - start_id (str): Pending entry ID to resume the scan from, "0-0" to start over.
+    Returns:
+    - Tuple[int, str]: Number of stream entries drained, and the ID to resume the scan from, "0-0" once every pending
+      entry was scanned.
+    """
+    client = get_redis_client()
+    response = client.xautoclaim(app_setting.score_write_behind_stream, FLUSHER_GROUP, consumer, min_idle,
+                                 start_id=start_id, count=batch_size)
+    next_id = response[0].decode() if isinstance(response[0], bytes) else response[0]
+    return apply_entries(response[1]), next_id
+
+
+def prune_fences() -> int:
+    """
+    Delete the fences older than every entry left in the stream, which no buffered mutation can be older than.
+    Returns:
+    - int: Number of fences deleted.
+    """
+    client = get_redis_client()
+    stream = app_setting.score_write_behind_stream
+    oldest = client.xrange(stream, count=1)
+    if oldest:
+        entry_ms, entry_seq = parse_entry_id(oldest[0][0])
+        return score_service.delete_review_fences(up_to=(entry_ms, entry_seq - 1))
+    return score_service.delete_review_fences(up_to=parse_entry_id(client.xinfo_stream(stream)["last-generated-id"]))
+
+
+def remove_idle_flushers(min_idle: int) -> None:
+    """
+    Remove the consumers of the flusher group that have nothing pending and stayed idle for longer than `min_idle`,
+    so restarted flushers do not pile up in the group.
+    Args:
+    - min_idle (int): Milliseconds a consumer must have been idle before it is removed.
+    """
+    client = get_redis_client()
+    stream = app_setting.score_write_behind_stream
+    for consumer in client.xinfo_consumers(stream, FLUSHER_GROUP):
+        if not consumer["pending"] and consumer["idle"] > min_idle:
+            client.xgroup_delconsumer(stream, FLUSHER_GROUP, consumer["name"])
+
+
+def apply_entries(entries: List) -> int:
+    """
+    Apply stream entries to the database.
+
+    Only the last mutation of every (user, book) pair is applied, with one bulk upsert and one bulk delete in a
+    single transaction, and only if it is newer than the fence of the pair: an entry replayed after a newer one was
+    flushed, or after the rating was written directly, is skipped. The entries are then acknowledged and removed
+    from the stream and from the pending hashes.
+    Args:
+    - entries (List): Stream entries as (entry ID, fields) pairs.
+    Returns:
+    - int: Number of stream entries applied.
+    """
+    if not entries:
+        return 0
+
+    latest = {}
+    for entry_id, fields in entries:
+        if not fields:
+            continue
+        key = (int(fields[b"user_id"]), int(fields[b"book_id"]))
+        latest[key] = (fields[b"rating"].decode(), entry_id.decode())
+
+    with transaction.atomic():
+        claimed = score_service.claim_review_fences([
+            (user_id, book_id, *parse_entry_id(entry_id)) for (user_id, book_id), (_, entry_id) in latest.items()
+        ])
+        upserts = [(user_id, book_id, int(rating)) for (user_id, book_id), (rating, _) in latest.items()
+                   if rating != DELETED and (user_id, book_id) in claimed]
+        deletes = [(user_id, book_id) for (user_id, book_id), (rating, _) in latest.items()
+                   if rating == DELETED and (user_id, book_id) in claimed]
+        score_service.apply_review_mutations(upserts=upserts, deletes=deletes)
+
+    client = get_redis_client()
+    stream = app_setting.score_write_behind_stream
+    entry_ids = [entry_id for entry_id, _ in entries]
+    keys: List[str] = []
+    args: List[str] = []
+    for (user_id, book_id), (rating, entry_id) in latest.items():
+        keys.append(PENDING_KEY.format(user_id=user_id))
+        args.extend([str(book_id), f"{rating}:{entry_id}"])
+
+    pipe = client.pipeline(transaction=False)
+    pipe.xack(stream, FLUSHER_GROUP, *entry_ids)
+    pipe.xdel(stream, *entry_ids)
+    if keys:
+        client.register_script(CLEAR_SCRIPT)(keys=keys, args=args, client=pipe)
+    pipe.execute()
+
+    logger.info(f"Flushed {len(entries)} buffered rating mutations ({len(upserts)} upserts, {len(deletes)} deletes, "
+                f"{len(latest) - len(claimed)} superseded)")
+    return len(entries)
@@ -1,29 +1,31 @@
-from django.test import TestCase
+import json
+from io import StringIO
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
 from django.db import connection
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.urls import reverse
+from django.utils import timezone
+from apps.book.models import Book, ReviewEvent, ReviewEventOffset
+from apps.book.services import genres, leaderboard, lookup, score as score_service, sketches
+from apps.book.services.autocomplete import prefix_index
+from apps.core.redis_client import get_redis_client
 
+User = get_user_model()
 
-class BookAPITestCase(TestCase):
-    @classmethod
-    def setUpClass(cls):
-        super().setUpClass()
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS books (
-                    id SERIAL PRIMARY KEY,
-                    title VARCHAR(200) NOT NULL,
-                    author VARCHAR(200) NOT NULL,
-                    genre VARCHAR(50) NOT NULL
-                )
-            """)
 
+class BookAPITestCase(TestCase):
     def setUp(self):
         """Sets up the test environment by initializing the API client and creating sample data."""
         self.client = APIClient()
         self.book_list_url = reverse('list-book')
         self.book_genre_url = reverse('genre-book')
+        self.book_autocomplete_url = reverse('autocomplete-book')
+        self.book_export_url = reverse('export-book')
+        prefix_index.invalidate()
 
         with connection.cursor() as cursor:
             cursor.execute("INSERT INTO books (title, author, genre) VALUES (%s, %s, %s)",
@@ -32,6 +34,7 @@ class BookAPITestCase(TestCase):
                            ('Test Book 2', 'Author 2', 'Non-Fiction'))
             cursor.execute("INSERT INTO books (title, author, genre) VALUES (%s, %s, %s)",
                            ('Test Book 3', 'Author 3', 'Fiction'))
+        prefix_index.build()
 
     def test_book_list_authenticated(self):
         """Tests the book list endpoint when the user is authenticated."""
@@ -64,3 +67,328 @@ class BookAPITestCase(TestCase):
         response = self.client.get(self.book_genre_url)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data, {'error': 'Genre query parameter is required'})
+
+    def test_book_autocomplete_short_prefix(self):
+        """Tests the autocomplete endpoint with a prefix answered from the in-process prefix index."""
+        response = self.client.get(self.book_autocomplete_url, {'q': 'tes'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 3)
+
+    def test_book_autocomplete_index_not_built(self):
+        """Tests a short prefix is answered from the database while the index is built in the background."""
+        prefix_index.invalidate()
+        with mock.patch.object(prefix_index, '_schedule_build') as schedule_build:
+            response = self.client.get(self.book_autocomplete_url, {'q': 'tes'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 3)
+        schedule_build.assert_called_once()
+
+    def test_book_autocomplete_long_prefix(self):
+        """Tests the autocomplete endpoint with a prefix answered from the database."""
+        response = self.client.get(self.book_autocomplete_url, {'q': 'Test Book 2'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['title'], 'Test Book 2')
+
+    def test_book_autocomplete_author_prefix(self):
+        """Tests the autocomplete endpoint matching on the author."""
+        response = self.client.get(self.book_autocomplete_url, {'q': 'Author 3'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+
+    def test_book_autocomplete_limit(self):
+        """Tests the autocomplete endpoint honours the limit query parameter."""
+        response = self.client.get(self.book_autocomplete_url, {'q': 'te', 'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+
+    def test_book_autocomplete_missing_param(self):
+        """Tests the autocomplete endpoint when the q query parameter is missing."""
+        response = self.client.get(self.book_autocomplete_url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'error': 'q query parameter is required'})
+
+    def test_book_export_ndjson(self):
+        """Tests streaming the catalog as NDJSON."""
+        user = User.objects.create_user(
+            username='Netbann', password='qwertyQ@1', phone_number='09107654321', email='Netbann@example.com'
+        )
+        self.client.force_authenticate(user=user)
+        response = self.client.get(self.book_export_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['title'] for line in lines], ['Test Book 1', 'Test Book 2', 'Test Book 3'])
+
+    def test_book_export_csv(self):
+        """Tests streaming the catalog as CSV."""
+        user = User.objects.create_user(
+            username='Netbann', password='qwertyQ@1', phone_number='09107654321', email='Netbann@example.com'
+        )
+        self.client.force_authenticate(user=user)
+        response = self.client.get(self.book_export_url, {'output': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,title,author,genre')
+        self.assertEqual(len(lines), 4)
+
+    def test_book_export_unauthenticated(self):
+        """Tests the export endpoint when the user is not authenticated."""
+        response = self.client.get(self.book_export_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class BookLeaderboardTestCase(TransactionTestCase):
+    def setUp(self):
+        """Sets up the test environment by rating two books and rebuilding the leaderboards."""
+        self.client = APIClient()
+        self.url = reverse('leaderboard-book')
+        self.users = [
+            User.objects.create_user(username=f'Netbann{i}', password='qwertyQ@1', phone_number=f'0910765432{i}',
+                                     email=f'Netbann{i}@example.com')
+            for i in range(2)
+        ]
+        self.adventure_id = Book.objects.create(title='Book A1', author='Author 1', genre='Adventure').id
+        self.mystery_id = Book.objects.create(title='Book A2', author='Author 2', genre='Mystery').id
+        for user in self.users:
+            score_service.upsert_review(user.id, self.adventure_id, 5)
+        score_service.upsert_review(self.users[0].id, self.mystery_id, 2)
+
+        self.addCleanup(self.clear_leaderboards)
+        call_command('rebuild_leaderboards', stdout=StringIO())
+
+    @staticmethod
+    def clear_leaderboards():
+        """Removes the leaderboards written by the test from Redis."""
+        client = get_redis_client()
+        keys = client.smembers(leaderboard.TOP_KEYS) | client.smembers(leaderboard.TRENDING_KEYS)
+        client.delete(leaderboard.TOP_KEYS, leaderboard.TRENDING_KEYS, leaderboard.LANDMARK_KEY,
+                      leaderboard.POSITION_KEY, *keys)
+
+    def test_top_rated(self):
+        """Tests the global top-rated leaderboard ranks the books by damped average rating."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data], [self.adventure_id, self.mystery_id])
+        self.assertAlmostEqual(response.data[0]['score'], (5 * 3.0 + 10) / 7)
+
+    def test_genre_leaderboard_follows_outbox(self):
+        """Tests new ratings reach the genre leaderboards through the outbox relay."""
+        score_service.upsert_review(self.users[1].id, self.mystery_id, 5)
+        call_command('relay_review_events', '--once', '--consumer', 'leaderboard', stdout=StringIO())
+
+        response = self.client.get(self.url, {'board': 'trending', 'genre': 'Mystery'})
+        self.assertEqual([item['id'] for item in response.data], [self.mystery_id])
+        self.assertGreater(response.data[0]['score'], 1)
+
+    def test_trending_ignores_redelivered_events(self):
+        """Tests events delivered again, after a rebuild or a failed offset commit, are only counted once."""
+        score_service.upsert_review(self.users[1].id, self.mystery_id, 5)
+        call_command('relay_review_events', '--once', '--consumer', 'leaderboard', stdout=StringIO())
+        expected = leaderboard.top_books('trending', 'Mystery', 1)[0][1]
+
+        ReviewEventOffset.objects.filter(consumer='leaderboard').update(last_xact_id=0, last_event_id=0)
+        call_command('relay_review_events', '--once', '--consumer', 'leaderboard', stdout=StringIO())
+        self.assertAlmostEqual(leaderboard.top_books('trending', 'Mystery', 1)[0][1], expected, places=3)
+
+    def test_invalid_board(self):
+        """Tests an unknown leaderboard is rejected."""
+        response = self.client.get(self.url, {'board': 'worst'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BookStatsTestCase(TransactionTestCase):
+    def setUp(self):
+        """Sets up the test environment by rating two books of one genre and relaying the ratings to the sketches."""
+        self.client = APIClient()
+        self.url = reverse('stats-book')
+        self.users = [
+            User.objects.create_user(username=f'Netbann{i}', password='qwertyQ@1', phone_number=f'0910765432{i}',
+                                     email=f'Netbann{i}@example.com')
+            for i in range(3)
+        ]
+        self.first_id = Book.objects.create(title='Book A1', author='Author 1', genre='Adventure').id
+        self.second_id = Book.objects.create(title='Book A2', author='Author 2', genre='Adventure').id
+        for user, rating in zip(self.users, (1, 4, 5)):
+            score_service.upsert_review(user.id, self.first_id, rating)
+        score_service.upsert_review(self.users[0].id, self.second_id, 5)
+
+        self.addCleanup(self.clear_sketches)
+        call_command('relay_review_events', '--once', '--consumer', 'sketches', stdout=StringIO())
+
+    def clear_sketches(self):
+        """Removes the sketches written by the test from Redis."""
+        day = sketches.day_key(timezone.now())
+        keys = [sketches.BOOK_GENRES_KEY]
+        for genre in ('Adventure', 'Mystery'):
+            keys += [sketches.GENRE_HISTOGRAM_KEY.format(genre=genre),
+                     sketches.GENRE_RATERS_KEY.format(genre=genre, day=day)]
+        for book_id in (self.first_id, self.second_id):
+            keys += [sketches.BOOK_HISTOGRAM_KEY.format(book_id=book_id),
+                     sketches.BOOK_RATERS_KEY.format(book_id=book_id, day=day)]
+        get_redis_client().delete(*keys)
+
+    def test_book_stats(self):
+        """Tests the statistics of a single book."""
+        response = self.client.get(self.url, {'book_id': self.first_id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['unique_raters'], 3)
+        self.assertEqual(response.data['ratings']['count'], 3)
+        self.assertEqual(response.data['ratings']['quantiles']['p50'], 4)
+
+    def test_merged_stats(self):
+        """Tests the statistics merged across books count a user rating both books once."""
+        response = self.client.get(self.url, {'book_id': [self.first_id, self.second_id]})
+        self.assertEqual(response.data['unique_raters'], 3)
+        self.assertEqual(response.data['ratings']['histogram'], {1: 1, 2: 0, 3: 0, 4: 1, 5: 2})
+
+        response = self.client.get(self.url, {'genre': 'Adventure', 'book_id': self.first_id})
+        self.assertEqual(response.data['ratings']['count'], 4)
+
+    def test_genre_change_moves_histogram(self):
+        """Tests the histogram of a book moves to its new genre with the next rating of the book."""
+        Book.objects.filter(id=self.second_id).update(genre='Mystery')
+        score_service.upsert_review(self.users[1].id, self.second_id, 3)
+        call_command('relay_review_events', '--once', '--consumer', 'sketches', stdout=StringIO())
+
+        response = self.client.get(self.url, {'genre': 'Adventure'})
+        self.assertEqual(response.data['ratings']['count'], 3)
+        response = self.client.get(self.url, {'genre': 'Mystery'})
+        self.assertEqual(response.data['ratings']['histogram'], {1: 0, 2: 0, 3: 1, 4: 0, 5: 1})
+
+    def test_histogram_script_rejects_stale_genre(self):
+        """Tests the histogram script writes nothing when the stored genre is not the one the caller read."""
+        client = get_redis_client()
+        script = client.register_script(sketches.REPLACE_HISTOGRAM_SCRIPT)
+        book_key = sketches.BOOK_HISTOGRAM_KEY.format(book_id=self.second_id)
+        mystery_key = sketches.GENRE_HISTOGRAM_KEY.format(genre='Mystery')
+        adventure_key = sketches.GENRE_HISTOGRAM_KEY.format(genre='Adventure')
+        before = client.hgetall(adventure_key)
+
+        written = script(keys=[book_key, mystery_key, sketches.BOOK_GENRES_KEY, mystery_key],
+                         args=[self.second_id, 'Mystery', '', 0, 0, 1, 0, 1])
+        self.assertEqual(written, 0)
+        self.assertEqual(client.hgetall(adventure_key), before)
+        self.assertFalse(client.exists(mystery_key))
+
+    def test_rebuild_sketches(self):
+        """Tests the rebuild covers the ratings stored without outbox events and the books that changed genre."""
+        Book.objects.filter(id=self.second_id).update(genre='Mystery')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO reviews (book_id, account_user_id, rating) VALUES (%s, %s, %s)",
+                [self.second_id, self.users[2].id, 2]
+            )
+        call_command('rebuild_sketches', stdout=StringIO())
+
+        response = self.client.get(self.url, {'genre': 'Adventure'})
+        self.assertEqual(response.data['ratings']['count'], 3)
+        self.assertEqual(response.data['unique_raters'], 3)
+        response = self.client.get(self.url, {'book_id': self.second_id})
+        self.assertEqual(response.data['ratings']['histogram'], {1: 0, 2: 1, 3: 0, 4: 0, 5: 1})
+        self.assertEqual(response.data['unique_raters'], 1)
+
+    def test_stats_requires_books_or_genres(self):
+        """Tests a request without books nor genres is rejected."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BookBatchTestCase(TestCase):
+    def setUp(self):
+        """Sets up the test environment by creating a user, logging in, and rating one of two books."""
+        self.client = APIClient()
+        self.url = reverse('batch-book')
+        self.user = User.objects.create_user(username='Netbann', password='qwertyQ@1', phone_number='09107654321',
+                                             email='Netbann@example.com')
+        self.client.force_authenticate(user=self.user)
+        self.rated_id = Book.objects.create(title='Book A1', author='Author 1', genre='Adventure').id
+        self.unrated_id = Book.objects.create(title='Book A2', author='Author 2', genre='Mystery').id
+        score_service.upsert_review(self.user.id, self.rated_id, 4)
+
+    def test_batch_lookup(self):
+        """Tests the books are returned in the requested order with the user's own rating."""
+        ids = f'{self.unrated_id},{self.rated_id},{self.unrated_id},999999'
+        response = self.client.get(self.url, {'ids': ids})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['books']],
+                         [self.unrated_id, self.rated_id, self.unrated_id])
+        self.assertEqual(response.data['books'][1]['my_rating'], 4)
+        self.assertEqual(response.data['books'][1]['rating_count'], 1)
+        self.assertIsNone(response.data['books'][0]['rating_average'])
+        self.assertEqual(response.data['missing'], [999999])
+
+    def test_batch_lookup_anonymous(self):
+        """Tests anonymous users get the books without an own rating."""
+        self.client.logout()
+        response = self.client.get(self.url, {'ids': str(self.rated_id)})
+        self.assertIsNone(response.data['books'][0]['my_rating'])
+
+    def test_batch_lookup_memoized(self):
+        """Tests repeated lookups while handling one request cost a single query."""
+        memo = {}
+        with self.assertNumQueries(1):
+            lookup.lookup_books(self.user.id, [self.rated_id, self.rated_id], memo=memo)
+            lookup.lookup_books(self.user.id, [self.rated_id], memo=memo)
+
+    def test_batch_lookup_too_many(self):
+        """Tests a lookup of more books than allowed is rejected."""
+        response = self.client.get(self.url, {'ids': ','.join(str(i) for i in range(1, 52))})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class GenreListTestCase(TestCase):
+    def setUp(self):
+        """Sets up the test environment by creating books of two genres and rating one of them."""
+        self.client = APIClient()
+        self.url = reverse('list-genre')
+        self.user = User.objects.create_user(username='Netbann', password='qwertyQ@1', phone_number='09107654321',
+                                             email='Netbann@example.com')
+        self.book_id = Book.objects.create(title='Book A1', author='Author 1', genre='Adventure').id
+        Book.objects.create(title='Book A2', author='Author 2', genre='Adventure')
+        Book.objects.create(title='Book A3', author='Author 3', genre='Mystery')
+        self.clear_counters()
+        self.addCleanup(self.clear_counters)
+
+    @staticmethod
+    def clear_counters():
+        """Removes the genre counters written by the test from Redis."""
+        get_redis_client().delete(*genres.REPLACE_BOOK_KEYS, genres.GENRE_BOOKS_KEY, genres.SEEDED_KEY)
+
+    def test_genre_list(self):
+        """Tests every genre is listed with its number of books and ratings."""
+        score_service.upsert_review(self.user.id, self.book_id, 4)
+        genres.invalidate()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [
+            {'genre': 'Adventure', 'book_count': 2, 'rating_count': 1, 'rating_average': 4.0},
+            {'genre': 'Mystery', 'book_count': 1, 'rating_count': 0, 'rating_average': None},
+        ])
+
+    def test_genre_list_follows_events(self):
+        """Tests the statistics are read from Redis without queries and updated by the rating events."""
+        self.client.get(self.url)
+        score_service.upsert_review(self.user.id, self.book_id, 4)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data[0]['rating_count'], 0)
+
+        genres.consume_events(list(ReviewEvent.objects.all()))
+        genres.consume_events(list(ReviewEvent.objects.all()))
+        response = self.client.get(self.url)
+        self.assertEqual(response.data[0]['rating_count'], 1)
+        self.assertEqual(response.data[0]['rating_average'], 4.0)
+
+    def test_genre_change_moves_counters(self):
+        """Tests the ratings of a book that changed genre are moved to the counters of its new genre."""
+        score_service.upsert_review(self.user.id, self.book_id, 4)
+        self.client.get(self.url)
+        Book.objects.filter(id=self.book_id).update(genre='Mystery')
+        genres.invalidate()
+        genres.consume_events(list(ReviewEvent.objects.all()))
+        response = self.client.get(self.url)
+        self.assertEqual(response.data, [
+            {'genre': 'Adventure', 'book_count': 1, 'rating_count': 0, 'rating_average': None},
+            {'genre': 'Mystery', 'book_count': 2, 'rating_count': 1, 'rating_average': 4.0},
+        ])
@@ -0,0 +1,115 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+import pyarrow.dataset as ds
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from apps.book.management.commands.export_ratings import EXPORT_MARKER, PartitionWriter
+from apps.book.models import Book, Review
+
+
+class ImportBooksCommandTestCase(TestCase):
+
+    def write_file(self, suffix, content):
+        """Writes the content into a temporary file removed at the end of the test."""
+        file = tempfile.NamedTemporaryFile('w', suffix=suffix, encoding='utf-8', delete=False)
+        file.write(content)
+        file.close()
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def test_import_csv(self):
+        """Tests importing books from a CSV file in several batches."""
+        path = self.write_file('.csv', 'title,author,genre\nBook A1,Author 1,Adventure\nBook A2,Author 1,Mystery\n'
+                                       'Book A3,Author 1,Science\n')
+        out = StringIO()
+        call_command('import_books', path, '--batch-size', '2', stdout=out)
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertIn('Imported 3 of 3 rows', out.getvalue())
+
+    def test_import_jsonl_skips_existing_and_invalid(self):
+        """Tests importing books from a JSONL file skips existing books and invalid rows."""
+        Book.objects.create(title='Book A1', author='Author 1', genre='Adventure')
+        lines = [
+            {'title': 'Book A1', 'author': 'Author 1', 'genre': 'Adventure'},
+            {'title': 'Book A2', 'author': 'Author 1', 'genre': 'Mystery'},
+            {'title': 'Book A3', 'author': 'Author 1'},
+        ]
+        path = self.write_file('.jsonl', '\n'.join(json.dumps(line) for line in lines))
+        out = StringIO()
+        call_command('import_books', path, stdout=out)
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertIn('Imported 1 of 3 rows (1 already present, 1 invalid)', out.getvalue())
+
+
+class ExportRatingsCommandTestCase(TestCase):
+
+    def setUp(self):
+        """Rates two books of different genres."""
+        user = get_user_model().objects.create_user(
+            username='Netbann',
+            password='qwertyQ@1',
+            phone_number='09107654321',
+            email='Netbann@example.com'
+        )
+        for rating, genre in ((4, 'Adventure'), (2, 'Science Fiction')):
+            book = Book.objects.create(title='Book A1', author='Author 1', genre=genre)
+            Review.objects.create(book=book, account_user=user, rating=rating)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output_dir = os.path.join(directory.name, 'ratings')
+
+    def test_export_partitioned_by_genre(self):
+        """Tests the ratings are written to one Parquet file per genre."""
+        call_command('export_ratings', self.output_dir, '--itersize', '1', stdout=StringIO())
+        table = ds.dataset(self.output_dir, format='parquet', partitioning='hive').to_table()
+        ratings = dict(zip(table.column('genre').to_pylist(), table.column('rating').to_pylist()))
+        self.assertEqual(ratings, {'Adventure': 4, 'Science Fiction': 2})
+
+    def test_export_single_file(self):
+        """Tests the ratings are written to a single Parquet file with a genre column."""
+        call_command('export_ratings', self.output_dir, '--partition-by', 'none', stdout=StringIO())
+        table = ds.dataset(os.path.join(self.output_dir, 'ratings.parquet'), format='parquet').to_table()
+        self.assertEqual(sorted(table.column('rating').to_pylist()), [2, 4])
+
+    def test_export_replaces_previous_export(self):
+        """Tests partitions of genres that are no longer rated are removed by the next export."""
+        call_command('export_ratings', self.output_dir, stdout=StringIO())
+        stale_dir = os.path.join(self.output_dir, 'genre=Mystery')
+        os.makedirs(stale_dir)
+        open(os.path.join(stale_dir, 'part-0.parquet'), 'wb').close()
+        call_command('export_ratings', self.output_dir, stdout=StringIO())
+        self.assertEqual(sorted(os.listdir(self.output_dir)),
+                         [EXPORT_MARKER, 'genre=Adventure', 'genre=Science%20Fiction'])
+        self.assertEqual(os.listdir(os.path.dirname(self.output_dir)), ['ratings'])
+
+    def test_export_refuses_unrelated_directory(self):
+        """Tests a non-empty directory not written by a previous export is left untouched."""
+        os.makedirs(self.output_dir)
+        open(os.path.join(self.output_dir, 'notes.txt'), 'wb').close()
+        with self.assertRaises(CommandError):
+            call_command('export_ratings', self.output_dir, stdout=StringIO())
+        self.assertEqual(os.listdir(self.output_dir), ['notes.txt'])
+        self.assertEqual(os.listdir(os.path.dirname(self.output_dir)), ['ratings'])
+
+    def test_export_flushes_every_partition(self):
+        """Tests the partitions are flushed together once they buffer a row group worth of rows."""
+        with mock.patch.object(PartitionWriter, 'flush', autospec=True, side_effect=PartitionWriter.flush) as flush:
+            call_command('export_ratings', self.output_dir, '--row-group-size', '2', stdout=StringIO())
+        self.assertEqual(flush.call_count, 4)
+
+    def test_export_failure_keeps_previous_export(self):
+        """Tests a failed export leaves the previous export untouched and no partial files behind."""
+        call_command('export_ratings', self.output_dir, stdout=StringIO())
+        with mock.patch.object(PartitionWriter, 'append', side_effect=RuntimeError('disk full')):
+            with self.assertRaises(RuntimeError):
+                call_command('export_ratings', self.output_dir, stdout=StringIO())
+        self.assertEqual(sorted(os.listdir(self.output_dir)),
+                         [EXPORT_MARKER, 'genre=Adventure', 'genre=Science%20Fiction'])
+        self.assertEqual(os.listdir(os.path.dirname(self.output_dir)), ['ratings'])
@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+from apps.book.models import Book, Review
+
+User = get_user_model()
+
+
+class BookModelTests(TestCase):
+
+    def setUp(self):
+        """
+        Create a Book instance to be used in tests.
+        """
+        self.book = Book.objects.create(title='Book A1', author='Author 1', genre='Adventure')
+
+    def test_book_table(self):
+        """
+        Test the model is mapped onto the books table used by the raw queries.
+        """
+        self.assertEqual(Book._meta.db_table, 'books')
+
+    def test_unique_title_author_genre(self):
+        """
+        Test the unique constraint on title, author and genre.
+        """
+        with transaction.atomic():
+            with self.assertRaises(IntegrityError):
+                Book.objects.create(title='Book A1', author='Author 1', genre='Adventure')
+
+
+class ReviewModelTests(TestCase):
+
+    def setUp(self):
+        """
+        Create a User and a Book instance to be used in tests.
+        """
+        self.user = User.objects.create_user(
+            username='Netbann',
+            password='qwertyQ@1',
+            phone_number='09107654321',
+            email='Netbann@example.com'
+        )
+        self.book = Book.objects.create(title='Book A1', author='Author 1', genre='Adventure')
+
+    def test_review_table(self):
+        """
+        Test the model is mapped onto the reviews table and its account_user_id column.
+        """
+        review = Review.objects.create(book=self.book, account_user=self.user, rating=5)
+        self.assertEqual(Review._meta.db_table, 'reviews')
+        self.assertEqual(review.account_user_id, self.user.id)
+
+    def test_unique_user_book_review(self):
+        """
+        Test a user can rate a book only once.
+        """
+        Review.objects.create(book=self.book, account_user=self.user, rating=5)
+        with transaction.atomic():
+            with self.assertRaises(IntegrityError):
+                Review.objects.create(book=self.book, account_user=self.user, rating=4)
+
+    def test_rating_check_constraint(self):
+        """
+        Test ratings outside 1..5 are rejected by the database.
+        """
+        with transaction.atomic():
+            with self.assertRaises(IntegrityError):
+                Review.objects.create(book=self.book, account_user=self.user, rating=6)
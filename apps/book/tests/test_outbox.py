@@ -0,0 +1,218 @@
+import json
+import os
+import tempfile
+import threading
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITransactionTestCase
+
+from apps.book.models import Book, ReviewEvent, ReviewEventOffset
+from apps.book.services import score as score_service
+
+User = get_user_model()
+
+RECEIVED = []
+
+
+def record_events(events):
+    """Outbox consumer used by the tests, keeping every delivered event."""
+    RECEIVED.extend(events)
+
+
+def failing_consumer(events):
+    """Outbox consumer used by the tests, failing on every batch."""
+    raise RuntimeError('consumer unavailable')
+
+
+@override_settings(
+    BOOK_OUTBOX_CONSUMERS={
+        'recorder': 'apps.book.tests.test_outbox.record_events',
+        'failing': 'apps.book.tests.test_outbox.failing_consumer',
+    },
+)
+class ReviewOutboxTestCase(TransactionTestCase):
+
+    def setUp(self):
+        """Creates a user and a book, and forgets the events received by previous tests."""
+        self.user = User.objects.create_user(
+            username='Netbann',
+            password='qwertyQ@1',
+            phone_number='09107654321',
+            email='Netbann@example.com'
+        )
+        self.book = Book.objects.create(title='Book A1', author='Author 1', genre='Adventure')
+        RECEIVED.clear()
+
+    def test_mutations_write_events(self):
+        """Tests every rating mutation records its event in the outbox."""
+        score_service.add_review(self.user.id, self.book.id, 3)
+        score_service.update_review(self.user.id, self.book.id, 4)
+        score_service.upsert_review(self.user.id, self.book.id, 5)
+        score_service.delete_review(self.user.id, self.book.id)
+        score_service.delete_review(self.user.id, self.book.id)
+
+        events = list(ReviewEvent.objects.values_list('event_type', 'book_id', 'account_user_id', 'rating'))
+        self.assertEqual(events, [
+            (ReviewEvent.EventType.CREATED, self.book.id, self.user.id, 3),
+            (ReviewEvent.EventType.UPDATED, self.book.id, self.user.id, 4),
+            (ReviewEvent.EventType.UPDATED, self.book.id, self.user.id, 5),
+            (ReviewEvent.EventType.DELETED, self.book.id, self.user.id, None),
+        ])
+
+    def test_relay_tracks_offsets_per_consumer(self):
+        """Tests the relay delivers events once and keeps the offset of a failing consumer."""
+        score_service.bulk_upsert_reviews(self.user.id, {self.book.id: 4})
+        last_event_id = ReviewEvent.objects.latest('id').id
+
+        call_command('relay_review_events', '--once', stdout=StringIO())
+        self.assertEqual([event.rating for event in RECEIVED], [4])
+        self.assertEqual(ReviewEventOffset.objects.get(consumer='recorder').last_event_id, last_event_id)
+        self.assertFalse(ReviewEventOffset.objects.filter(consumer='failing', last_event_id__gt=0).exists())
+
+        call_command('relay_review_events', '--once', '--consumer', 'recorder', stdout=StringIO())
+        self.assertEqual(len(RECEIVED), 1)
+
+    @override_settings(BOOK_OUTBOX_CONSUMERS={'recorder': 'apps.book.tests.test_outbox.record_events'},
+                       BOOK_OUTBOX_RETENTION_DAYS=0)
+    def test_relay_prunes_seen_events(self):
+        """Tests the events every consumer saw are pruned and the offsets resume after them without a replay."""
+        score_service.upsert_review(self.user.id, self.book.id, 3)
+        call_command('relay_review_events', '--once', stdout=StringIO())
+        self.assertFalse(ReviewEvent.objects.exists())
+
+        score_service.upsert_review(self.user.id, self.book.id, 4)
+        call_command('relay_review_events', '--once', stdout=StringIO())
+        self.assertEqual([event.rating for event in RECEIVED], [3, 4])
+
+    @override_settings(BOOK_OUTBOX_RETENTION_DAYS=0)
+    def test_prune_keeps_events_of_lagging_consumers(self):
+        """Tests no event is pruned while a registered consumer has not seen it."""
+        score_service.upsert_review(self.user.id, self.book.id, 3)
+        call_command('relay_review_events', '--once', stdout=StringIO())
+        self.assertEqual(ReviewEvent.objects.count(), 1)
+
+    def test_relay_waits_for_open_transactions(self):
+        """Tests an event committed late under a lower ID is not overtaken by the events committed meanwhile."""
+        other_book = Book.objects.create(title='Book A2', author='Author 2', genre='Adventure')
+        written, release = threading.Event(), threading.Event()
+
+        def long_transaction():
+            try:
+                with transaction.atomic():
+                    score_service.upsert_review(self.user.id, self.book.id, 2)
+                    written.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=long_transaction)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+        written.wait(10)
+        score_service.upsert_review(self.user.id, other_book.id, 5)
+
+        call_command('relay_review_events', '--once', '--consumer', 'recorder', stdout=StringIO())
+        self.assertEqual(RECEIVED, [])
+
+        release.set()
+        thread.join()
+        call_command('relay_review_events', '--once', '--consumer', 'recorder', stdout=StringIO())
+        self.assertEqual([event.rating for event in RECEIVED], [2, 5])
+
+
+class ScoreChangesTestCase(APITransactionTestCase):
+
+    def setUp(self):
+        """Creates a staff user, logs in, and rates a book, then rates it again and removes the rating."""
+        self.user = User.objects.create_user(
+            username='Netbann',
+            password='qwertyQ@1',
+            phone_number='09107654321',
+            email='Netbann@example.com',
+        )
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('changes-score')
+        book_id = Book.objects.create(title='Book A1', author='Author 1', genre='Adventure').id
+        score_service.upsert_review(self.user.id, book_id, 3)
+        score_service.upsert_review(self.user.id, book_id, 4)
+        score_service.delete_review(self.user.id, book_id)
+
+    def test_feed_follows_cursor(self):
+        """Tests the changes are fed in order and the returned cursor resumes after the last one."""
+        response = self.client.get(self.url, {'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([change['type'] for change in response.data['changes']], ['created', 'updated'])
+        self.assertTrue(response.data['has_more'])
+
+        response = self.client.get(self.url, {'since': response.data['next_since'], 'limit': 2})
+        self.assertEqual([change['type'] for change in response.data['changes']], ['deleted'])
+        self.assertIsNone(response.data['changes'][0]['rating'])
+        self.assertFalse(response.data['has_more'])
+
+    def test_feed_rejects_pruned_cursor(self):
+        """Tests a cursor pointing to a pruned change is refused instead of replaying the feed from the start."""
+        since = ReviewEvent.objects.order_by('xact_id', 'id').first().id
+        ReviewEvent.objects.filter(id=since).delete()
+        response = self.client.get(self.url, {'since': since})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    def test_feed_requires_staff(self):
+        """Tests users who are not staff cannot read the ratings of every user."""
+        self.user.is_staff = False
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_command_saves_cursor(self):
+        """Tests the export command writes every change once across runs sharing a state file."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        output = os.path.join(directory.name, 'changes.ndjson')
+        state_file = os.path.join(directory.name, 'cursor')
+
+        call_command('export_review_changes', '--output', output, '--state-file', state_file, '--batch-size', '2',
+                     stderr=StringIO())
+        call_command('export_review_changes', '--output', output, '--state-file', state_file, stderr=StringIO())
+
+        with open(output, encoding='utf-8') as file:
+            changes = [json.loads(line) for line in file]
+        self.assertEqual([change['type'] for change in changes], ['created', 'updated', 'deleted'])
+        with open(state_file, encoding='utf-8') as file:
+            self.assertEqual(int(file.read()), changes[-1]['id'])
+
+    def test_export_command_snapshot(self):
+        """Tests the snapshot includes ratings stored without outbox events and the feed resumes after it."""
+        book_id = Book.objects.create(title='Book A2', author='Author 1', genre='Mystery').id
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO reviews (book_id, account_user_id, rating) VALUES (%s, %s, %s)",
+                [book_id, self.user.id, 2]
+            )
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        output = os.path.join(directory.name, 'changes.ndjson')
+        state_file = os.path.join(directory.name, 'cursor')
+
+        call_command('export_review_changes', '--snapshot', '--output', output, '--state-file', state_file,
+                     stderr=StringIO())
+        with open(output, encoding='utf-8') as file:
+            changes = [json.loads(line) for line in file]
+        self.assertEqual([(change['type'], change['book_id'], change['rating']) for change in changes],
+                         [('created', book_id, 2)])
+        with open(state_file, encoding='utf-8') as file:
+            self.assertEqual(int(file.read()), ReviewEvent.objects.order_by('xact_id', 'id').last().id)
+
+        score_service.upsert_review(self.user.id, book_id, 5)
+        call_command('export_review_changes', '--output', output, '--state-file', state_file, stderr=StringIO())
+        with open(output, encoding='utf-8') as file:
+            changes = [json.loads(line) for line in file]
+        self.assertEqual([(change['type'], change['rating']) for change in changes[1:]], [('updated', 5)])
@@ -1,8 +1,18 @@
+from io import StringIO
+from unittest import mock
+import redis
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.db import transaction, connection
 from rest_framework.test import APITestCase
 from rest_framework import status
+from django.test import override_settings
 from django.urls import reverse
+from apps.book.models import Book
+from apps.book.services import write_behind
+from apps.book.management.commands.flush_review_buffer import Command as FlushReviewBufferCommand
+from apps.core import redis_client
+from apps.core.redis_client import get_redis_client
 
 User = get_user_model()
 
@@ -20,7 +30,7 @@ class ScoreAddTestCase(APITestCase):
         print(f"Created user: {self.user}")
         login_success = self.client.login(username='Netbann', password='qwertyQ@1')
         print(f"Login successful: {login_success}")
-        self.book_id = 1
+        self.book_id = Book.objects.create(title='Book A1', author='Author 1', genre='Adventure').id
 
     def test_add_review_success(self):
         """Tests adding a review successfully with a valid rating."""
@@ -93,7 +103,7 @@ class ScoreUpdateTestCase(APITestCase):
                 email='Sharif@example.com'
             )
         self.client.login(username='Sharif', password='qwertyQ@1')  # noqa
-        self.book_id = 1
+        self.book_id = Book.objects.create(title='Book A1', author='Author 1', genre='Adventure').id
         url = reverse('add-score', args=[self.book_id])
         data = {'rating': 5}
         response = self.client.post(url, data, format='json')
@@ -146,7 +156,7 @@ class ScoreDeleteTestCase(APITestCase):
             email='Sharif@example.com'
         )
         self.client.login(username='Sharif', password='qwertyQ@1')  # noqa
-        self.book_id = 1
+        self.book_id = Book.objects.create(title='Book A1', author='Author 1', genre='Adventure').id
         url = reverse('add-score', args=[self.book_id])
         data = {'rating': 5}
         response = self.client.post(url, data, format='json')
@@ -189,3 +199,305 @@ class ScoreDeleteTestCase(APITestCase):
     def tearDown(self):
         """Cleans up by deleting the user created for the tests."""
         User.objects.filter(username='Sharif').delete()
+
+
+class ScoreBatchTestCase(APITestCase):
+
+    def setUp(self):
+        """Sets up the test environment by creating a user, logging in, and adding a few books."""
+        self.user = User.objects.create_user(
+            username='Sharif',
+            password='qwertyQ@1',
+            phone_number='09107654322',
+            email='Sharif@example.com'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book_ids = [
+            Book.objects.create(title=f'Book A{index}', author='Author 1', genre='Adventure').id
+            for index in range(3)
+        ]
+        self.url = reverse('batch-score')
+
+    def test_batch_create_and_update(self):
+        """Tests a batch creating new reviews and updating an existing one."""
+        self.client.post(reverse('add-score', args=[self.book_ids[0]]), {'rating': 2}, format='json')
+        data = [{'book_id': book_id, 'rating': 5} for book_id in self.book_ids]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(response.data['created']), sorted(self.book_ids[1:]))
+        self.assertEqual(sorted(response.data['updated']), sorted(self.book_ids[:1]))
+        self.assertEqual(response.data['missing'], [])
+        self.assertIn('recommendations', response.data)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT rating FROM reviews WHERE account_user_id = %s", [self.user.id])
+            self.assertEqual({row[0] for row in cursor.fetchall()}, {5})
+
+    def test_batch_missing_books(self):
+        """Tests a batch referencing books that do not exist."""
+        data = [{'book_id': self.book_ids[0], 'rating': 4}, {'book_id': 999999, 'rating': 3}]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['missing'], [999999])
+
+        response = self.client.post(self.url, [{'book_id': 999999, 'rating': 3}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_batch_invalid_rating(self):
+        """Tests a batch with an invalid rating is rejected."""
+        data = [{'book_id': self.book_ids[0], 'rating': 6}]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_not_authenticated(self):
+        """Tests submitting a batch when the user is not authenticated."""
+        self.client.logout()
+        response = self.client.post(self.url, [{'book_id': self.book_ids[0], 'rating': 4}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ScoreUpsertTestCase(APITestCase):
+
+    def setUp(self):
+        """Sets up the test environment by creating a user, logging in, and adding a book."""
+        self.user = User.objects.create_user(
+            username='Sharif',
+            password='qwertyQ@1',
+            phone_number='09107654322',
+            email='Sharif@example.com'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book_id = Book.objects.create(title='Book A1', author='Author 1', genre='Adventure').id
+        self.url = reverse('upsert-score', args=[self.book_id])
+
+    def test_upsert_creates_then_updates(self):
+        """Tests the first PUT creates the review and the second one updates it."""
+        response = self.client.put(self.url, {'rating': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['message'], 'Review added successfully')
+
+        response = self.client.put(self.url, {'rating': 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['message'], 'Review updated successfully')
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT rating FROM reviews WHERE book_id = %s AND account_user_id = %s",
+                [self.book_id, self.user.id]
+            )
+            self.assertEqual(cursor.fetchall(), [(3,)])
+
+    def test_upsert_book_not_found(self):
+        """Tests setting a rating for a book that does not exist."""
+        response = self.client.put(reverse('upsert-score', args=[999999]), {'rating': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data['error'], 'Book not found')
+
+    def test_upsert_missing_rating(self):
+        """Tests setting a rating without providing it."""
+        response = self.client.put(self.url, {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_delete(self):
+        """Tests deleting a rating, then deleting it again."""
+        self.client.put(self.url, {'rating': 5}, format='json')
+        response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data['error'], 'Review not found')
+
+    def test_upsert_not_authenticated(self):
+        """Tests setting a rating when the user is not authenticated."""
+        self.client.logout()
+        response = self.client.put(self.url, {'rating': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ScoreListTestCase(APITestCase):
+
+    def setUp(self):
+        """Sets up the test environment by creating a user, logging in, and rating three books."""
+        self.user = User.objects.create_user(
+            username='Sharif',
+            password='qwertyQ@1',
+            phone_number='09107654322',
+            email='Sharif@example.com'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('list-score')
+        self.book_ids = [
+            Book.objects.create(title=title, author='Author 1', genre=genre).id
+            for title, genre in (('Book A1', 'Adventure'), ('Book A2', 'Mystery'), ('Book A3', 'Adventure'))
+        ]
+        for rating, book_id in enumerate(self.book_ids, start=1):
+            self.client.put(reverse('upsert-score', args=[book_id]), {'rating': rating}, format='json')
+
+    def test_list_pages(self):
+        """Tests the ratings are listed newest first, page by page, following the cursor."""
+        response = self.client.get(self.url, {'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['book_id'] for item in response.data['results']], self.book_ids[:0:-1])
+        self.assertEqual(response.data['results'][0]['title'], 'Book A3')
+        self.assertIsNotNone(response.data['next_cursor'])
+
+        response = self.client.get(self.url, {'limit': 2, 'cursor': response.data['next_cursor']})
+        self.assertEqual([item['book_id'] for item in response.data['results']], self.book_ids[:1])
+        self.assertIsNone(response.data['next_cursor'])
+
+    def test_list_genre(self):
+        """Tests filtering the ratings by the genre of the rated books."""
+        response = self.client.get(self.url, {'genre': 'Adventure'})
+        self.assertEqual([item['rating'] for item in response.data['results']], [3, 1])
+
+    def test_list_invalid_cursor(self):
+        """Tests a non-integer cursor is rejected."""
+        response = self.client.get(self.url, {'cursor': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_not_authenticated(self):
+        """Tests listing ratings without authentication."""
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(BOOK_SCORE_WRITE_BEHIND=True, BOOK_SCORE_WRITE_BEHIND_STREAM='test:reviews:write-behind')
+class ScoreWriteBehindTestCase(APITestCase):
+
+    def setUp(self):
+        """Sets up the test environment by creating a user, logging in, and adding a book."""
+        self.user = User.objects.create_user(
+            username='Sharif',
+            password='qwertyQ@1',
+            phone_number='09107654322',
+            email='Sharif@example.com'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book_id = Book.objects.create(title='Book A1', author='Author 1', genre='Adventure').id
+        self.url = reverse('upsert-score', args=[self.book_id])
+        redis_client = get_redis_client()
+        self.addCleanup(redis_client.delete, 'test:reviews:write-behind',
+                        write_behind.PENDING_KEY.format(user_id=self.user.id))
+
+    def count_reviews(self):
+        """Returns the number of reviews of the user stored in the database."""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM reviews WHERE account_user_id = %s", [self.user.id])
+            return cursor.fetchone()[0]
+
+    def test_write_behind_upsert_and_flush(self):
+        """Tests a rating is acknowledged, visible to its author before the flush, and written by the flusher."""
+        response = self.client.put(self.url, {'rating': 4}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.count_reviews(), 0)
+        self.assertEqual(write_behind.overlay_ratings(self.user.id, {}), {self.book_id: 4})
+
+        call_command('flush_review_buffer', '--once', stdout=StringIO())
+        self.assertEqual(self.count_reviews(), 1)
+        self.assertEqual(write_behind.pending_ratings(self.user.id), {})
+
+    def test_write_behind_delete_overlay(self):
+        """Tests a buffered deletion hides the stored rating from its author until the flush."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO reviews (book_id, account_user_id, rating) VALUES (%s, %s, %s)",
+                [self.book_id, self.user.id, 5]
+            )
+        response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(write_behind.overlay_ratings(self.user.id, {self.book_id: 5}), {})
+
+        call_command('flush_review_buffer', '--once', stdout=StringIO())
+        self.assertEqual(self.count_reviews(), 0)
+
+    def test_write_behind_list_overlay(self):
+        """Tests the list of ratings shows buffered ratings and deletions to their author before the flush."""
+        stored_id = Book.objects.create(title='Book A2', author='Author 1', genre='Mystery').id
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO reviews (book_id, account_user_id, rating) VALUES (%s, %s, %s)",
+                [stored_id, self.user.id, 5]
+            )
+        self.client.put(self.url, {'rating': 3}, format='json')
+
+        response = self.client.get(reverse('list-score'))
+        self.assertEqual([(item['book_id'], item['rating']) for item in response.data['results']],
+                         [(self.book_id, 3), (stored_id, 5)])
+        self.assertIsNone(response.data['results'][0]['id'])
+
+        self.client.put(reverse('upsert-score', args=[stored_id]), {'rating': 1}, format='json')
+        self.client.delete(self.url)
+        response = self.client.get(reverse('list-score'))
+        self.assertEqual([(item['book_id'], item['rating']) for item in response.data['results']], [(stored_id, 1)])
+
+    def test_write_behind_idle_flush_cycle(self):
+        """Tests an idle flusher waits longer than the socket timeout of the shared client without failing."""
+        options = dict(redis_client.pool_options(), socket_timeout=0.1)
+        for client_factory in (redis_client.get_redis_client, redis_client.get_blocking_redis_client):
+            client_factory.cache_clear()
+            self.addCleanup(client_factory.cache_clear)
+
+        with mock.patch.object(redis_client, 'pool_options', return_value=options), \
+                mock.patch.object(FlushReviewBufferCommand, 'recover', side_effect=[0, KeyboardInterrupt]):
+            out = StringIO()
+            call_command('flush_review_buffer', '--block', '300', stdout=out)
+        self.assertIn('Flushed 0 buffered rating mutations', out.getvalue())
+
+    def test_write_behind_recovers_crashed_flusher(self):
+        """Tests the mutations delivered to a flusher that crashed are replayed by the next one."""
+        self.client.put(self.url, {'rating': 2}, format='json')
+        write_behind.ensure_flusher_group()
+        redis_client = get_redis_client()
+        redis_client.xreadgroup(write_behind.FLUSHER_GROUP, 'crashed', {'test:reviews:write-behind': '>'})
+
+        call_command('flush_review_buffer', '--once', '--min-idle', '0', '--consumer', 'restarted', stdout=StringIO())
+        self.assertEqual(self.count_reviews(), 1)
+        self.assertEqual(write_behind.pending_ratings(self.user.id), {})
+        consumers = redis_client.xinfo_consumers('test:reviews:write-behind', write_behind.FLUSHER_GROUP)
+        self.assertNotIn(b'crashed', [consumer['name'] for consumer in consumers])
+
+    def rating(self):
+        """Returns the rating of the book stored in the database for the user, None if there is none."""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT rating FROM reviews WHERE account_user_id = %s AND book_id = %s",
+                           [self.user.id, self.book_id])
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def test_write_behind_recovery_skips_superseded_mutation(self):
+        """Tests a mutation replayed from a crashed flusher does not overwrite a newer one flushed meanwhile."""
+        write_behind.ensure_flusher_group()
+        redis_client = get_redis_client()
+        self.client.put(self.url, {'rating': 3}, format='json')
+        redis_client.xreadgroup(write_behind.FLUSHER_GROUP, 'crashed', {'test:reviews:write-behind': '>'})
+        self.client.put(self.url, {'rating': 5}, format='json')
+        write_behind.flush_batch(consumer='live', batch_size=10)
+        self.assertEqual(self.rating(), 5)
+
+        count, _ = write_behind.recover_batch(consumer='live', batch_size=10, min_idle=0)
+        self.assertEqual(count, 1)
+        self.assertEqual(self.rating(), 5)
+
+    def test_write_behind_direct_write_fences_buffer(self):
+        """Tests a direct write drops the buffered mutations of the book, so a later flush does not bring them back."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO reviews (book_id, account_user_id, rating) VALUES (%s, %s, %s)",
+                [self.book_id, self.user.id, 2]
+            )
+        self.client.put(self.url, {'rating': 4}, format='json')
+        response = self.client.delete(reverse('delete-score', args=[self.book_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(write_behind.pending_ratings(self.user.id), {})
+
+        call_command('flush_review_buffer', '--once', stdout=StringIO())
+        self.assertIsNone(self.rating())
+
+    def test_write_behind_buffer_unavailable(self):
+        """Tests a rating is rejected rather than written directly while the buffer is unreachable."""
+        with mock.patch.object(write_behind, 'enqueue_reviews', side_effect=redis.ConnectionError('down')):
+            response = self.client.put(self.url, {'rating': 4}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(self.count_reviews(), 0)
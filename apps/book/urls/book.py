@@ -6,6 +6,12 @@ urlpatterns = [
 
     path('book-list/', book.BookList.as_view(), name='list-book'),
     path('book-genre/', book.BookDetailGenre.as_view(), name='genre-book'),
+    path('book-autocomplete/', book.BookAutocomplete.as_view(), name='autocomplete-book'),
+    path('book-export/', book.BookExport.as_view(), name='export-book'),
+    path('book-leaderboard/', book.BookLeaderboard.as_view(), name='leaderboard-book'),
+    path('book-stats/', book.BookStats.as_view(), name='stats-book'),
+    path('book-batch/', book.BookBatch.as_view(), name='batch-book'),
+    path('genres/', book.GenreList.as_view(), name='list-genre'),
 ]
 
 """
@@ -18,4 +24,28 @@ Defines URL patterns for the book-related API endpoints.
     - URL: `book-genre/`
     - Maps to the `BookDetailGenre` view class from `apps.book.views.book`.
     - The `name='genre-book'` provides a name to reference this URL pattern in Django templates and views.
+
+    - URL: `book-autocomplete/`
+    - Maps to the `BookAutocomplete` view class from `apps.book.views.book`.
+    - The `name='autocomplete-book'` provides a name to reference this URL pattern in Django templates and views.
+
+    - URL: `book-export/`
+    - Maps to the `BookExport` view class from `apps.book.views.book`.
+    - The `name='export-book'` provides a name to reference this URL pattern in Django templates and views.
+
+    - URL: `book-leaderboard/`
+    - Maps to the `BookLeaderboard` view class from `apps.book.views.book`.
+    - The `name='leaderboard-book'` provides a name to reference this URL pattern in Django templates and views.
+
+    - URL: `book-stats/`
+    - Maps to the `BookStats` view class from `apps.book.views.book`.
+    - The `name='stats-book'` provides a name to reference this URL pattern in Django templates and views.
+
+    - URL: `book-batch/`
+    - Maps to the `BookBatch` view class from `apps.book.views.book`.
+    - The `name='batch-book'` provides a name to reference this URL pattern in Django templates and views.
+
+    - URL: `genres/`
+    - Maps to the `GenreList` view class from `apps.book.views.book`.
+    - The `name='list-genre'` provides a name to reference this URL pattern in Django templates and views.
 """
@@ -5,6 +5,10 @@ urlpatterns = [
     path('score-add/<int:book_id>/', score.ScoreAdd.as_view(), name='add-score'),
     path('score-update/<int:book_id>/', score.ScoreUpdate.as_view(), name='update-score'),
     path('score-delete/<int:book_id>/', score.ScoreDelete.as_view(), name='delete-score'),
+    path('score-batch/', score.ScoreBatch.as_view(), name='batch-score'),
+    path('scores/', score.ScoreList.as_view(), name='list-score'),
+    path('scores/changes/', score.ScoreChanges.as_view(), name='changes-score'),
+    path('scores/<int:book_id>/', score.ScoreUpsert.as_view(), name='upsert-score'),
 ]
 """
 Defines URL patterns for the book score management API endpoints.
@@ -23,4 +27,28 @@ Defines URL patterns for the book score management API endpoints.
     - The `book_id` is a path parameter that specifies the ID of the book for which the score is being deleted.
     - Maps to the `ScoreDelete` view class from `apps.book.views.score`.
     - The `name='delete-score'` provides a name to reference this URL pattern in Django templates and views.
+
+    - URL: `score-batch/`
+    - Accepts a list of `{book_id, rating}` pairs in the request body.
+    - Maps to the `ScoreBatch` view class from `apps.book.views.score`.
+    - The `name='batch-score'` provides a name to reference this URL pattern in Django templates and views.
+
+    - URL: `scores/<int:book_id>/`
+    - The `book_id` is a path parameter that specifies the ID of the book whose score is being set or removed.
+    - `PUT` creates or updates the score, `DELETE` removes it.
+    - Maps to the `ScoreUpsert` view class from `apps.book.views.score`.
+    - The `name='upsert-score'` provides a name to reference this URL pattern in Django templates and views.
+
+    - URL: `scores/`
+    - Lists the scores of the authenticated user, newest first, together with the rated books.
+    - Accepts the optional `cursor`, `limit` and `genre` query parameters; `next_cursor` in the response fetches
+      the following page.
+    - Maps to the `ScoreList` view class from `apps.book.views.score`.
+    - The `name='list-score'` provides a name to reference this URL pattern in Django templates and views.
+
+    - URL: `scores/changes/`
+    - Feeds the rating inserts, updates and deletes of every user after the `since` cursor, for staff users only.
+    - Accepts the optional `since` and `limit` query parameters; `next_since` in the response continues the feed.
+    - Maps to the `ScoreChanges` view class from `apps.book.views.score`.
+    - The `name='changes-score'` provides a name to reference this URL pattern in Django templates and views.
 """
@@ -1,8 +1,12 @@
+import redis
 from rest_framework import status, response, views
 from django.db import connection
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from django.http import StreamingHttpResponse
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from apps.account.throttling import CustomRateThrottle
+from apps.book.app_settings import app_setting
 from apps.book.serializers import book
+from apps.book.services import autocomplete, export, genres, leaderboard, lookup, sketches
 
 
 class BookList(views.APIView):
@@ -96,3 +100,282 @@ class BookDetailGenre(views.APIView):
             return response.Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         return response.Response({"error": "Genre query parameter is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class BookAutocomplete(views.APIView):
+    """
+    API View for suggesting books while the user types a title or an author.
+
+    This view allows:
+    - Authenticated and unauthenticated users to retrieve books whose title or author starts with a prefix.
+    - Read-only access to all users.
+    """
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    serializer_class = book.BookSerializer
+
+    def get(self, request):  # noqa
+        """
+        Handles the GET request to retrieve suggestions for a prefix.
+
+        This method:
+        1. Retrieves the 'q' and optional 'limit' query parameters from the request.
+        2. Answers short prefixes from the in-process prefix index without touching the database.
+        3. Answers longer prefixes with a query served by the trigram indexes on title and author.
+        4. Serializes the suggestions into JSON format and returns them in the response.
+
+        Args:
+        request (Request): The HTTP request object containing the query parameters.
+
+        Returns:
+        Response: A response object containing the suggested books in JSON format or an error message if the
+        prefix is missing or the limit is invalid.
+        """
+        prefix = request.GET.get('q', '').strip()
+        if not prefix:
+            return response.Response({"error": "q query parameter is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = int(request.GET.get('limit', app_setting.autocomplete_limit))
+        except ValueError:
+            return response.Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, app_setting.autocomplete_limit))
+
+        books = autocomplete.autocomplete(prefix=prefix, limit=limit)  # noqa
+        serializer = self.serializer_class(books, many=True)
+        return response.Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class BookExport(views.APIView):
+    """
+    API View for downloading a full dump of the catalog.
+
+    This view allows:
+    - Authenticated users to stream every book as NDJSON or CSV.
+    - The dump to be produced in constant memory, whatever the size of the catalog.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [CustomRateThrottle]
+    throttle_scope = 'default'
+
+    def get(self, request):  # noqa
+        """
+        Handles the GET request to stream the catalog.
+
+        This method:
+        1. Retrieves the optional 'output' query parameter ('ndjson' by default, or 'csv').
+        2. Opens a server-side cursor over the books table.
+        3. Streams the encoded rows chunk by chunk through a StreamingHttpResponse.
+
+        Args:
+        request (Request): The HTTP request object containing the query parameter.
+
+        Returns:
+        StreamingHttpResponse: The streamed catalog, or a Response with an error message if the output format is
+        not supported.
+        """
+        export_format = request.GET.get('output', 'ndjson')
+        if export_format not in export.EXPORT_FORMATS:
+            return response.Response(
+                {"error": f"output must be one of: {', '.join(export.EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        content_type, extension, _ = export.EXPORT_FORMATS[export_format]
+        streaming_response = StreamingHttpResponse(
+            export.export_catalog(export_format=export_format, itersize=app_setting.export_itersize),
+            content_type=content_type,
+        )
+        streaming_response['Content-Disposition'] = f'attachment; filename="books.{extension}"'
+        return streaming_response
+
+
+class BookLeaderboard(views.APIView):
+    """
+    API View for listing the best books of a leaderboard, globally or within a genre.
+
+    This view allows:
+    - Authenticated and unauthenticated users to retrieve the top-rated or trending books.
+    - Read-only access to all users.
+    The leaderboards are Redis sorted sets kept up to date by the outbox relay, so no aggregate runs on `reviews`.
+    """
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    serializer_class = book.LeaderboardSerializer
+
+    def get(self, request):  # noqa
+        """
+        Handles the GET request to retrieve the best books of a leaderboard.
+
+        This method:
+        1. Retrieves the optional 'board' ('top' by default, or 'trending'), 'genre' and 'limit' query parameters.
+        2. Reads the best books and their scores from the leaderboard with a single `ZREVRANGE`.
+        3. Fetches the ranked books by primary key in one query.
+        4. Serializes the books with their scores, best first, and returns them in the response.
+
+        Args:
+        request (Request): The HTTP request object containing the query parameters.
+
+        Returns:
+        Response: A response object containing the ranked books in JSON format, or an error message if a
+        parameter is invalid or the leaderboards are unavailable.
+        """
+        board = request.GET.get('board', 'top')
+        if board not in leaderboard.BOARDS:
+            return response.Response({"error": f"board must be one of: {', '.join(leaderboard.BOARDS)}"},
+                                     status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.GET.get('limit', 10))
+        except ValueError:
+            return response.Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, app_setting.leaderboard_limit))
+
+        try:
+            ranking = leaderboard.top_books(board=board, genre=request.GET.get('genre') or None, limit=limit)
+        except redis.RedisError:
+            return response.Response({"error": "Leaderboard unavailable"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT id, title, author, genre FROM books WHERE id = ANY(%s)",
+                           [[book_id for book_id, _ in ranking]])
+            books = {row[0]: {"id": row[0], "title": row[1], "author": row[2], "genre": row[3]}  # noqa
+                     for row in cursor.fetchall()}
+
+        ranked = [dict(books[book_id], score=score) for book_id, score in ranking if book_id in books]
+        serializer = self.serializer_class(ranked, many=True)
+        return response.Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class BookStats(views.APIView):
+    """
+    API View for reading rating statistics merged across books and genres.
+
+    This view allows:
+    - Authenticated and unauthenticated users to retrieve the number of unique raters over a window of days, and the
+      distribution and quantiles of the ratings.
+    - Read-only access to all users.
+    The statistics are merged from sketches kept up to date by the outbox relay, so no aggregate runs on `reviews`.
+    """
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get(self, request):  # noqa
+        """
+        Handles the GET request to retrieve merged rating statistics.
+
+        This method:
+        1. Retrieves the repeatable 'book_id' and 'genre' query parameters, and the optional 'days' parameter.
+        2. Counts the unique raters of every book and genre over the window with a single merged `PFCOUNT`.
+        3. Sums the rating histograms of the books and genres and derives the mean and the quantiles.
+        4. Returns the merged statistics in the response.
+
+        Args:
+        request (Request): The HTTP request object containing the query parameters.
+
+        Returns:
+        Response: A response object containing the merged statistics, or an error message if a parameter is invalid
+        or the sketches are unavailable.
+        """
+        genres = [genre for genre in request.GET.getlist('genre') if genre]
+        try:
+            book_ids = sorted({int(book_id) for book_id in request.GET.getlist('book_id')})
+            days = int(request.GET.get('days', 30))
+        except ValueError:
+            return response.Response({"error": "book_id and days must be integers"},
+                                     status=status.HTTP_400_BAD_REQUEST)
+        if not book_ids and not genres:
+            return response.Response({"error": "book_id or genre query parameter is required"},
+                                     status=status.HTTP_400_BAD_REQUEST)
+        if len(book_ids) + len(genres) > app_setting.stats_max_books:
+            return response.Response(
+                {"error": f"At most {app_setting.stats_max_books} books and genres are allowed"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        days = max(1, min(days, app_setting.sketch_retention_days))
+
+        try:
+            stats = sketches.merged_stats(book_ids=book_ids, genres=genres, days=days)
+        except redis.RedisError:
+            return response.Response({"error": "Statistics unavailable"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return response.Response(dict(stats, days=days), status=status.HTTP_200_OK)
+
+
+class BookBatch(views.APIView):
+    """
+    API View for retrieving many books at once, e.g. to render a shelf.
+
+    This view allows:
+    - Authenticated and unauthenticated users to retrieve up to `BOOK_LOOKUP_MAX_SIZE` books with their rating
+      statistics in a single round-trip.
+    - Authenticated users to also retrieve their own rating of every book.
+    """
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    serializer_class = book.BookLookupSerializer
+
+    def get(self, request):  # noqa
+        """
+        Handles the GET request to retrieve many books.
+
+        This method:
+        1. Retrieves the comma separated 'ids' query parameter from the request.
+        2. Fetches the books not looked up yet while handling this request with a single `= ANY(%s)` query, joined
+           with the aggregate of their ratings and with the rating of the user.
+        3. Serializes the books in the requested order and returns them in the response, with the IDs of the books
+           that do not exist.
+
+        Args:
+        request (Request): The HTTP request object containing the query parameter.
+
+        Returns:
+        Response: A response object containing the books in JSON format, or an error message if the IDs are missing
+        or invalid.
+        """
+        try:
+            book_ids = [int(book_id) for book_id in request.GET.get('ids', '').split(',') if book_id.strip()]
+        except ValueError:
+            return response.Response({"error": "ids must be a comma separated list of integers"},
+                                     status=status.HTTP_400_BAD_REQUEST)
+        if not book_ids:
+            return response.Response({"error": "ids query parameter is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(book_ids) > app_setting.lookup_max_size:
+            return response.Response({"error": f"At most {app_setting.lookup_max_size} ids are allowed"},
+                                     status=status.HTTP_400_BAD_REQUEST)
+
+        user_id = request.user.id if request.user.is_authenticated else None
+        books = lookup.lookup_books(user_id=user_id, book_ids=book_ids, memo=lookup.request_memo(request))  # noqa
+
+        serializer = self.serializer_class([item for item in books if item is not None], many=True)
+        missing = [book_id for book_id, item in zip(book_ids, books) if item is None]
+        return response.Response({"books": serializer.data, "missing": missing}, status=status.HTTP_200_OK)
+
+
+class GenreList(views.APIView):
+    """
+    API View for listing the genres of the catalog with their statistics.
+
+    This view allows:
+    - Authenticated and unauthenticated users to build a genre picker without downloading the whole catalog.
+    - Read-only access to all users.
+    """
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    serializer_class = book.GenreSerializer
+
+    def get(self, request):  # noqa
+        """
+        Handles the GET request to retrieve every genre with its statistics.
+
+        This method:
+        1. Reads the number of books and the rating counters of every genre from Redis.
+        2. Aggregates the statistics in one query instead when Redis is unavailable.
+        3. Serializes the genres into JSON format and returns them in the response.
+
+        Args:
+        request (Request): The HTTP request object.
+
+        Returns:
+        Response: A response object containing every genre with its number of books, number of ratings and average
+        rating.
+        """
+        try:
+            stats = genres.genre_stats()
+        except redis.RedisError:
+            stats = genres.compute_genre_stats()
+        serializer = self.serializer_class(stats, many=True)
+        return response.Response(serializer.data, status=status.HTTP_200_OK)
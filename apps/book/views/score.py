@@ -1,8 +1,23 @@
-from django.db import connection, transaction
+import logging
+import redis
 from rest_framework import status, response, views
-from rest_framework.exceptions import NotFound, PermissionDenied
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import APIException, NotFound, PermissionDenied
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from apps.book.serializers import score
+from apps.book.app_settings import app_setting
+from apps.book.services import outbox, recommendation, score as score_service, write_behind
+
+logger = logging.getLogger(__name__)
+
+
+class BufferUnavailable(APIException):
+    """
+    Raised when a rating cannot be written because the write-behind buffer is unreachable. Writing it directly
+    instead could be overwritten by an older mutation still buffered for the same book once the buffer is back.
+    """
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The rating buffer is unavailable, try again later."
+    default_code = "buffer_unavailable"
 
 
 class ScoreDelete(views.APIView):
@@ -23,9 +38,8 @@ class ScoreDelete(views.APIView):
 
         This method:
         1. Verifies that the user is authenticated.
-        2. Checks if the review exists before attempting to delete it.
-        3. Deletes the review from the database.
-        4. Returns a response indicating success or failure.
+        2. Deletes the review with a single `DELETE ... RETURNING` statement.
+        3. Returns a response indicating success, or an error if there was no review to delete.
 
         Args:
         request (Request): The HTTP request object containing user details.
@@ -44,29 +58,16 @@ class ScoreDelete(views.APIView):
 
         if serializer.is_valid():
             try:
-                with connection.cursor() as cursor:
-                    cursor.execute(
-                        "SELECT COUNT(*) FROM reviews WHERE book_id = %s AND account_user_id = %s",
-                        [book_id, user_id]
-                    )
-                    exists = cursor.fetchone()[0]
-
-                    if not exists:
-                        raise NotFound("Review not found")
-
-                    cursor.execute(
-                        "DELETE FROM reviews WHERE book_id = %s AND account_user_id = %s",
-                        [book_id, user_id]
-                    )
-                transaction.commit()
-                return response.Response({"message": "Rating deleted successfully"}, status=status.HTTP_200_OK)
-            except NotFound as e:
-                raise e
-            except PermissionDenied as e:
-                raise e
+                with write_behind.direct_write(user_id=user_id, book_ids=[book_id]):
+                    deleted = score_service.delete_review(user_id=user_id, book_id=book_id)
+            except redis.RedisError:
+                raise BufferUnavailable()
             except Exception as e:
-                transaction.rollback()
                 return response.Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+            if not deleted:
+                raise NotFound("Review not found")
+            return response.Response({"message": "Rating deleted successfully"}, status=status.HTTP_200_OK)
         else:
             return response.Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -90,9 +91,8 @@ class ScoreUpdate(views.APIView):
         This method:
         1. Validates the incoming review data.
         2. Checks if the user is authenticated.
-        3. Ensures that the review to be updated exists.
-        4. Updates the existing review with the new rating.
-        5. Returns a response indicating success or failure.
+        3. Updates the existing review with a single `UPDATE ... RETURNING` statement.
+        4. Returns a response indicating success, or an error if there was no review to update.
 
         Args:
             request (Request): The HTTP request object containing the new review data and user details.
@@ -109,25 +109,16 @@ class ScoreUpdate(views.APIView):
                 return response.Response({"error": "User not authenticated"}, status=status.HTTP_401_UNAUTHORIZED)
 
             try:
-                with connection.cursor() as cursor:
-                    cursor.execute(
-                        "SELECT COUNT(*) FROM reviews WHERE book_id = %s AND account_user_id = %s",
-                        [book_id, user_id]
-                    )
-                    exists = cursor.fetchone()[0]
-
-                    if not exists:
-                        return response.Response({"error": "Review not found"}, status=status.HTTP_404_NOT_FOUND)
-
-                    cursor.execute(
-                        "UPDATE reviews SET rating = %s WHERE book_id = %s AND account_user_id = %s",
-                        [rating, book_id, user_id]
-                    )
-                transaction.commit()
-                return response.Response({"message": "Review updated successfully"}, status=status.HTTP_200_OK)
+                with write_behind.direct_write(user_id=user_id, book_ids=[book_id]):
+                    updated = score_service.update_review(user_id=user_id, book_id=book_id, rating=rating)
+            except redis.RedisError:
+                raise BufferUnavailable()
             except Exception as e:
-                transaction.rollback()
                 return response.Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+            if not updated:
+                return response.Response({"error": "Review not found"}, status=status.HTTP_404_NOT_FOUND)
+            return response.Response({"message": "Review updated successfully"}, status=status.HTTP_200_OK)
         return response.Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -150,9 +141,8 @@ class ScoreAdd(views.APIView):
         This method:
         1. Validates the review data submitted in the request.
         2. Checks if the user is authenticated.
-        3. Ensures the user has not previously reviewed the same book.
-        4. Inserts the new review into the database.
-        5. Retrieves and returns book recommendations based on the new review.
+        3. Inserts the new review with a single statement that does nothing if the user already reviewed the book.
+        4. Retrieves and returns book recommendations based on the new review.
 
         Args:
             request (Request): The HTTP request object containing review data and user details.
@@ -170,114 +160,293 @@ class ScoreAdd(views.APIView):
                 return response.Response({"error": "User not authenticated"}, status=status.HTTP_401_UNAUTHORIZED)
 
             try:
-                with connection.cursor() as cursor:
-                    cursor.execute(
-                        "SELECT COUNT(*) FROM reviews WHERE book_id = %s AND account_user_id = %s",
-                        [book_id, user_id]
-                    )
-                    exists = cursor.fetchone()[0]
-
-                    if exists:
-                        return response.Response({"error": "Review already exists"}, status=status.HTTP_400_BAD_REQUEST)
-
-                    cursor.execute(
-                        "INSERT INTO reviews (book_id, account_user_id, rating) VALUES (%s, %s, %s)",
-                        [book_id, user_id, rating]
-                    )
-                transaction.commit()
-
-                recommendations = self.get_recommendations(user_id, book_id)
-
-                return response.Response({
-                    "message": "Review added successfully",
-                    "recommendations": recommendations
-                }, status=status.HTTP_201_CREATED)
+                with write_behind.direct_write(user_id=user_id, book_ids=[book_id]):
+                    book_exists, created = score_service.add_review(user_id=user_id, book_id=book_id, rating=rating)
+            except redis.RedisError:
+                raise BufferUnavailable()
             except Exception as e:
-                transaction.rollback()
                 return response.Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+            if not book_exists:
+                return response.Response({"error": "Book not found"}, status=status.HTTP_404_NOT_FOUND)
+            if not created:
+                return response.Response({"error": "Review already exists"}, status=status.HTTP_400_BAD_REQUEST)
+
+            recommendations = recommendation.get_recommendations(user_id, book_id)
+
+            return response.Response({
+                "message": "Review added successfully",
+                "recommendations": recommendations
+            }, status=status.HTTP_201_CREATED)
         return response.Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    def get_recommendations(self, user_id, book_id):  # noqa
+
+class ScoreUpsert(views.APIView):
+    """
+    API View for setting or removing a user's rating for a specific book, whether or not it was rated before.
+
+    This view handles:
+    - Creating or updating the rating of a book with a single idempotent statement.
+    - Deleting the rating of a book with a single statement.
+    - Buffering both mutations in Redis and acknowledging them immediately when write-behind mode is enabled.
+    It ensures that the user is authenticated before allowing the rating to be written.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = score.ScoreSerializer
+
+    def put(self, request, book_id):
+        """
+        Handles the PUT request to create or update the rating of a specific book.
+
+        This method:
+        1. Validates the rating submitted in the request.
+        2. In write-behind mode, buffers it in Redis and returns 202.
+        3. Otherwise writes it with `INSERT ... ON CONFLICT DO UPDATE`, using `xmax = 0` to tell a creation from an
+           update.
+        4. Returns 201 if the review was created, 200 if it was updated, or 404 if the book does not exist.
+
+        Args:
+            request (Request): The HTTP request object containing the rating and user details.
+            book_id (int): The ID of the rated book.
+
+        Returns:
+            Response: A response object with a success message and the stored rating, or an error message.
+        """
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return response.Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        if 'rating' not in serializer.validated_data:
+            return response.Response({"rating": ["This field is required."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        rating = serializer.validated_data['rating']
+        if self.enqueue(request.user.id, {book_id: rating}):
+            return response.Response({"message": "Review accepted", "book_id": book_id, "rating": rating},
+                                     status=status.HTTP_202_ACCEPTED)
+
+        book_exists, created = score_service.upsert_review(user_id=request.user.id, book_id=book_id, rating=rating)
+
+        if not book_exists:
+            return response.Response({"error": "Book not found"}, status=status.HTTP_404_NOT_FOUND)
+        if created:
+            return response.Response({"message": "Review added successfully", "book_id": book_id, "rating": rating},
+                                     status=status.HTTP_201_CREATED)
+        return response.Response({"message": "Review updated successfully", "book_id": book_id, "rating": rating},
+                                 status=status.HTTP_200_OK)
+
+    def delete(self, request, book_id):  # noqa
+        """
+        Handles the DELETE request to remove the rating of a specific book.
+
+        This method:
+        1. In write-behind mode, buffers the deletion in Redis and returns 202.
+        2. Otherwise deletes the review with a single `DELETE ... RETURNING` statement.
+        3. Returns 204 if the review was deleted, or 404 if there was no review to delete.
+
+        Args:
+            request (Request): The HTTP request object containing user details.
+            book_id (int): The ID of the book whose rating is removed.
+
+        Returns:
+            Response: An empty response, or an error message.
+        """
+        if self.enqueue(request.user.id, {book_id: None}):
+            return response.Response(status=status.HTTP_202_ACCEPTED)
+
+        if not score_service.delete_review(user_id=request.user.id, book_id=book_id):
+            return response.Response({"error": "Review not found"}, status=status.HTTP_404_NOT_FOUND)
+        return response.Response(status=status.HTTP_204_NO_CONTENT)
+
+    @staticmethod
+    def enqueue(user_id, ratings):
+        """
+        Buffers rating mutations in Redis when write-behind mode is enabled.
+
+        Args:
+            user_id (int): The ID of the user rating the books.
+            ratings (dict): New ratings keyed by book ID, None to delete the rating.
+
+        Returns:
+            bool: True if the mutations were buffered, False if they must be written synchronously because
+            write-behind mode is disabled.
+
+        Raises:
+            BufferUnavailable: If Redis is unavailable in write-behind mode. The mutations are not written
+            synchronously then, since older mutations of the same books may still be buffered.
         """
-        Generates book recommendations based on the genre of the reviewed book and ratings from similar users.
+        if not write_behind.is_enabled():
+            return False
+        try:
+            write_behind.enqueue_reviews(user_id=user_id, ratings=ratings)
+        except redis.RedisError as e:
+            logger.error(f"Rating mutations of user {user_id} rejected, Redis unavailable: {e}")
+            raise BufferUnavailable()
+        return True
+
+
+class ScoreBatch(views.APIView):
+    """
+    API View for submitting many ratings at once, e.g. when importing a user's history from another service.
+
+    This view handles:
+    - Creating or updating up to `BOOK_SCORE_BATCH_MAX_SIZE` ratings with a single statement.
+    - Generating recommendations once for the whole batch.
+    It ensures that the user is authenticated before allowing the ratings to be written.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = score.ScoreBatchSerializer
+
+    def post(self, request):
+        """
+        Handles the POST request to create or update a batch of ratings.
 
         This method:
-        1. Retrieves the genre of the reviewed book.
-        2. Gathers a list of books that the user has already rated.
-        3. Collects ratings from other users who have reviewed books in the same genre.
-        4. Identifies users with similar reading preferences.
-        5. Provides recommendations of books highly rated by similar users that the current user has not yet rated.
+        1. Validates the list of {book_id, rating} pairs submitted in the request.
+        2. Keeps the last rating submitted for every book.
+        3. In write-behind mode, buffers all the ratings in Redis with one round-trip and returns 202.
+        4. Otherwise writes all the ratings with one bulk upsert, skipping books that do not exist.
+        5. Retrieves recommendations once, seeded by the best rated book of the batch.
 
         Args:
-            user_id (int): The ID of the user requesting recommendations.
-            book_id (int): The ID of the book that was reviewed.
+            request (Request): The HTTP request object containing the list of ratings and user details.
 
         Returns:
-            list: A list of dictionaries containing recommended books with their IDs, titles, and average ratings.
+            Response: A response object with the created, updated and missing book IDs and book recommendations,
+            or an error message.
         """
-        recommendations = []
+        serializer = self.serializer_class(
+            data=request.data, many=True, allow_empty=False, max_length=app_setting.score_batch_max_size
+        )
+        if not serializer.is_valid():
+            return response.Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        user_id = request.user.id
+        ratings = {item['book_id']: item['rating'] for item in serializer.validated_data}
+
+        if ScoreUpsert.enqueue(user_id, ratings):
+            seed_book_id = max(ratings, key=lambda book_id: ratings[book_id])
+            return response.Response({
+                "message": "Reviews accepted",
+                "accepted": list(ratings),
+                "recommendations": recommendation.get_recommendations(user_id, seed_book_id)
+            }, status=status.HTTP_202_ACCEPTED)
+
+        created, updated, missing = score_service.bulk_upsert_reviews(user_id=user_id, ratings=ratings)
+
+        if not created and not updated:
+            return response.Response({"error": "Books not found", "missing": missing},
+                                     status=status.HTTP_404_NOT_FOUND)
+
+        seed_book_id = max(created + updated, key=lambda book_id: ratings[book_id])
+        recommendations = recommendation.get_recommendations(user_id, seed_book_id)
+
+        return response.Response({
+            "message": "Reviews saved successfully",
+            "created": created,
+            "updated": updated,
+            "missing": missing,
+            "recommendations": recommendations
+        }, status=status.HTTP_200_OK)
+
+
+class ScoreList(views.APIView):
+    """
+    API View for listing the ratings of the authenticated user, newest first.
+
+    This view handles:
+    - Keyset pagination on `(account_user_id, id)`, so every page costs one range scan of a covering index.
+    - Joining the rated books in the same query, and filtering them by genre.
+    It ensures that the user is authenticated, and only ever returns the ratings of that user.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = score.ScoreListSerializer
+
+    def get(self, request):
+        """
+        Handles the GET request to retrieve one page of the user's ratings.
+
+        This method:
+        1. Retrieves the optional 'cursor', 'limit' and 'genre' query parameters from the request.
+        2. Fetches one review more than the page size, below the cursor, to know whether another page follows.
+        3. Overlays the user's rating mutations still buffered by write-behind mode on the page.
+        4. Serializes the page into JSON format.
+        5. Returns the page and the cursor of the next page, or None on the last page.
+
+        Args:
+            request (Request): The HTTP request object containing the query parameters and user details.
+
+        Returns:
+            Response: A response object containing the page of ratings, or an error message if a parameter is
+            invalid.
+        """
+        try:
+            limit = int(request.GET.get('limit', app_setting.score_page_size))
+            cursor = request.GET.get('cursor')
+            cursor = int(cursor) if cursor else None
+        except ValueError:
+            return response.Response({"error": "cursor and limit must be integers"},
+                                     status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, app_setting.score_page_max_size))
+        genre = request.GET.get('genre') or None
+
+        reviews = score_service.list_user_reviews(user_id=request.user.id, limit=limit + 1, before=cursor,
+                                                  genre=genre)
+        page = reviews[:limit]
+        next_cursor = page[-1]["id"] if len(reviews) > limit else None
+        page = write_behind.overlay_reviews(user_id=request.user.id, reviews=page,
+                                            genre=genre, first_page=cursor is None)
+
+        serializer = self.serializer_class(page, many=True)
+        return response.Response({"results": serializer.data, "next_cursor": next_cursor}, status=status.HTTP_200_OK)
+
+
+class ScoreChanges(views.APIView):
+    """
+    API View for reading the changes of all the ratings after a cursor, in bounded batches.
+
+    This view handles:
+    - Feeding the rating inserts, updates and deletes recorded by the transactional outbox, in commit-safe order.
+    - Letting downstream consumers sync incrementally instead of dumping the whole `reviews` table.
+    Consumers starting from scratch first take a snapshot with `export_review_changes --snapshot`, which also
+    covers the ratings recorded before the outbox existed, and pass the cursor it saved as 'since'.
+    It ensures that only staff users can read the ratings of every user.
+    """
+    permission_classes = [IsAdminUser]
+    serializer_class = score.ScoreChangeSerializer
+
+    def get(self, request):  # noqa
+        """
+        Handles the GET request to retrieve the changes following a cursor.
+
+        This method:
+        1. Retrieves the optional 'since' and 'limit' query parameters from the request.
+        2. Reads up to 'limit' changes with a higher ID than 'since' from the outbox, stopping before changes that
+           may still be overtaken by a concurrent commit, or answers 410 if 'since' was pruned from the outbox.
+        3. Serializes the changes into JSON format.
+        4. Returns the changes, the cursor to pass as 'since' on the next call, and whether more changes are ready.
+
+        Args:
+            request (Request): The HTTP request object containing the query parameters.
+
+        Returns:
+            Response: A response object containing the changes, or an error message if a parameter is invalid.
+        """
+        try:
+            since = int(request.GET.get('since', 0))
+            limit = int(request.GET.get('limit', app_setting.change_feed_limit))
+        except ValueError:
+            return response.Response({"error": "since and limit must be integers"},
+                                     status=status.HTTP_400_BAD_REQUEST)
+        since = max(since, 0)
+        limit = max(1, min(limit, app_setting.change_feed_limit))
 
         try:
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    "SELECT genre FROM books WHERE id = %s",
-                    [book_id]
-                )
-                genre_row = cursor.fetchone()
-
-                if not genre_row:
-                    return {"message": "Genre not found"}
-
-                genre = genre_row[0]
-
-                cursor.execute(
-                    "SELECT book_id FROM reviews WHERE account_user_id = %s",
-                    [user_id]
-                )
-                rated_books = cursor.fetchall()
-
-                if not rated_books:
-                    return {"message": "There is not enough data about you"}
-
-                rated_books_ids = [book[0] for book in rated_books]
-
-                cursor.execute("""
-                    SELECT r.account_user_id, r.book_id, r.rating
-                    FROM reviews r
-                    JOIN books b ON r.book_id = b.id
-                    WHERE b.genre = %s AND r.account_user_id != %s
-                """, [genre, user_id])
-
-                similar_users_ratings = cursor.fetchall()
-
-                user_profiles = {}
-                for other_user_id, book_id, rating in similar_users_ratings:
-                    if other_user_id not in user_profiles:
-                        user_profiles[other_user_id] = {}
-                    user_profiles[other_user_id][book_id] = rating
-
-                similar_users = []
-                for other_user_id, ratings in user_profiles.items():
-                    common_books = set(ratings.keys()) & set(rated_books_ids)
-                    if common_books:
-                        similar_users.append(other_user_id)
-
-                if similar_users:
-                    cursor.execute("""
-                        SELECT r.book_id, b.title, AVG(r.rating) as avg_rating
-                        FROM reviews r
-                        JOIN books b ON r.book_id = b.id
-                        WHERE r.account_user_id IN %s AND r.book_id NOT IN %s
-                        GROUP BY r.book_id, b.title
-                        ORDER BY avg_rating DESC
-                    """, [tuple(similar_users), tuple(rated_books_ids)])
-
-                    potential_recommendations = cursor.fetchall()
-
-                    recommendations = [{"book_id": book_id, "title": title, "rating": avg_rating} for
-                                       book_id, title, avg_rating in potential_recommendations]
-
-        except Exception as e:
-            return {"error": str(e)}
-
-        return recommendations
+            changes = outbox.read_changes(since=since, limit=limit)
+        except outbox.ExpiredCursor:
+            return response.Response({"error": "since was pruned from the change feed, take a new snapshot"},
+                                     status=status.HTTP_410_GONE)
+        serializer = self.serializer_class(changes, many=True)
+        return response.Response({
+            "changes": serializer.data,
+            "next_since": changes[-1]["id"] if changes else since,
+            "has_more": len(changes) == limit,
+        }, status=status.HTTP_200_OK)
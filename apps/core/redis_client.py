@@ -0,0 +1,94 @@
+import functools
+import logging
+import threading
+from typing import Dict
+
+import redis
+from decouple import config  # noqa
+
+logger = logging.getLogger(__name__)
+
+
+class MeteredConnectionPool(redis.BlockingConnectionPool):
+    """
+    Blocking connection pool counting the connections it opens and hands out, so that connection churn is visible.
+    Callers wait up to `timeout` seconds for a free connection once `max_connections` are open, instead of opening
+    more. A healthy pool opens at most `max_connections` connections over its lifetime however many checkouts it
+    serves; every opened connection is logged with the running totals.
+    """
+
+    _stats = {"created": 0, "checkouts": 0, "disconnects": 0}
+    _stats_lock = threading.Lock()
+
+    @classmethod
+    def _count(cls, name: str) -> int:
+        with cls._stats_lock:
+            cls._stats[name] += 1
+            return cls._stats[name]
+
+    def make_connection(self):
+        created = self._count("created")
+        logger.info(f"Opened Redis connection #{created} after {self._stats['checkouts']} checkouts.")
+        return super().make_connection()
+
+    def get_connection(self, command_name, *keys, **options):
+        self._count("checkouts")
+        return super().get_connection(command_name, *keys, **options)
+
+    def disconnect(self, *args, **kwargs):
+        self._count("disconnects")
+        return super().disconnect(*args, **kwargs)
+
+
+def pool_stats() -> Dict[str, int]:
+    """
+    Function to retrieve the connection counters of every metered pool of this process.
+    Returns:
+    - Dict[str, int]: Number of connections opened, of checkouts served and of pool disconnects.
+    """
+    with MeteredConnectionPool._stats_lock:
+        return dict(MeteredConnectionPool._stats)
+
+
+def pool_options() -> Dict:
+    """
+    Function to retrieve the size and timeouts of the Redis connection pools, shared by the cache and the client.
+    Returns:
+    - Dict: Keyword arguments of `MeteredConnectionPool`.
+    """
+    return {
+        "max_connections": config('REDIS_POOL_MAX_CONNECTIONS', cast=int, default=50),
+        "timeout": config('REDIS_POOL_TIMEOUT', cast=float, default=5),
+        "socket_timeout": config('REDIS_SOCKET_TIMEOUT', cast=float, default=5),
+        "socket_connect_timeout": config('REDIS_SOCKET_CONNECT_TIMEOUT', cast=float, default=2),
+    }
+
+
+@functools.lru_cache
+def get_redis_client() -> redis.StrictRedis:
+    """
+    Function to create once and retrieve the Redis client shared by the applications.
+    The client keeps its own connection pool, so every caller of this process reuses the same connections.
+    Returns:
+    - redis.StrictRedis: Client connected to `REDIS_HOST`:`REDIS_PORT`, database 0.
+    """
+    pool = MeteredConnectionPool(host=config('REDIS_HOST'), port=config('REDIS_PORT'), db=0, **pool_options())
+    return redis.StrictRedis(connection_pool=pool)
+
+
+@functools.lru_cache
+def get_blocking_redis_client(block: int) -> redis.StrictRedis:
+    """
+    Function to create once and retrieve a Redis client for commands waiting on the server, like `XREADGROUP BLOCK`.
+    The shared client times its sockets out after `REDIS_SOCKET_TIMEOUT`, which would abort a server-side wait as long
+    or longer; this client allows `REDIS_BLOCKING_TIMEOUT_MARGIN` seconds more than the wait, so an idle wait returns
+    an empty reply while a dead server is still detected.
+    Args:
+    - block (int): Longest wait of the commands sent through the client, in milliseconds.
+    Returns:
+    - redis.StrictRedis: Client connected to `REDIS_HOST`:`REDIS_PORT`, database 0, with its own connection pool.
+    """
+    margin = config('REDIS_BLOCKING_TIMEOUT_MARGIN', cast=float, default=5)
+    options = dict(pool_options(), socket_timeout=block / 1000 + margin)
+    pool = MeteredConnectionPool(host=config('REDIS_HOST'), port=config('REDIS_PORT'), db=0, **options)
+    return redis.StrictRedis(connection_pool=pool)
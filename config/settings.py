@@ -130,6 +130,46 @@ MEDIA_ROOT = BASE_DIR / "storage/media"
 # JWT_AUTH_ENCRYPT_KEY = b'32 bytes'
 # JWT_AUTH_GET_USER_BY_ACCESS_TOKEN = True
 # JWT_AUTH_CACHE_USING = True
+# JWT_AUTH_VALIDATED_TOKEN_CACHE_SIZE = 1024
+# JWT_AUTH_UUID_LOCAL_CACHE_TIMEOUT = 5
+# JWT_AUTH_UUID_LOCAL_CACHE_SIZE = 10000
+# JWT_AUTH_EPOCH_REVOCATION = True
+# JWT_AUTH_ENCRYPT_KEYS = {"1": b"32 bytes", "2": b"32 bytes"}  # must differ from JWT_AUTH_ENCRYPT_KEY
+# JWT_AUTH_ENCRYPT_KEY_ID = "2"
+# JWT_AUTH_LEGACY_TOKENS = True  # while upgrading only, for at most JWT_AUTH_REFRESH_TOKEN_LIFETIME
+# JWT_AUTH_LAST_LOGIN_UPDATE_INTERVAL = 60
+# JWT_AUTH_LAST_LOGIN_BUFFER = True
+# JWT_AUTH_INTROSPECTION_SECRET = config("JWT_AUTH_INTROSPECTION_SECRET")
+
+# BOOK Handling
+# BOOK_AUTOCOMPLETE_PREFIX_LENGTH = 3
+# BOOK_AUTOCOMPLETE_LIMIT = 10
+# BOOK_AUTOCOMPLETE_REFRESH_INTERVAL = 60 * 5
+# BOOK_EXPORT_ITERSIZE = 2000
+# BOOK_LOOKUP_MAX_SIZE = 50
+# BOOK_SCORE_BATCH_MAX_SIZE = 500
+# BOOK_SCORE_PAGE_SIZE = 20
+# BOOK_SCORE_PAGE_MAX_SIZE = 100
+# BOOK_SCORE_WRITE_BEHIND = False
+# BOOK_SCORE_WRITE_BEHIND_STREAM = "reviews:write-behind"
+# BOOK_SCORE_WRITE_BEHIND_BATCH_SIZE = 5000
+# BOOK_OUTBOX_CONSUMERS = {
+#     "leaderboard": "apps.book.services.leaderboard.consume_events",
+#     "sketches": "apps.book.services.sketches.consume_events",
+#     "genres": "apps.book.services.genres.consume_events",
+# }
+# BOOK_OUTBOX_BATCH_SIZE = 1000
+# BOOK_OUTBOX_POLL_INTERVAL = 1
+# BOOK_OUTBOX_RETENTION_DAYS = 90
+# BOOK_CHANGE_FEED_LIMIT = 1000
+# BOOK_LEADERBOARD_LIMIT = 100
+# BOOK_LEADERBOARD_HALF_LIFE = 60 * 60 * 24
+# BOOK_LEADERBOARD_TRENDING_WINDOW = 10
+# BOOK_LEADERBOARD_PRIOR_WEIGHT = 5
+# BOOK_LEADERBOARD_PRIOR_MEAN = 3.0
+# BOOK_SKETCH_RETENTION_DAYS = 90
+# BOOK_STATS_MAX_BOOKS = 100
+# BOOK_GENRES_CACHE_TIMEOUT = 60 * 60
 
 
 # Logging
@@ -203,6 +243,13 @@ else:
     #     "default": {
     #         "BACKEND": "django.core.cache.backends.redis.RedisCache",
     #         "LOCATION": REDIS_URL,
+    #         "OPTIONS": {
+    #             "pool_class": "apps.core.redis_client.MeteredConnectionPool",
+    #             "max_connections": config("REDIS_POOL_MAX_CONNECTIONS", cast=int, default=50),
+    #             "timeout": config("REDIS_POOL_TIMEOUT", cast=float, default=5),
+    #             "socket_timeout": config("REDIS_SOCKET_TIMEOUT", cast=float, default=5),
+    #             "socket_connect_timeout": config("REDIS_SOCKET_CONNECT_TIMEOUT", cast=float, default=2),
+    #         },
     #     }
     # }
     SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"